@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.utils import timezone
 # Consolidate all imports into one clean line
 from .models import (
     CustomUser, 
@@ -9,7 +10,8 @@ from .models import (
     SaleOrder, 
     RentBooking
 )
-from .models import DeliveryBoy, Delivery, Order
+from .models import DeliveryBoy, Delivery, Order, OutboxEmail, DailyStat
+from .dispatch import dispatch_pending
 
 # 1. Product Setup (Inlines allow editing Variants/Images inside the Product page)
 class ProductImageInline(admin.TabularInline):
@@ -24,8 +26,8 @@ class ProductVariantInline(admin.TabularInline):
 
 class ProductAdmin(admin.ModelAdmin):
     inlines = [ProductImageInline, ProductVariantInline]
-    list_display = ['name', 'category', 'sub_category', 'is_for_sale', 'is_for_rent']
-    list_filter = ['category', 'sub_category']
+    list_display = ['name', 'category', 'sub_category', 'is_for_sale', 'is_for_rent', 'min_sale_price', 'total_stock']
+    list_filter = ['category', 'sub_category', 'is_for_sale', 'is_for_rent']
     search_fields = ['name']
 
 # 2. Order Setup (Optional: Customize how Orders look)
@@ -80,4 +82,38 @@ class OrderAdmin(admin.ModelAdmin):        # <--- FIXED: Removed '.site'
 @admin.register(Delivery)
 class DeliveryAdmin(admin.ModelAdmin):     # <--- FIXED: Removed '.site'
     list_display = ('order', 'delivery_boy', 'status', 'assigned_at')
-    list_filter = ('status',)
\ No newline at end of file
+    list_filter = ('status',)
+    actions = ['auto_assign_drivers']
+
+    def auto_assign_drivers(self, request, queryset):
+        # Only unassigned 'Pending' rows in the selection are touched
+        summary = dispatch_pending(delivery_ids=list(queryset.values_list('id', flat=True)))
+        self.message_user(request, f"{sum(summary.values())} deliveries assigned to {len(summary)} drivers.")
+    auto_assign_drivers.short_description = "Auto-assign drivers (balanced, by area)"
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('id', 'event', 'object_id', 'object_status', 'to_email', 'state', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('state', 'event')
+    search_fields = ('to_email', 'subject')
+    actions = ['retry_now']
+
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(state=OutboxEmail.STATE_SENT).update(
+            state=OutboxEmail.STATE_PENDING, next_attempt_at=timezone.now(), attempts=0
+        )
+        self.message_user(request, f"{updated} email(s) re-queued.")
+    retry_now.short_description = "Retry selected emails now"
+
+@admin.register(DailyStat)
+class DailyStatAdmin(admin.ModelAdmin):
+    # Maintained automatically; rebuild with `manage.py rebuild_daily_stats`
+    list_display = ('day', 'category', 'orders', 'revenue', 'items_sold', 'rentals_booked', 'rental_revenue')
+    list_filter = ('category',)
+    date_hierarchy = 'day'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,164 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import RentBooking
+
+# ==========================================
+# RENTAL AVAILABILITY ENGINE
+# ==========================================
+# A variant's stock_quantity is its pool of physical units. Rentals no longer
+# take units out of that pool at booking time; instead each booking occupies
+# `quantity` units for every day of [start_date, end_date]. Free units for a
+# day = stock_quantity - units occupied that day.
+#
+# Occupancy is computed from the bookings overlapping the requested window
+# (one indexed query on variant/end_date) with a difference array, so a
+# 90-day calendar for every variant of a product costs a single query.
+
+# Bookings in these statuses hold units for their dates
+OCCUPYING_STATUSES = [
+    RentBooking.STATUS_PENDING,
+    RentBooking.STATUS_APPROVED,
+    RentBooking.STATUS_SHIPPED,
+    RentBooking.STATUS_ACTIVE,
+    RentBooking.STATUS_OVERDUE,
+]
+
+# ...and these are physically with the customer, so they keep holding
+# their units past end_date until they are returned
+WITH_CUSTOMER_STATUSES = [
+    RentBooking.STATUS_SHIPPED,
+    RentBooking.STATUS_ACTIVE,
+    RentBooking.STATUS_OVERDUE,
+]
+
+CALENDAR_DAYS = 90
+
+
+def _overlapping_bookings(variant_ids, start, end=None, exclude_booking_ids=None):
+    today = timezone.now().date()
+
+    overlap = Q(end_date__gte=start)
+    if start <= today:
+        overlap |= Q(status__in=WITH_CUSTOMER_STATUSES)
+
+    bookings = RentBooking.objects.filter(
+        overlap, variant_id__in=variant_ids, status__in=OCCUPYING_STATUSES
+    )
+    if end is not None:
+        bookings = bookings.filter(start_date__lte=end)
+    if exclude_booking_ids:
+        bookings = bookings.exclude(id__in=exclude_booking_ids)
+
+    return bookings.values_list('variant_id', 'start_date', 'end_date', 'status', 'quantity')
+
+
+def _effective_end(end_date, status, today):
+    # An item that is still out is treated as busy at least until today
+    if status in WITH_CUSTOMER_STATUSES and end_date < today:
+        return today
+    return end_date
+
+
+def _daily_occupancy(bookings, start, days):
+    """Turns booking rows into {variant_id: [units occupied per day]} over `days` days from `start`."""
+    today = timezone.now().date()
+    end = start + timedelta(days=days - 1)
+    diffs = defaultdict(lambda: [0] * (days + 1))
+
+    for variant_id, b_start, b_end, status, quantity in bookings:
+        lo = max(b_start, start)
+        hi = min(_effective_end(b_end, status, today), end)
+        if lo > hi:
+            continue
+        diff = diffs[variant_id]
+        diff[(lo - start).days] += quantity
+        diff[(hi - start).days + 1] -= quantity
+
+    occupancy = {}
+    for variant_id, diff in diffs.items():
+        running = 0
+        used = []
+        for change in diff[:days]:
+            running += change
+            used.append(running)
+        occupancy[variant_id] = used
+    return occupancy
+
+
+def daily_free_units(variants, start, end, exclude_booking_ids=None):
+    """Returns {variant_id: [free units for each day in start..end]} using one query."""
+    variants = list(variants)
+    days = (end - start).days + 1
+    if days < 1 or not variants:
+        return {v.id: [] for v in variants}
+
+    bookings = _overlapping_bookings([v.id for v in variants], start, end, exclude_booking_ids)
+    occupancy = _daily_occupancy(bookings, start, days)
+
+    return {
+        v.id: [max(v.stock_quantity - used, 0) for used in occupancy.get(v.id, [0] * days)]
+        for v in variants
+    }
+
+
+def free_units(variant, start, end, exclude_booking_ids=None):
+    """Units of `variant` that are free on every day of [start, end]."""
+    daily = daily_free_units([variant], start, end, exclude_booking_ids)[variant.id]
+    return min(daily) if daily else 0
+
+
+def reserved_units_many(variant_ids):
+    """
+    {variant_id: units that current/future rentals need on their busiest day
+    from today onwards}; stock can't go below this without breaking a booking.
+    One query.
+    """
+    variant_ids = list(variant_ids)
+    today = timezone.now().date()
+    bookings = list(_overlapping_bookings(variant_ids, today))
+    if not bookings:
+        return dict.fromkeys(variant_ids, 0)
+
+    horizon = max(_effective_end(b_end, status, today) for _, _, b_end, status, _ in bookings)
+    days = (horizon - today).days + 1
+    occupancy = _daily_occupancy(bookings, today, days)
+    return {variant_id: max(occupancy.get(variant_id, [0])) for variant_id in variant_ids}
+
+
+def free_units_for_sale_many(variants):
+    """
+    Units of each variant that can be sold without breaking any current or
+    future rental: stock minus its busiest day from today onwards. One query.
+    """
+    variants = list(variants)
+    reserved = reserved_units_many(v.id for v in variants)
+    return {v.id: max(v.stock_quantity - reserved[v.id], 0) for v in variants}
+
+
+def free_units_for_sale(variant):
+    return free_units_for_sale_many([variant])[variant.id]
+
+
+def check_rental(variant, start, end, quantity, exclude_booking_ids=None):
+    """Returns an error message if `quantity` units can't be rented for [start, end], else None."""
+    available = free_units(variant, start, end, exclude_booking_ids)
+    if available >= quantity:
+        return None
+    if available == 0:
+        return f"Sorry, {variant} is fully booked for {start:%b %d} - {end:%b %d}."
+    return f"Sorry, only {available} of {variant} available for {start:%b %d} - {end:%b %d}."
+
+
+def rental_calendar(variants, days=CALENDAR_DAYS):
+    """Date-picker data: free units per variant for each of the next `days` days."""
+    start = timezone.now().date()
+    end = start + timedelta(days=days - 1)
+    return {
+        'start': start.isoformat(),
+        'days': days,
+        'free': {str(variant_id): free for variant_id, free in daily_free_units(variants, start, end).items()},
+    }
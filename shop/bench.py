@@ -0,0 +1,75 @@
+import os
+import shutil
+import statistics
+import tempfile
+from contextlib import contextmanager
+
+from django.db import connections
+from django.test.utils import override_settings
+
+# ==========================================
+# BENCHMARK HELPERS
+# ==========================================
+# Shared by the bench_* management commands. Benchmarks always run against
+# a throwaway, fully migrated database so they never touch real data.
+
+
+@contextmanager
+def scratch_database(alias='default', verbosity=0):
+    """
+    Creates a migrated scratch copy of the `alias` database and destroys it
+    afterwards. Uploaded files go to a scratch MEDIA_ROOT and the cache to a
+    scratch file cache for the duration too (cached rows of the real database
+    must not leak in), and other SQLite aliases to files in the same scratch directory.
+    """
+    connection = connections[alias]
+    old_name = connection.settings_dict['NAME']
+    tmpdir = tempfile.mkdtemp(prefix='trendwear-bench-')
+
+    # File-backed (not in-memory) so several threads/processes can share it
+    if connection.vendor == 'sqlite':
+        connection.settings_dict.setdefault('TEST', {})
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tmpdir, 'bench.sqlite3')
+
+    # Other SQLite aliases (the reporting replica) point into the scratch dir
+    # too: no snapshot there until a benchmark takes one
+    others = {
+        other.alias: other.settings_dict['NAME'] for other in connections.all()
+        if other.alias != alias and other.vendor == 'sqlite'
+    }
+    for other_alias in others:
+        connections[other_alias].close()
+        connections[other_alias].settings_dict['NAME'] = os.path.join(tmpdir, f'{other_alias}.sqlite3')
+
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        with override_settings(MEDIA_ROOT=os.path.join(tmpdir, 'media'), CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(tmpdir, 'cache'),
+        }}):
+            yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        for other_alias, name in others.items():
+            connections[other_alias].close()
+            connections[other_alias].settings_dict['NAME'] = name
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(int(round(pct / 100 * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+def summarize(latencies):
+    """Latency summary in milliseconds."""
+    return {
+        'count': len(latencies),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'max_ms': round(max(latencies) * 1000, 2) if latencies else 0.0,
+    }
@@ -0,0 +1,59 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+
+from .models import CartItem
+
+# ==========================================
+# CART BADGE COUNTER
+# ==========================================
+# Every page shows the bag badge, so its numbers live in the (shared) cache per
+# user instead of being counted from CartItem on each request. Views that change
+# the cart call refresh_cart_badge() / clear_cart_badge(); any other CartItem
+# save/delete (admin, cascades) drops the entry through signals.py, and a missing
+# entry is rebuilt on first use. The short timeout bounds the damage of a missed
+# invalidation (e.g. a queryset .update()).
+
+CACHE_KEY = 'shop:cart_badge:{}'
+CACHE_TIMEOUT = 10 * 60
+
+EMPTY_BADGE = {'count': 0, 'total': Decimal('0.00')}
+
+
+def _key(user_id):
+    return CACHE_KEY.format(user_id)
+
+
+def build_cart_badge(user_id):
+    """Item count (sum of quantities) and total for the user's cart, in one query."""
+    items = CartItem.objects.filter(cart__user_id=user_id).only(
+        'quantity', 'is_rental', 'rental_start_date', 'rental_end_date', 'price_at_add'
+    )
+    count = 0
+    total = Decimal('0.00')
+    for item in items:
+        count += item.quantity
+        total += item.total_cost()
+    return {'count': count, 'total': total}
+
+
+def refresh_cart_badge(user_id):
+    badge = build_cart_badge(user_id)
+    cache.set(_key(user_id), badge, CACHE_TIMEOUT)
+    return badge
+
+
+def clear_cart_badge(user_id):
+    """The cart was emptied (e.g. by checkout): no need to hit the DB."""
+    cache.set(_key(user_id), EMPTY_BADGE, CACHE_TIMEOUT)
+
+
+def invalidate_cart_badge(user_id):
+    cache.delete(_key(user_id))
+
+
+def cart_badge(user_id):
+    badge = cache.get(_key(user_id))
+    if badge is None:
+        badge = refresh_cart_badge(user_id)
+    return badge
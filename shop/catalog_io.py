@@ -0,0 +1,433 @@
+import csv
+import io
+import itertools
+import json
+from contextlib import nullcontext
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from django.db import DatabaseError, transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from . import search
+from .covers import invalidate_collection_covers
+from .models import Product, ProductImage, ProductVariant, update_rows
+from .streaming import FORMATS, csv_lines, format_for, jsonl_lines
+
+# ==========================================
+# CATALOG IMPORT / EXPORT
+# ==========================================
+# Bulk loading of products, variants and gallery images from CSV or JSONL,
+# one line per variant (product columns repeat on each of its lines; a
+# product without variants is one line with an empty `size`).
+#
+# Import streams the file and works in chunks of CHUNK_SIZE lines, each chunk
+# in its own transaction with a handful of queries (bulk_create/bulk_update),
+# so memory stays flat however big the file is. It is an upsert:
+#   - product: by `product_id` when given, else by (name, category)
+#   - variant: by (product, size, color)
+#   - images:  storage names (already in MEDIA_ROOT), added if not attached
+# Nothing is deleted. rent_price_per_day is never read from the file: like
+# add_product(), it is 10% of the sale price for rentable products, else 0.
+# Bad lines are skipped and reported; the rest of the file still loads. An
+# error that stops the import (unreadable file, database error) rolls back its
+# chunk only: the CatalogError raised carries the ImportResult of the chunks
+# already committed.
+#
+# Bulk writes skip signals.py, so each chunk refreshes the availability
+# columns and the search index itself. Image derivatives are left for
+# `manage.py build_image_derivatives`.
+#
+# Export writes the same format in product-id order, so its output can be
+# imported again (here or into another database, minus the product_id column).
+
+CATALOG_COLUMNS = [
+    'product_id', 'name', 'category', 'sub_category', 'description', 'is_rentable',
+    'thumbnail', 'images', 'size', 'color', 'stock_quantity', 'sale_price', 'rent_price_per_day',
+]
+REQUIRED_COLUMNS = {'name', 'category'}
+IMAGE_SEPARATOR = '|'
+CHUNK_SIZE = 1000
+
+RENT_RATE = Decimal('0.10')
+CENTS = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+_TRUE = {'1', 'true', 'yes', 'y', 'on'}
+_FALSE = {'', '0', 'false', 'no', 'n', 'off'}
+_CATEGORIES = {value for value, _ in Product.CATEGORY_CHOICES}
+
+
+class CatalogError(Exception):
+    def __init__(self, message, result=None):
+        super().__init__(message)
+        # What an import had committed before it failed (None if nothing was)
+        self.result = result
+
+
+def rent_prices(sale_prices, rentable):
+    """The 10%-of-sale-price rent rule over a whole chunk of variants at once."""
+    return [
+        (price * RENT_RATE).quantize(CENTS, ROUND_HALF_UP) if is_rentable and price else ZERO
+        for price, is_rentable in zip(sale_prices, rentable)
+    ]
+
+
+# ==========================================
+# 1. PARSING
+# ==========================================
+
+def _text(raw, field, max_length=None, required=False):
+    value = raw.get(field)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise ValueError(f"{field} is required")
+    if max_length and len(value) > max_length:
+        raise ValueError(f"{field} is longer than {max_length} characters")
+    return value
+
+
+def _bool(raw, field):
+    value = raw.get(field)
+    if isinstance(value, bool):
+        return value
+    value = '' if value is None else str(value).strip().lower()
+    if value in _TRUE:
+        return True
+    if value in _FALSE:
+        return False
+    raise ValueError(f"{field} must be true or false, got {value!r}")
+
+
+def _number(raw, field, kind):
+    value = raw.get(field)
+    if value is None or str(value).strip() == '':
+        return None
+    try:
+        number = kind(str(value).strip())
+    except (ValueError, InvalidOperation):
+        raise ValueError(f"{field} is not a number: {value!r}")
+    if number < 0:
+        raise ValueError(f"{field} can't be negative")
+    return number
+
+
+def clean_row(raw):
+    """One raw CSV/JSON row -> typed values. Raises ValueError with a readable message."""
+    category = _text(raw, 'category', required=True)
+    if category not in _CATEGORIES:
+        raise ValueError(f"category must be one of {', '.join(sorted(_CATEGORIES))}, got {category!r}")
+    images = raw.get('images') or []
+    if isinstance(images, str):
+        images = images.split(IMAGE_SEPARATOR)
+    sale_price = _number(raw, 'sale_price', Decimal)
+
+    return {
+        'product_id': _number(raw, 'product_id', int),
+        'name': _text(raw, 'name', max_length=200, required=True),
+        'category': category,
+        'sub_category': _text(raw, 'sub_category', max_length=50) or None,
+        'description': _text(raw, 'description') or None,
+        'is_rentable': _bool(raw, 'is_rentable'),
+        'thumbnail': _text(raw, 'thumbnail', max_length=100),
+        'images': [name.strip() for name in images if name and name.strip()],
+        'size': _text(raw, 'size', max_length=10),
+        'color': _text(raw, 'color', max_length=20) or 'Standard',
+        'stock_quantity': _number(raw, 'stock_quantity', int) or 0,
+        'sale_price': ZERO if sale_price is None else sale_price.quantize(CENTS, ROUND_HALF_UP),
+    }
+
+
+def read_rows(stream, fmt):
+    """Yields (line_number, raw_dict_or_error_message) from a text stream, one row at a time."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        missing = REQUIRED_COLUMNS - set(reader.fieldnames or ())
+        if missing:
+            raise CatalogError(f"Missing column(s): {', '.join(sorted(missing))}")
+        for raw in reader:
+            yield reader.line_num, raw
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                raw = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, f"invalid JSON: {e.msg}"
+                continue
+            yield line_number, raw if isinstance(raw, dict) else "expected a JSON object"
+    else:
+        raise CatalogError(f"Unknown format {fmt!r} (expected one of {', '.join(FORMATS)})")
+
+
+# ==========================================
+# 2. IMPORT
+# ==========================================
+
+class ImportResult:
+    MAX_ERRORS = 200    # the rest are only counted
+
+    def __init__(self):
+        self.products_created = 0
+        self.products_updated = 0
+        self.variants_created = 0
+        self.variants_updated = 0
+        self.images_added = 0
+        self.rows = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, line_number, message):
+        self.error_count += 1
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append((line_number, message))
+
+    def snapshot(self):
+        copy = ImportResult()
+        copy.__dict__.update(self.__dict__, errors=list(self.errors))
+        return copy
+
+    def summary(self):
+        return (f"{self.rows} lines: products {self.products_created} created / {self.products_updated} updated, "
+                f"variants {self.variants_created} created / {self.variants_updated} updated, "
+                f"{self.images_added} images added, {self.error_count} lines skipped")
+
+
+def _product_key(row):
+    if row['product_id']:
+        return ('id', row['product_id'])
+    return ('name', row['name'], row['category'])
+
+
+PRODUCT_FIELDS = ['name', 'category', 'sub_category', 'description', 'is_rentable', 'thumbnail']
+VARIANT_FIELDS = ['stock_quantity', 'sale_price', 'rent_price_per_day']
+
+
+def _values(obj, fields):
+    return tuple(getattr(obj, field) for field in fields)
+
+
+def _resolve_products(rows, result):
+    """
+    Creates/updates the Product of every row in the chunk. Returns
+    {product key: Product} and the products that were created or changed.
+    """
+    ids = {row['product_id'] for _, row in rows if row['product_id']}
+    names = {row['name'] for _, row in rows if not row['product_id']}
+    by_id = Product.objects.in_bulk(ids)
+    by_name = {}
+    # Lowest id wins when a (name, category) pair is already duplicated
+    for product in Product.objects.filter(name__in=names).order_by('-id'):
+        by_name[('name', product.name, product.category)] = product
+
+    products, created, updated, seen = {}, [], [], set()
+    now = timezone.now()
+    for line_number, row in rows:
+        key = _product_key(row)
+        if key in seen:
+            continue
+        if key[0] == 'id' and row['product_id'] not in by_id:
+            result.error(line_number, f"product_id {row['product_id']} does not exist "
+                                      "(leave it empty to create a new product)")
+            continue
+        seen.add(key)
+
+        product = by_id.get(row['product_id']) if key[0] == 'id' else by_name.get(key)
+        if product is None:
+            product = Product()
+            created.append(product)
+        before = _values(product, PRODUCT_FIELDS)
+
+        product.name = row['name']
+        product.category = row['category']
+        product.sub_category = row['sub_category']
+        product.description = row['description']
+        product.is_rentable = row['is_rentable']
+        # An empty thumbnail column keeps the current one
+        if row['thumbnail'] and row['thumbnail'] != product.thumbnail.name:
+            product.thumbnail = row['thumbnail']
+            product.thumbnail_hash = product.thumbnail_placeholder = ''
+        products[key] = product
+
+        # Re-importing an unchanged catalog writes nothing
+        if product.pk is not None and _values(product, PRODUCT_FIELDS) != before:
+            product.updated_at = now
+            updated.append(product)
+
+    Product.objects.bulk_create(created)
+    update_rows(Product, updated, PRODUCT_FIELDS + ['thumbnail_hash', 'thumbnail_placeholder', 'updated_at'])
+    result.products_created += len(created)
+    result.products_updated += len(updated)
+    return products, created + updated
+
+
+def _upsert_variants(rows, products, result):
+    """Creates/updates the chunk's variants. Returns the ids of the products whose variants changed."""
+    product_ids = [p.id for p in products.values()]
+    existing = {
+        (v.product_id, v.size, v.color): v
+        for v in ProductVariant.objects.filter(product_id__in=product_ids)
+    }
+    before = {v.pk: _values(v, VARIANT_FIELDS) for v in existing.values()}
+
+    variants = {}     # a repeated (product, size, color) line overrides the earlier one
+    for _, row in rows:
+        product = products.get(_product_key(row))
+        if product is None or not row['size']:
+            continue
+        key = (product.id, row['size'], row['color'])
+        variant = existing.get(key) or variants.get(key) or ProductVariant(
+            product=product, size=row['size'], color=row['color'])
+        variant.stock_quantity = row['stock_quantity']
+        variant.sale_price = row['sale_price']
+        variants[key] = variant
+
+    variants = list(variants.values())
+    rentable = {p.id: p.is_rentable for p in products.values()}
+    for variant, rent in zip(variants, rent_prices([v.sale_price for v in variants],
+                                                   [rentable[v.product_id] for v in variants])):
+        variant.rent_price_per_day = rent
+
+    created = [v for v in variants if v.pk is None]
+    updated = [v for v in variants if v.pk is not None and _values(v, VARIANT_FIELDS) != before[v.pk]]
+    ProductVariant.objects.bulk_create(created)
+    update_rows(ProductVariant, updated, VARIANT_FIELDS)
+    result.variants_created += len(created)
+    result.variants_updated += len(updated)
+    return {v.product_id for v in created + updated}
+
+
+def _add_images(rows, products, result):
+    attached = set(
+        ProductImage.objects.filter(product_id__in=[p.id for p in products.values()])
+        .values_list('product_id', 'image')
+    )
+    images = []
+    for _, row in rows:
+        product = products.get(_product_key(row))
+        if product is None:
+            continue
+        for name in row['images']:
+            if (product.id, name) not in attached:
+                attached.add((product.id, name))
+                images.append(ProductImage(product=product, image=name))
+    ProductImage.objects.bulk_create(images)
+    result.images_added += len(images)
+
+
+def _import_chunk(rows, result):
+    with transaction.atomic():
+        products, changed = _resolve_products(rows, result)
+        if not products:
+            return
+        restocked = _upsert_variants(rows, products, result)
+        _add_images(rows, products, result)
+
+        # What signals.py would have done for each save()
+        stale = {p.id for p in changed} | restocked
+        if stale:
+            Product.rebuild_availability(product_ids=sorted(stale))
+        search.index_products(changed)
+
+
+def import_catalog(stream, fmt='csv', chunk_size=CHUNK_SIZE, dry_run=False):
+    """
+    Upserts the catalog in `stream` (text, CSV or JSONL). Returns an ImportResult.
+    With dry_run everything is validated and written, then rolled back.
+    """
+    result = ImportResult()
+
+    def clean(rows):
+        for line_number, raw in rows:
+            result.rows += 1
+            if isinstance(raw, str):
+                result.error(line_number, raw)
+                continue
+            try:
+                yield line_number, clean_row(raw)
+            except ValueError as e:
+                result.error(line_number, str(e))
+
+    rows = clean(read_rows(stream, fmt))
+    committed = None    # the result as of the last committed chunk
+    try:
+        # A dry run needs one outer transaction to roll back; a real import commits chunk by chunk
+        with transaction.atomic() if dry_run else nullcontext():
+            while True:
+                chunk = list(itertools.islice(rows, chunk_size))
+                if not chunk:
+                    break
+                _import_chunk(chunk, result)
+                committed = result.snapshot()
+            if dry_run:
+                transaction.set_rollback(True)
+    except (CatalogError, UnicodeDecodeError, DatabaseError) as e:
+        # The failing chunk was rolled back, earlier ones stay committed: report them with the error
+        if dry_run:
+            committed = None
+        raise CatalogError(str(e), result=committed) from e
+    finally:
+        if not dry_run and (result.products_created or result.products_updated):
+            invalidate_collection_covers()
+    return result
+
+
+# ==========================================
+# 3. EXPORT
+# ==========================================
+
+def export_rows(chunk_size=CHUNK_SIZE):
+    """Yields one dict per variant (or per variant-less product, variant fields None), in product-id order."""
+    last_id = 0
+    variants = Prefetch('variants', queryset=ProductVariant.objects.order_by('id'))
+    images = Prefetch('images', queryset=ProductImage.objects.order_by('id'))
+
+    while True:
+        batch = list(
+            Product.objects.filter(id__gt=last_id).order_by('id')
+            .prefetch_related(variants, images)[:chunk_size]
+        )
+        if not batch:
+            break
+        for product in batch:
+            base = {
+                'product_id': product.id,
+                'name': product.name,
+                'category': product.category,
+                'sub_category': product.sub_category or '',
+                'description': product.description or '',
+                'is_rentable': product.is_rentable,
+                'thumbnail': product.thumbnail.name or '',
+                'images': [image.image.name for image in product.images.all()],
+            }
+            product_variants = product.variants.all() or [None]
+            for variant in product_variants:
+                yield {
+                    **base,
+                    'size': variant.size if variant else None,
+                    'color': variant.color if variant else None,
+                    'stock_quantity': variant.stock_quantity if variant else None,
+                    'sale_price': variant.sale_price if variant else None,
+                    'rent_price_per_day': variant.rent_price_per_day if variant else None,
+                }
+        last_id = batch[-1].id
+
+
+def export_lines(fmt='csv', chunk_size=CHUNK_SIZE):
+    """The catalog as an iterator of text lines (for a StreamingHttpResponse or a file)."""
+    if fmt == 'csv':
+        def rows():
+            for row in export_rows(chunk_size):
+                row['is_rentable'] = 'true' if row['is_rentable'] else 'false'
+                row['images'] = IMAGE_SEPARATOR.join(row['images'])
+                yield [row[c] for c in CATALOG_COLUMNS]
+        return csv_lines(CATALOG_COLUMNS, rows())
+    if fmt == 'jsonl':
+        return jsonl_lines(CATALOG_COLUMNS, ([row[c] for c in CATALOG_COLUMNS] for row in export_rows(chunk_size)))
+    raise CatalogError(f"Unknown format {fmt!r} (expected one of {', '.join(FORMATS)})")
+
+
+def text_stream(binary_file):
+    """Wraps an uploaded/opened binary file for read_rows() (a UTF-8 BOM from Excel is dropped)."""
+    return io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
@@ -0,0 +1,150 @@
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from .availability import daily_free_units, free_units_for_sale_many
+from .models import DailyStat, Delivery, Order, Product, ProductVariant, RentBooking, SaleOrder
+
+# ==========================================
+# CHECKOUT PIPELINE
+# ==========================================
+# The whole cart is turned into an Order in ONE transaction:
+#   1. lock every variant in the cart (stable id order -> no deadlocks)
+#   2. validate stock / rental dates for all lines at once
+#   3. bulk_create the Order lines
+#   4. one conditional F() update per sold variant (never goes below 0)
+# Anything that fails raises CheckoutError and nothing is written.
+
+
+class CheckoutError(Exception):
+    pass
+
+
+def _lock_variants(variant_ids):
+    variants = ProductVariant.objects.filter(id__in=sorted(variant_ids)).order_by('id')
+    if connection.features.has_select_for_update:
+        variants = variants.select_for_update()
+    return {v.id: v for v in variants}
+
+
+def _validate(sale_lines, rent_lines, variants):
+    # 1. Sales: can't sell units reserved by current/future rentals
+    sold = defaultdict(int)
+    for item in sale_lines:
+        sold[item.variant_id] += item.quantity
+
+    if sold:
+        for_sale = free_units_for_sale_many(variants[vid] for vid in sold)
+        for variant_id, quantity in sold.items():
+            if for_sale[variant_id] < quantity:
+                raise CheckoutError(
+                    f"Sorry, only {for_sale[variant_id]} of {variants[variant_id].product.name} "
+                    f"({variants[variant_id]}) left in stock."
+                )
+
+    # 2. Rentals: one occupancy query across every rented variant and date
+    if rent_lines:
+        start = min(item.rental_start_date for item in rent_lines)
+        end = max(item.rental_end_date for item in rent_lines)
+        rented_ids = {item.variant_id for item in rent_lines}
+        daily = daily_free_units([variants[vid] for vid in rented_ids], start, end)
+
+        days = (end - start).days + 1
+        booked = defaultdict(lambda: [0] * days)
+        for item in rent_lines:
+            lo = (item.rental_start_date - start).days
+            hi = (item.rental_end_date - start).days
+            for day in range(lo, hi + 1):
+                booked[item.variant_id][day] += item.quantity
+
+        for variant_id, per_day in booked.items():
+            # Units sold in this same order are gone for every day
+            free = [units - sold.get(variant_id, 0) for units in daily[variant_id]]
+            if any(wanted > available for wanted, available in zip(per_day, free)):
+                variant = variants[variant_id]
+                raise CheckoutError(
+                    f"Sorry, {variant.product.name} ({variant}) is no longer available for your rental dates."
+                )
+
+    return sold
+
+
+def place_order(user, cart):
+    """Turns `cart` into an Order with its sale/rent lines and a Delivery. Returns the Order."""
+    with transaction.atomic():
+        if not connection.features.has_select_for_update:
+            # SQLite has no row locks. Make the first statement a (no-op) write so
+            # the transaction takes the database write lock straight away: other
+            # checkouts then wait on the busy timeout here, instead of validating
+            # the same stock in parallel and failing to upgrade their read lock.
+            cart.items.update(quantity=F('quantity'))
+
+        cart_items = list(cart.items.select_related('product').order_by('id'))
+        if not cart_items:
+            raise CheckoutError("Your cart is empty.")
+        if any(item.variant_id is None for item in cart_items):
+            raise CheckoutError("An item in your bag is no longer available. Please remove it.")
+
+        variants = _lock_variants({item.variant_id for item in cart_items})
+        if len(variants) != len({item.variant_id for item in cart_items}):
+            raise CheckoutError("An item in your bag is no longer available. Please remove it.")
+
+        # Attach the product we already loaded (used in error messages)
+        for item in cart_items:
+            variants[item.variant_id].product = item.product
+
+        sale_lines = [item for item in cart_items if not item.is_rental]
+        rent_lines = [item for item in cart_items if item.is_rental]
+
+        sold = _validate(sale_lines, rent_lines, variants)
+
+        # --- WRITE ---
+        order = Order.objects.create(
+            user=user,
+            total_price=sum(item.total_cost() for item in cart_items)
+        )
+        Delivery.objects.create(order=order, status='Pending')
+
+        # bulk_create skips SaleOrder.save(), stock is taken below in one statement per variant
+        sale_orders = SaleOrder.objects.bulk_create([
+            SaleOrder(
+                parent_order=order,
+                user=user,
+                variant_id=item.variant_id,
+                quantity=item.quantity,
+                total_price=item.total_cost(),
+                status=SaleOrder.STATUS_PENDING,
+            )
+            for item in sale_lines
+        ])
+        rent_bookings = RentBooking.objects.bulk_create([
+            RentBooking(
+                parent_order=order,
+                user=user,
+                variant_id=item.variant_id,
+                start_date=item.rental_start_date,
+                end_date=item.rental_end_date,
+                quantity=item.quantity,
+                total_price=item.total_cost(),
+                status=RentBooking.STATUS_PENDING,
+            )
+            for item in rent_lines
+        ])
+
+        for variant_id, quantity in sold.items():
+            updated = ProductVariant.objects.filter(
+                id=variant_id, stock_quantity__gte=quantity
+            ).update(stock_quantity=F('stock_quantity') - quantity)
+            if not updated:
+                raise CheckoutError(f"Sorry, {variants[variant_id].product.name} just sold out.")
+
+        # bulk_create sends no post_save, so count the lines in the daily rollup here
+        DailyStat.record_lines(sales=sale_orders, rentals=rent_bookings)
+
+        if sold:
+            Product.rebuild_availability(product_ids={variants[vid].product_id for vid in sold})
+
+        cart.items.all().delete()
+
+    return order
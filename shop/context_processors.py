@@ -0,0 +1,11 @@
+from .cart_badge import EMPTY_BADGE, cart_badge
+
+
+def cart(request):
+    """Supplies `cart_count` and `cart_total` for the bag badge on every page."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        badge = EMPTY_BADGE
+    else:
+        badge = cart_badge(user.id)
+    return {'cart_count': badge['count'], 'cart_total': badge['total']}
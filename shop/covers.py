@@ -0,0 +1,56 @@
+import random
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import Product
+
+# ==========================================
+# COLLECTION PAGE COVERS
+# ==========================================
+# The collection page shows one random thumbnail per category and the
+# sub-category pills. Both are precomputed into one cache entry (a pool of
+# thumbnail URLs per category + sub-category counts), so a page view only
+# does random.choice() in memory. Product save/delete drops the entry
+# (see signals.py); the timeout bounds staleness for other processes.
+
+CACHE_KEY = 'shop:collection_covers'
+CACHE_TIMEOUT = 15 * 60
+COVER_POOL_SIZE = 50    # newest products with a thumbnail, per category
+
+
+def build_collection_covers():
+    storage = Product._meta.get_field('thumbnail').storage
+    pools = {}
+    for category, _ in Product.CATEGORY_CHOICES:
+        thumbnails = (
+            Product.objects.filter(category=category, thumbnail__isnull=False)
+            .exclude(thumbnail='')
+            .order_by('-created_at', '-id')
+            .values_list('thumbnail', flat=True)[:COVER_POOL_SIZE]
+        )
+        pools[category] = [storage.url(name) for name in thumbnails]
+
+    sub_cats = list(
+        Product.objects.values('sub_category').annotate(count=Count('id')).order_by('-count')
+    )
+    return {'pools': pools, 'sub_cats': sub_cats}
+
+
+def collection_covers():
+    """The cached cover pools and sub-category counts, rebuilt if missing or expired."""
+    data = cache.get(CACHE_KEY)
+    if data is None:
+        data = build_collection_covers()
+        cache.set(CACHE_KEY, data, CACHE_TIMEOUT)
+    return data
+
+
+def invalidate_collection_covers():
+    cache.delete(CACHE_KEY)
+
+
+def pick_cover(data, category):
+    """A random thumbnail URL for `category`, or None if it has none."""
+    pool = data['pools'].get(category)
+    return random.choice(pool) if pool else None
@@ -0,0 +1,137 @@
+from django.db.models import Prefetch
+from django.urls import reverse
+
+from .models import ChangeCounter, Delivery, DeliveryTombstone, RentBooking, SaleOrder
+from .routing import sequence_stops
+
+# ==========================================
+# DRIVER TASK DELTA-SYNC
+# ==========================================
+# Every Delivery save takes a new version from the 'delivery' ChangeCounter.
+# A driver app keeps the highest version it has seen and asks for
+# "everything since N": open tasks that changed are sent in full, tasks that
+# were closed, reassigned or deleted come back as ids in `removed`.
+# Whatever the size of the delta, it's a fixed number of queries.
+# `route` is the full list of open task ids in suggested visiting order, or
+# null when the stops can't be located (see routing.py): keep the app's own order.
+
+CLOSED_STATUSES = ['Delivered', 'Cancelled', 'Failed']
+
+
+def driver_tasks(driver):
+    """The driver's open tasks with everything a task card shows, in 4 queries."""
+    return (
+        Delivery.objects.filter(delivery_boy=driver)
+        .exclude(status__in=CLOSED_STATUSES)
+        .select_related('order__user__delivery_profile')
+        .prefetch_related(
+            Prefetch('order__sale_items', queryset=SaleOrder.objects.select_related('variant__product').order_by('id')),
+            Prefetch('order__rent_items', queryset=RentBooking.objects.select_related('variant__product').order_by('id')),
+        )
+    )
+
+
+def _start_zip(driver):
+    profile = getattr(driver.user, 'delivery_profile', None)
+    return profile.zip_code if profile else None
+
+
+def route_for(driver, tasks=None):
+    """
+    Open task ids in visiting order (see routing.py), or None if there is no
+    route to suggest. Pass the already loaded `tasks` to skip the query for their zip codes.
+    """
+    if tasks is None:
+        stops = list(
+            Delivery.objects.filter(delivery_boy=driver)
+            .exclude(status__in=CLOSED_STATUSES)
+            .order_by('assigned_at', 'id')
+            .values_list('id', 'order__user__delivery_profile__zip_code')
+        )
+    else:
+        stops = []
+        for task in tasks:
+            profile = getattr(task.order.user, 'delivery_profile', None)
+            stops.append((task.id, profile.zip_code if profile else None))
+    return sequence_stops(stops, start_zip=_start_zip(driver))
+
+
+def _line(item, kind):
+    variant = item.variant
+    return {
+        'type': kind,
+        'name': variant.product.name if variant else '',
+        'size': variant.size if variant else '',
+        'color': variant.color if variant else '',
+        'quantity': item.quantity,
+    }
+
+
+def task_payload(task):
+    order = task.order
+    user = order.user
+    profile = getattr(user, 'delivery_profile', None)
+    return {
+        'id': task.id,
+        'version': task.version,
+        'status': task.status,
+        'otp_sent': bool(task.otp),     # never the code itself
+        'assigned_at': task.assigned_at.isoformat(),
+        'order': {
+            'id': order.id,
+            'total_price': str(order.total_price),
+            'items': [_line(i, 'sale') for i in order.sale_items.all()] +
+                     [_line(i, 'rent') for i in order.rent_items.all()],
+        },
+        'customer': {
+            'name': f"{user.first_name} {user.last_name}".strip(),
+            'phone': profile.phone if profile else '',
+            'address': profile.address if profile else '',
+            'city': profile.city if profile else '',
+            'zip_code': profile.zip_code if profile else '',
+        },
+        'actions': {
+            'update_status': reverse('update_task_status', args=[task.id]),
+            'send_otp': reverse('send_delivery_otp', args=[task.id]),
+            'complete': reverse('complete_delivery', args=[task.id]),
+        },
+    }
+
+
+def sync_tasks(driver, since=0):
+    """
+    Changes to `driver`'s task list after version `since` (0 = full snapshot).
+    The returned `version` is what the app should send as `since` next time.
+    """
+    # Read the counter first: anything committed later gets picked up next sync
+    version = ChangeCounter.current('delivery')
+
+    if since <= 0:
+        tasks = list(driver_tasks(driver).filter(version__lte=version).order_by('assigned_at', 'id'))
+        return {
+            'version': version,
+            'full': True,
+            'tasks': [task_payload(t) for t in tasks],
+            'removed': [],
+            'route': route_for(driver, tasks),
+        }
+
+    window = {'version__gt': since, 'version__lte': version}
+
+    # Open tasks that changed, plus the ids of tasks that were closed...
+    changed = list(Delivery.objects.filter(delivery_boy=driver, **window).values_list('id', 'status'))
+    open_ids = [task_id for task_id, status in changed if status not in CLOSED_STATUSES]
+    removed = {task_id for task_id, status in changed if status in CLOSED_STATUSES}
+
+    # ...or taken off this driver's list (still-open tasks reassigned back later win)
+    removed.update(DeliveryTombstone.objects.filter(driver=driver, **window).values_list('delivery_id', flat=True))
+    removed.difference_update(open_ids)
+
+    tasks = driver_tasks(driver).filter(id__in=open_ids) if open_ids else []
+    return {
+        'version': version,
+        'full': False,
+        'tasks': [task_payload(t) for t in tasks],
+        'removed': sorted(removed),
+        'route': route_for(driver),
+    }
@@ -0,0 +1,133 @@
+import heapq
+import math
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+
+from .delivery_sync import CLOSED_STATUSES
+from .models import ChangeCounter, Delivery, DeliveryBoy
+
+# ==========================================
+# BATCH DRIVER DISPATCHER
+# ==========================================
+# Assigns every unassigned Pending delivery to an active driver in one pass:
+#   1. group the deliveries by the customer's (city, zip_code)
+#   2. every driver may take up to `target` open tasks, where target is the
+#      even share of (tasks they already hold + new ones)
+#   3. each group goes to drivers based in the same zip, then the same city,
+#      least loaded first, and whatever is left to the least loaded driver
+# All assignments are written in one transaction, one UPDATE per driver.
+
+UPDATE_CHUNK = 900      # ids per UPDATE (stays under SQLite's old 999-variable limit)
+
+
+def _area(city, zip_code):
+    return (city or '').strip().lower(), (zip_code or '').strip().upper()
+
+
+def plan_assignments(deliveries, drivers):
+    """
+    deliveries: [(delivery_id, city, zip_code)]
+    drivers:    [(driver_id, city, zip_code, open_tasks)]
+    Returns {delivery_id: driver_id}. Pure function, no queries.
+    """
+    if not deliveries or not drivers:
+        return {}
+
+    load = {driver_id: open_tasks for driver_id, _, _, open_tasks in drivers}
+    target = math.ceil((sum(load.values()) + len(deliveries)) / len(drivers))
+
+    by_zip, by_city = defaultdict(list), defaultdict(list)
+    for driver_id, city, zip_code, _ in drivers:
+        city, zip_code = _area(city, zip_code)
+        if zip_code:
+            by_zip[zip_code].append(driver_id)
+        if city:
+            by_city[city].append(driver_id)
+
+    groups = defaultdict(list)
+    for delivery_id, city, zip_code in deliveries:
+        groups[_area(city, zip_code)].append(delivery_id)
+
+    plan = {}
+    leftovers = []
+
+    # Biggest areas first, while local drivers still have room
+    for (city, zip_code), ids in sorted(groups.items(), key=lambda g: (-len(g[1]), g[0])):
+        local = by_zip.get(zip_code, []) if zip_code else []
+        nearby = [d for d in by_city.get(city, []) if d not in local] if city else []
+
+        for pool in (local, nearby):
+            for driver_id in sorted(pool, key=lambda d: (load[d], d)):
+                if not ids:
+                    break
+                room = target - load[driver_id]
+                if room <= 0:
+                    continue
+                taken, ids = ids[:room], ids[room:]
+                for delivery_id in taken:
+                    plan[delivery_id] = driver_id
+                load[driver_id] += len(taken)
+        leftovers.extend(ids)
+
+    # No local driver with room: least loaded driver overall
+    heap = [(count, driver_id) for driver_id, count in load.items()]
+    heapq.heapify(heap)
+    for delivery_id in leftovers:
+        count, driver_id = heapq.heappop(heap)
+        plan[delivery_id] = driver_id
+        heapq.heappush(heap, (count + 1, driver_id))
+
+    return plan
+
+
+def dispatch_pending(delivery_ids=None, dry_run=False):
+    """
+    Assigns unassigned Pending deliveries (optionally only `delivery_ids`).
+    Returns {driver_id: number of deliveries given to them}.
+    """
+    with transaction.atomic():
+        if not connection.features.has_select_for_update:
+            # SQLite: take the write lock first (see checkout.place_order)
+            ChangeCounter.objects.filter(name='delivery').update(value=F('value'))
+
+        pending = Delivery.objects.filter(status='Pending', delivery_boy__isnull=True)
+        if delivery_ids is not None:
+            pending = pending.filter(id__in=delivery_ids)
+        if connection.features.has_select_for_update:
+            pending = pending.select_for_update(of=('self',))
+        deliveries = list(pending.values_list(
+            'id', 'order__user__delivery_profile__city', 'order__user__delivery_profile__zip_code'
+        ))
+
+        drivers = list(
+            DeliveryBoy.objects.filter(is_active=True)
+            .annotate(open_tasks=Count('deliveries', filter=~Q(deliveries__status__in=CLOSED_STATUSES)))
+            .values_list('id', 'user__delivery_profile__city', 'user__delivery_profile__zip_code', 'open_tasks')
+        )
+
+        plan = plan_assignments(deliveries, drivers)
+        if not plan or dry_run:
+            return _summary(plan)
+
+        # One new sync version for the whole batch (driver apps only need "> since").
+        # One UPDATE per driver: bulk_update's per-row CASE costs ~1s per 1,000 rows.
+        version = ChangeCounter.next('delivery')
+        by_driver = defaultdict(list)
+        for delivery_id, driver_id in plan.items():
+            by_driver[driver_id].append(delivery_id)
+        for driver_id, ids in by_driver.items():
+            for i in range(0, len(ids), UPDATE_CHUNK):
+                Delivery.objects.filter(id__in=ids[i:i + UPDATE_CHUNK]).update(
+                    delivery_boy_id=driver_id, version=version
+                )
+
+    return _summary(plan)
+
+
+def _summary(plan):
+    counts = defaultdict(int)
+    for driver_id in plan.values():
+        counts[driver_id] += 1
+    return dict(counts)
@@ -0,0 +1,120 @@
+import datetime
+import heapq
+
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import Order, RentBooking, SaleOrder
+from .streaming import csv_lines, jsonl_lines
+
+# ==========================================
+# FINANCE EXPORT
+# ==========================================
+# Orders placed in a date range, one line per sale line / rent line (an order
+# without lines still gets one line), with the order, customer and delivery
+# columns repeated on each. Used by the dashboard download and
+# `manage.py export_finance`.
+#
+# Each line type is ONE joined query read through QuerySet.iterator(), which
+# fetches CHUNK_SIZE rows at a time (a server-side cursor on PostgreSQL), and
+# the three sorted streams are merged on (order date, order id), so memory
+# stays flat whatever the range and the first lines go out straight away.
+# Lines not attached to an Order (pre-checkout-pipeline data) are not exported.
+
+CHUNK_SIZE = 2000
+
+FINANCE_COLUMNS = [
+    'order_id', 'order_date', 'customer_id', 'customer_email', 'order_total',
+    'delivery_status', 'delivered_at', 'driver',
+    'line_type', 'line_id', 'product_id', 'product_name', 'size', 'color', 'quantity',
+    'line_total', 'line_status', 'rent_start', 'rent_end', 'returned_at', 'late_fee',
+]
+
+# Order/customer/delivery columns, relative to the Order model
+_ORDER_FIELDS = [
+    'id', 'created_at', 'user_id', 'user__email', 'total_price',
+    'delivery_info__status', 'delivery_info__delivered_at', 'delivery_info__delivery_boy__user__first_name',
+]
+_LINE_FIELDS = ['id', 'variant__product_id', 'variant__product__name', 'variant__size', 'variant__color',
+                'quantity', 'total_price', 'status']
+_RENT_FIELDS = ['start_date', 'end_date', 'returned_at', 'late_fee']
+
+
+def parse_range(date_from, date_to):
+    """
+    Parses 'YYYY-MM-DD' bounds (either may be empty: from defaults to the 1st of
+    this month, to defaults to today). Raises ValueError for bad or reversed dates.
+    """
+    today = timezone.localdate()
+    start = datetime.date.fromisoformat(date_from) if date_from else today.replace(day=1)
+    end = datetime.date.fromisoformat(date_to) if date_to else today
+    if start > end:
+        raise ValueError("'from' is after 'to'")
+    return start, end
+
+
+def day_range(date_from, date_to):
+    """[start, end) datetimes covering the local calendar days date_from..date_to."""
+    tz = timezone.get_current_timezone()
+    start = datetime.datetime.combine(date_from, datetime.time.min, tzinfo=tz)
+    end = datetime.datetime.combine(date_to + datetime.timedelta(days=1), datetime.time.min, tzinfo=tz)
+    return start, end
+
+
+def _text(value):
+    # Local ISO timestamps/dates, so finance's spreadsheets don't see UTC offsets flip
+    if isinstance(value, datetime.datetime):
+        return timezone.localtime(value).isoformat(timespec='seconds')
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return value
+
+
+def _lines(model, start, end, line_type, extra=()):
+    """(sort key, output row) for every line of `model` whose order is in [start, end)."""
+    order = [f'parent_order__{f}' for f in _ORDER_FIELDS]
+    rows = (
+        model.objects
+        .filter(parent_order__created_at__gte=start, parent_order__created_at__lt=end)
+        .order_by('parent_order__created_at', 'parent_order_id', 'id')
+        .values_list(*order, *_LINE_FIELDS, *extra)
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    n = len(order)
+    for row in rows:
+        rent = row[n + len(_LINE_FIELDS):] or (None,) * len(_RENT_FIELDS)
+        yield (row[1], row[0], line_type, row[n]), [*row[:n], line_type, *row[n:n + len(_LINE_FIELDS)], *rent]
+
+
+def _orders_without_lines(start, end):
+    orders = (
+        Order.objects
+        .filter(created_at__gte=start, created_at__lt=end)
+        .filter(~Exists(SaleOrder.objects.filter(parent_order=OuterRef('pk'))),
+                ~Exists(RentBooking.objects.filter(parent_order=OuterRef('pk'))))
+        .order_by('created_at', 'id')
+        .values_list(*_ORDER_FIELDS)
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    padding = [None] * (len(FINANCE_COLUMNS) - len(_ORDER_FIELDS))
+    for row in orders:
+        yield (row[1], row[0], '', 0), [*row, *padding]
+
+
+def finance_rows(date_from, date_to):
+    """Export rows (lists in FINANCE_COLUMNS order) for orders placed on date_from..date_to, oldest first."""
+    start, end = day_range(date_from, date_to)
+    merged = heapq.merge(
+        _lines(SaleOrder, start, end, 'sale'),
+        _lines(RentBooking, start, end, 'rent', extra=_RENT_FIELDS),
+        _orders_without_lines(start, end),
+        key=lambda item: item[0],
+    )
+    for _, row in merged:
+        yield [_text(value) for value in row]
+
+
+def export_lines(date_from, date_to, fmt='csv'):
+    """The finance export as an iterator of text lines (for a StreamingHttpResponse or a file)."""
+    rows = finance_rows(date_from, date_to)
+    return csv_lines(FINANCE_COLUMNS, rows) if fmt == 'csv' else jsonl_lines(FINANCE_COLUMNS, rows)
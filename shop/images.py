@@ -0,0 +1,127 @@
+import base64
+import hashlib
+import io
+import logging
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageFilter, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# IMAGE DERIVATIVES
+# ==========================================
+# Uploaded product images are served through resized webp copies instead of
+# the (often 1800px) originals. Derivatives are named after the SHA-256 of
+# the original's bytes, e.g. derivatives/ab/ab12...-480.webp, so a URL never
+# changes meaning and can be cached forever; the same upload twice reuses them.
+#
+# Each image field <f> has two companion columns on its model:
+#   <f>_hash         content hash ('' = no derivatives yet, serve the original)
+#   <f>_placeholder  tiny blurred webp as a data: URI, shown while loading
+#
+# Generated offline by `manage.py build_image_derivatives` (run with --loop as a
+# worker): a new upload just clears <f>_hash in signals.py, which queues it.
+
+DERIVATIVE_WIDTHS = (240, 480, 960)
+DERIVATIVE_DIR = 'derivatives'
+WEBP_QUALITY = 80
+PLACEHOLDER_WIDTH = 16
+
+
+def derivative_name(content_hash, width):
+    return f"{DERIVATIVE_DIR}/{content_hash[:2]}/{content_hash}-{width}.webp"
+
+
+def _webp_bytes(image, quality=WEBP_QUALITY):
+    buffer = io.BytesIO()
+    image.save(buffer, 'WEBP', quality=quality, method=4)
+    return buffer.getvalue()
+
+
+def _resized(image, width):
+    # Never upscale: small originals just get re-encoded at their own width
+    if image.width <= width:
+        return image
+    height = max(round(image.height * width / image.width), 1)
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def _prepare(source):
+    image = Image.open(source)
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if image.mode in ('LA', 'PA') or 'transparency' in image.info else 'RGB')
+    return image
+
+
+def placeholder_data_uri(image):
+    tiny = _resized(image, PLACEHOLDER_WIDTH).filter(ImageFilter.GaussianBlur(1))
+    return 'data:image/webp;base64,' + base64.b64encode(_webp_bytes(tiny, quality=30)).decode('ascii')
+
+
+def build_derivatives(field_file):
+    """
+    Writes the webp derivatives for one image file (skipping any that already
+    exist) and returns (content_hash, placeholder_data_uri).
+    """
+    storage = field_file.storage
+    with field_file.open('rb') as f:
+        data = f.read()
+    content_hash = hashlib.sha256(data).hexdigest()
+
+    image = _prepare(io.BytesIO(data))
+    for width in DERIVATIVE_WIDTHS:
+        name = derivative_name(content_hash, width)
+        if not storage.exists(name):
+            storage.save(name, ContentFile(_webp_bytes(_resized(image, width))))
+
+    return content_hash, placeholder_data_uri(image)
+
+
+def generate_for(instance, field_name):
+    """
+    Builds derivatives for `instance.<field_name>` and stores hash/placeholder on
+    the row. True when stored, False when the file can't be processed, None when
+    the row got a new upload meanwhile (that one is queued in turn).
+    """
+    field_file = getattr(instance, field_name)
+    if not field_file:
+        return False
+
+    try:
+        content_hash, placeholder = build_derivatives(field_file)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        # Unreadable/missing file: keep serving the original
+        logger.warning("Could not build derivatives for %s #%s %s: %s",
+                       type(instance).__name__, instance.pk, field_name, e)
+        return False
+
+    # .update(): no save() signals, no loop. Only if the row still has the file we
+    # processed: a newer upload must keep its cleared hash, not get these derivatives
+    updated = type(instance).objects.filter(pk=instance.pk, **{field_name: field_file.name}).update(**{
+        f'{field_name}_hash': content_hash,
+        f'{field_name}_placeholder': placeholder,
+    })
+    if not updated:
+        return None
+    setattr(instance, f'{field_name}_hash', content_hash)
+    setattr(instance, f'{field_name}_placeholder', placeholder)
+    return True
+
+
+def srcset_for(field_file, content_hash):
+    """'url 240w, url 480w, url 960w' for a processed image, or '' if it has no derivatives yet."""
+    if not field_file or not content_hash:
+        return ''
+    storage = field_file.storage
+    return ', '.join(f"{storage.url(derivative_name(content_hash, w))} {w}w" for w in DERIVATIVE_WIDTHS)
+
+
+def fallback_url(field_file, content_hash):
+    """Best single URL: the middle derivative if there is one, else the original."""
+    if not field_file:
+        return ''
+    if content_hash:
+        return field_file.storage.url(derivative_name(content_hash, DERIVATIVE_WIDTHS[1]))
+    return field_file.url
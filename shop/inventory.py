@@ -0,0 +1,259 @@
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import BooleanField, Case, Count, DecimalField, F, Max, Min, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .availability import reserved_units_many
+from .models import Product, ProductVariant, update_rows
+
+# ==========================================
+# INVENTORY MANAGER LISTING
+# ==========================================
+# The inventory page lists products with per-product stock figures that the
+# database computes in the same query as the page itself (GROUP BY product):
+#   stock_total    units over all variants
+#   variant_count  number of variants
+#   price_min/max  cheapest / dearest sale price (0 when nothing is for sale)
+#   low_variants   variants with LOW_STOCK_UNITS units or fewer
+#   low_stock      low_variants > 0
+# Filters and sorts work on these annotations (HAVING / ORDER BY), and the
+# page is keyset-paginated like the storefront, so only one page of products
+# (plus their variants, for the edit forms) is ever loaded.
+
+LOW_STOCK_UNITS = 5
+INVENTORY_PER_PAGE = 25
+
+# sort key -> keyset ordering (always ends with a unique column)
+INVENTORY_SORTS = {
+    'newest': ('-created_at', '-id'),
+    'name': ('name', 'id'),
+    'stock': ('stock_total', 'id'),
+    '-stock': ('-stock_total', '-id'),
+    'variants': ('-variant_count', '-id'),
+    'price': ('price_min', 'id'),
+    '-price': ('-price_max', '-id'),
+    'low': ('-low_variants', 'stock_total', 'id'),
+}
+
+STOCK_FILTERS = {
+    'low': Q(low_stock=True, stock_total__gt=0),
+    'out': Q(stock_total=0),
+    'in': Q(stock_total__gt=0),
+}
+
+_MONEY = DecimalField(max_digits=10, decimal_places=2)
+
+
+def with_stock_stats(products):
+    """Annotates a Product queryset with the inventory figures above."""
+    for_sale = Q(variants__sale_price__gt=0)
+    return products.annotate(
+        stock_total=Coalesce(Sum('variants__stock_quantity'), 0),
+        variant_count=Count('variants'),
+        price_min=Coalesce(Min('variants__sale_price', filter=for_sale), Value(0), output_field=_MONEY),
+        price_max=Coalesce(Max('variants__sale_price', filter=for_sale), Value(0), output_field=_MONEY),
+        low_variants=Count('variants', filter=Q(variants__stock_quantity__lte=LOW_STOCK_UNITS)),
+    ).annotate(
+        low_stock=Case(When(low_variants__gt=0, then=Value(True)), default=Value(False), output_field=BooleanField()),
+    )
+
+
+def filter_inventory(products, category='', rentable='', stock=''):
+    """Applies the inventory page's filters to an annotated queryset (unknown values are ignored)."""
+    if category in {value for value, _ in products.model.CATEGORY_CHOICES}:
+        products = products.filter(category=category)
+    if rentable in ('yes', 'no'):
+        products = products.filter(is_rentable=(rentable == 'yes'))
+    if stock in STOCK_FILTERS:
+        products = products.filter(STOCK_FILTERS[stock])
+    return products
+
+
+# ==========================================
+# BULK STOCK & PRICE ADJUSTMENTS
+# ==========================================
+# One request adjusts many variants (stocktakes, re-pricing) instead of one
+# form POST + full save() per variant. Each row is
+#   {"variant_id": 12, "stock": 40}          absolute stock
+#   {"variant_id": 12, "stock_delta": -3}    relative, safe against concurrent checkouts
+#   ... optionally with "sale_price" / "rent_price" (absolute).
+# The whole batch is validated first, then applied in ONE transaction with
+# the batch's variants locked: deltas as "stock = stock + d" and absolute
+# values, each with executemany UPDATEs, so the query count doesn't grow with
+# the batch. Like a sale at checkout, a row may not take stock below the units
+# open rentals need (availability.reserved_units_many), nor below 0.
+# All or nothing: if any row fails, nothing is saved. Every row gets a result.
+
+MAX_ADJUSTMENTS = 5000
+
+_PRICE = DecimalField(max_digits=10, decimal_places=2)
+
+
+class _Rejected(Exception):
+    """Rolls the batch back from inside the transaction."""
+
+
+def _clean_int(value, name):
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"{name} must be a whole number")
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a whole number")
+
+
+def _clean_price(value, name):
+    try:
+        price = _PRICE.clean(str(value), None)
+    except ValidationError as e:
+        raise ValueError(f"{name}: {' '.join(e.messages)}")
+    if price < 0:
+        raise ValueError(f"{name} can't be negative")
+    return price
+
+
+def clean_adjustment(raw):
+    """Validates one row. Returns {'variant_id', 'stock', 'stock_delta', 'sale_price', 'rent_price_per_day'}."""
+    if not isinstance(raw, dict):
+        raise ValueError("each row must be an object")
+    if 'stock' in raw and 'stock_delta' in raw:
+        raise ValueError("give either stock or stock_delta, not both")
+
+    row = {'variant_id': _clean_int(raw.get('variant_id'), 'variant_id')}
+    if raw.get('stock') is not None:
+        row['stock'] = _clean_int(raw['stock'], 'stock')
+        if row['stock'] < 0:
+            raise ValueError("stock can't be negative")
+    if raw.get('stock_delta') is not None:
+        row['stock_delta'] = _clean_int(raw['stock_delta'], 'stock_delta')
+    if raw.get('sale_price') is not None:
+        row['sale_price'] = _clean_price(raw['sale_price'], 'sale_price')
+    if raw.get('rent_price') is not None:
+        row['rent_price_per_day'] = _clean_price(raw['rent_price'], 'rent_price')
+    if len(row) == 1:
+        raise ValueError("nothing to change")
+    return row
+
+
+def _validate(raw_rows):
+    """Returns (cleaned rows, {index: error}); checks every row before anything is written."""
+    rows, errors = [], {}
+    for i, raw in enumerate(raw_rows):
+        try:
+            rows.append(clean_adjustment(raw))
+        except ValueError as e:
+            errors[i] = str(e)
+            rows.append(None)
+
+    ids = [row['variant_id'] for row in rows if row]
+    known = set(ProductVariant.objects.filter(id__in=ids).values_list('id', flat=True))
+    seen = set()
+    for i, row in enumerate(rows):
+        if row is None:
+            continue
+        if row['variant_id'] not in known:
+            errors[i] = f"variant {row['variant_id']} does not exist"
+        elif row['variant_id'] in seen:
+            errors[i] = f"variant {row['variant_id']} appears more than once"
+        seen.add(row['variant_id'])
+    return rows, errors
+
+
+def _lock(variant_ids):
+    variants = ProductVariant.objects.filter(id__in=sorted(variant_ids)).order_by('id')
+    if connection.features.has_select_for_update:
+        list(variants.select_for_update().values_list('id', flat=True))
+    else:
+        # Same trick as checkout: a no-op write takes SQLite's write lock up front,
+        # so the stock checks below can't be invalidated by a concurrent checkout
+        variants.update(stock_quantity=F('stock_quantity'))
+
+
+def _apply(rows):
+    """Writes validated rows (inside the caller's transaction). Returns {index: error} for rows it refused."""
+    _lock(row['variant_id'] for row in rows)
+
+    # 1. Stock that goes down is checked against the (locked) current stock
+    #    and the units reserved by rentals, as checkout checks a sale
+    deltas = {row['variant_id']: row['stock_delta'] for row in rows if row.get('stock_delta')}
+    lowered = [row['variant_id'] for row in rows if 'stock' in row or row.get('stock_delta', 0) < 0]
+    stock = dict(ProductVariant.objects.filter(id__in=lowered).values_list('id', 'stock_quantity'))
+    reserved = reserved_units_many(lowered) if lowered else {}
+    errors = {}
+    for i, row in enumerate(rows):
+        variant_id = row['variant_id']
+        if variant_id not in stock:
+            continue
+        new_stock = row['stock'] if 'stock' in row else stock[variant_id] + row['stock_delta']
+        if new_stock >= reserved[variant_id] and new_stock >= 0:
+            continue
+        if reserved[variant_id]:
+            errors[i] = f"{reserved[variant_id]} units are reserved by rentals, stock can't go down to {new_stock}"
+        else:
+            errors[i] = f"only {stock[variant_id]} in stock, can't remove {-row['stock_delta']}"
+    if errors:
+        return errors
+
+    # 2. Deltas: one UPDATE ... SET stock = stock + %s WHERE id = %s for all of them
+    if deltas:
+        qn = connection.ops.quote_name
+        column = qn(ProductVariant._meta.get_field('stock_quantity').column)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"UPDATE {qn(ProductVariant._meta.db_table)} SET {column} = {column} + %s WHERE {qn('id')} = %s",
+                [(delta, variant_id) for variant_id, delta in deltas.items()],
+            )
+
+    # 3. Absolute values, one executemany UPDATE per set of columns
+    by_columns = defaultdict(list)
+    for row in rows:
+        values = {field: row[key] for key, field in (
+            ('stock', 'stock_quantity'), ('sale_price', 'sale_price'), ('rent_price_per_day', 'rent_price_per_day'),
+        ) if key in row}
+        if values:
+            by_columns[tuple(sorted(values))].append(ProductVariant(id=row['variant_id'], **values))
+    for fields, variants in by_columns.items():
+        update_rows(ProductVariant, variants, list(fields))
+    return errors
+
+
+def apply_adjustments(raw_rows):
+    """
+    Validates and applies a batch of adjustments. Returns (ok, results): one
+    result per input row, in order, with the variant's values after the batch.
+    """
+    if len(raw_rows) > MAX_ADJUSTMENTS:
+        return False, [{'status': 'error', 'error': f"at most {MAX_ADJUSTMENTS} rows per request"}]
+
+    rows, errors = _validate(raw_rows)
+    if not errors:
+        try:
+            with transaction.atomic():
+                errors = _apply(rows)
+                if errors:
+                    raise _Rejected
+                # update() skips signals.py, so refresh the product columns it maintains
+                Product.rebuild_availability(product_ids=sorted(set(
+                    ProductVariant.objects.filter(id__in=[row['variant_id'] for row in rows])
+                    .values_list('product_id', flat=True)
+                )))
+        except _Rejected:
+            pass
+
+    current = ProductVariant.objects.in_bulk([row['variant_id'] for row in rows if row])
+    results = []
+    for i, row in enumerate(rows):
+        raw = raw_rows[i]
+        result = {'variant_id': row['variant_id'] if row else raw.get('variant_id') if isinstance(raw, dict) else None}
+        if i in errors:
+            result.update(status='error', error=errors[i])
+        else:
+            result['status'] = 'skipped' if errors else 'ok'     # valid, but the batch was rejected
+        variant = current.get(row['variant_id']) if row else None
+        if variant:
+            result.update(stock=variant.stock_quantity, sale_price=variant.sale_price,
+                          rent_price=variant.rent_price_per_day)
+        results.append(result)
+    return not errors, results
@@ -0,0 +1,49 @@
+from django.db.models import Prefetch
+from django.template.loader import render_to_string
+
+from .models import Invoice, Order, RentBooking, SaleOrder
+
+# ==========================================
+# INVOICES
+# ==========================================
+# The receipt sent when an order is delivered, also downloadable from
+# "My Orders". An invoice is rendered once per (order, INVOICE_VERSION):
+#   - the order graph (customer, sale lines, rent lines, their variants and
+#     products) is loaded in 3 queries, whatever the number of lines
+#   - invoice.html and invoice.txt are rendered from it and stored in Invoice
+# Re-sends and downloads read the stored copy (1 query, no rendering).
+# Bump INVOICE_VERSION when the invoice templates change.
+
+INVOICE_VERSION = 1
+
+
+def load_order(order_id):
+    """The Order with everything the invoice templates touch (3 queries)."""
+    return (
+        Order.objects
+        .select_related('user')
+        .prefetch_related(
+            Prefetch('sale_items', SaleOrder.objects.select_related('variant__product').order_by('id')),
+            Prefetch('rent_items', RentBooking.objects.select_related('variant__product').order_by('id')),
+        )
+        .get(pk=order_id)
+    )
+
+
+def render_invoice(order):
+    """(html, text) for an order loaded with load_order()."""
+    context = {'order': order}
+    return render_to_string('invoice.html', context), render_to_string('invoice.txt', context).strip() + '\n'
+
+
+def get_invoice(order_id):
+    """The stored Invoice for an order, rendering and saving it the first time."""
+    invoice = Invoice.objects.filter(order_id=order_id, version=INVOICE_VERSION).first()
+    if invoice:
+        return invoice
+
+    html, text = render_invoice(load_order(order_id))
+    invoice = Invoice(order_id=order_id, version=INVOICE_VERSION, html=html, text=text)
+    # A concurrent render (e.g. a download racing the receipt email) stored the same copy
+    Invoice.objects.bulk_create([invoice], ignore_conflicts=True)
+    return invoice
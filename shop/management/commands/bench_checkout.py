@@ -0,0 +1,116 @@
+import random
+import threading
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections, OperationalError
+from django.db.models import Sum
+from django.utils import timezone
+
+from shop.bench import scratch_database, summarize
+from shop.checkout import place_order, CheckoutError
+from shop.models import Cart, CartItem, CustomUser, Product, ProductVariant, SaleOrder
+
+
+class Command(BaseCommand):
+    help = "Checkout throughput benchmark: concurrent buyers racing for the same stock (runs on a scratch DB)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=200)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--lines', type=int, default=5, help="Cart lines per buyer.")
+        parser.add_argument('--variants', type=int, default=20, help="Distinct variants all buyers compete for.")
+        parser.add_argument('--stock', type=int, default=50, help="Starting stock per variant.")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self.setup_data(options)
+            results = self.run(options)
+            self.report(options, results)
+            connections.close_all()
+
+    # 1. DATA: a few hot variants, many buyers with full carts
+    def setup_data(self, options):
+        rng = random.Random(options['seed'])
+        product = Product.objects.create(name='Bench Product', is_rentable=True)
+        variants = ProductVariant.objects.bulk_create([
+            ProductVariant(product=product, size=str(i), stock_quantity=options['stock'],
+                           sale_price=100, rent_price_per_day=10)
+            for i in range(options['variants'])
+        ])
+
+        start = timezone.now().date() + timedelta(days=3)
+        for i in range(options['buyers']):
+            user = CustomUser.objects.create(username=f'buyer{i}', email=f'buyer{i}@bench.local')
+            cart = Cart.objects.create(user=user)
+            items = []
+            for variant in rng.sample(variants, min(options['lines'], len(variants))):
+                is_rental = rng.random() < 0.2
+                items.append(CartItem(
+                    cart=cart, product=product, variant=variant,
+                    quantity=rng.randint(1, 2), is_rental=is_rental,
+                    rental_start_date=start if is_rental else None,
+                    rental_end_date=start + timedelta(days=rng.randint(1, 4)) if is_rental else None,
+                    price_at_add=10 if is_rental else 100,
+                ))
+            CartItem.objects.bulk_create(items)
+
+        self.initial_stock = options['stock'] * options['variants']
+
+    # 2. RUN: every thread checks out its share of buyers as fast as it can
+    def run(self, options):
+        user_ids = list(CustomUser.objects.filter(username__startswith='buyer').values_list('id', flat=True))
+        shares = [user_ids[i::options['threads']] for i in range(options['threads'])]
+        results = {'latencies': [], 'placed': 0, 'rejected': 0, 'locked': 0}
+        lock = threading.Lock()
+
+        def worker(ids):
+            local = {'latencies': [], 'placed': 0, 'rejected': 0, 'locked': 0}
+            for user_id in ids:
+                user = CustomUser.objects.get(id=user_id)
+                began = time.perf_counter()
+                try:
+                    place_order(user, user.cart)
+                    local['placed'] += 1
+                except CheckoutError:
+                    local['rejected'] += 1
+                except OperationalError:
+                    local['locked'] += 1
+                local['latencies'].append(time.perf_counter() - began)
+            connections.close_all()
+            with lock:
+                results['latencies'] += local['latencies']
+                for key in ('placed', 'rejected', 'locked'):
+                    results[key] += local[key]
+
+        threads = [threading.Thread(target=worker, args=(share,)) for share in shares]
+        began = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        results['elapsed'] = time.perf_counter() - began
+        return results
+
+    # 3. REPORT: throughput, latency and the no-oversell invariant
+    def report(self, options, results):
+        final_stock = ProductVariant.objects.aggregate(s=Sum('stock_quantity'))['s'] or 0
+        sold = SaleOrder.objects.aggregate(s=Sum('quantity'))['s'] or 0
+        negative = ProductVariant.objects.filter(stock_quantity__lt=0).count()
+        consistent = (self.initial_stock - final_stock == sold) and negative == 0
+
+        latency = summarize(results['latencies'])
+        elapsed = results['elapsed']
+
+        self.stdout.write(f"Buyers: {options['buyers']}  Threads: {options['threads']}  Lines/cart: {options['lines']}")
+        self.stdout.write(f"Placed: {results['placed']}  Rejected (no stock): {results['rejected']}  DB locked: {results['locked']}")
+        self.stdout.write(f"Elapsed: {elapsed:.2f}s  Throughput: {results['placed'] / elapsed:.1f} orders/s")
+        self.stdout.write(f"Latency: p50 {latency['p50_ms']}ms  p95 {latency['p95_ms']}ms  max {latency['max_ms']}ms")
+        self.stdout.write(f"Units sold: {sold}  Stock left: {final_stock} / {self.initial_stock}")
+
+        if consistent:
+            self.stdout.write(self.style.SUCCESS("Stock is consistent: no overselling."))
+        else:
+            self.stdout.write(self.style.ERROR("Stock mismatch: oversold or lost updates!"))
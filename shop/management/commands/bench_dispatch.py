@@ -0,0 +1,86 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Count
+
+from shop.bench import scratch_database
+from shop.dispatch import dispatch_pending
+from shop.models import CustomUser, Delivery, DeliveryBoy, DeliveryProfile, Order
+
+
+class Command(BaseCommand):
+    help = "Dispatcher benchmark: assign N pending deliveries to M drivers in one pass (runs on a scratch DB)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--deliveries', type=int, default=10000)
+        parser.add_argument('--drivers', type=int, default=50)
+        parser.add_argument('--zips', type=int, default=40, help="Distinct zip codes spread over 5 cities.")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self.setup_data(options)
+            began = time.perf_counter()
+            summary = dispatch_pending()
+            elapsed = time.perf_counter() - began
+            self.report(options, summary, elapsed)
+            connections.close_all()
+
+    # 1. DATA: customers and drivers spread over a handful of cities/zips
+    def setup_data(self, options):
+        rng = random.Random(options['seed'])
+        areas = [(f"City {i % 5}", f"{10000 + i}") for i in range(options['zips'])]
+
+        def make_users(prefix, count):
+            # bulk_create skips the post_save that creates DeliveryProfile, so add them here
+            users = CustomUser.objects.bulk_create([
+                CustomUser(username=f'{prefix}{i}', email=f'{prefix}{i}@bench.local') for i in range(count)
+            ])
+            DeliveryProfile.objects.bulk_create([
+                DeliveryProfile(user=user, city=city, zip_code=zip_code)
+                for user, (city, zip_code) in zip(users, (rng.choice(areas) for _ in users))
+            ])
+            return users
+
+        drivers = make_users('driver', options['drivers'])
+        DeliveryBoy.objects.bulk_create([
+            DeliveryBoy(user=user, vehicle_number=f'BN-{i}', vehicle_type='Bike', salary=0)
+            for i, user in enumerate(drivers)
+        ])
+
+        customers = make_users('customer', max(options['deliveries'] // 5, 1))
+        orders = Order.objects.bulk_create(
+            [Order(user=rng.choice(customers), total_price=100) for _ in range(options['deliveries'])],
+            batch_size=2000,
+        )
+        Delivery.objects.bulk_create([Delivery(order=order, status='Pending') for order in orders], batch_size=2000)
+
+    # 2. REPORT: time, balance and how often a driver stayed in their own area
+    def report(self, options, summary, elapsed):
+        assigned = sum(summary.values())
+        loads = list(
+            DeliveryBoy.objects.annotate(n=Count('deliveries')).values_list('n', flat=True)
+        )
+        same_zip = self.local_share()
+
+        self.stdout.write(f"Deliveries: {options['deliveries']}  Drivers: {options['drivers']}  Zips: {options['zips']}")
+        self.stdout.write(f"Assigned: {assigned} in {elapsed * 1000:.0f}ms")
+        self.stdout.write(f"Tasks per driver: min {min(loads)}  max {max(loads)}")
+        self.stdout.write(f"Same zip as driver: {same_zip:.0%}")
+
+        if assigned == options['deliveries'] and elapsed < 1:
+            self.stdout.write(self.style.SUCCESS("OK: everything assigned in under a second."))
+        else:
+            self.stdout.write(self.style.ERROR("Too slow or deliveries left unassigned!"))
+
+    def local_share(self):
+        rows = Delivery.objects.values_list(
+            'order__user__delivery_profile__zip_code', 'delivery_boy__user__delivery_profile__zip_code'
+        )
+        total = local = 0
+        for customer_zip, driver_zip in rows:
+            total += 1
+            local += customer_zip == driver_zip
+        return local / total if total else 0
@@ -0,0 +1,312 @@
+import json
+import statistics
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Count, Q
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils import timezone
+
+from shop.bench import scratch_database, summarize
+from shop.delivery_sync import CLOSED_STATUSES
+from shop.models import (
+    Cart, CartItem, CustomUser, Delivery, DeliveryBoy, Order, Product, ProductVariant, RentBooking,
+)
+from shop.synthetic import SyntheticStore
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'shop' / 'data' / 'route_baseline.json'
+
+
+class Command(BaseCommand):
+    help = ("Latency/query-count benchmark of every URL route against a synthetic store (runs on a scratch DB). "
+            "Compares with a stored JSON baseline and fails on regressions; --save records a new baseline.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--products', type=int, default=500)
+        parser.add_argument('--orders', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--runs', type=int, default=10, help="Timed requests per route and round (after one warm-up).")
+        parser.add_argument('--rounds', type=int, default=3,
+                            help="Passes over all routes; a route's p50 is the median of its per-round p50s.")
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+        parser.add_argument('--save', action='store_true', help="Write this run's numbers as the new baseline.")
+        # The gate is on the median: a p95 of ~10 requests is one outlier away from a failure
+        parser.add_argument('--threshold', type=float, default=0.5,
+                            help="Allowed p50 slowdown vs the baseline (0.5 = 50%%).")
+        parser.add_argument('--min-ms', type=float, default=10.0,
+                            help="Ignore p50 slowdowns smaller than this many milliseconds (timer noise).")
+        parser.add_argument('--only', default='', help="Comma-separated route labels to run.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()    # 'testserver' host, locmem email
+        try:
+            with scratch_database():
+                self.setup_data(options)
+                results = self.run(options)
+                connections.close_all()
+        finally:
+            teardown_test_environment()
+
+        self.report(options, results)
+
+    # 1. DATA: a synthetic store plus the people/objects the routes act on
+    def setup_data(self, options):
+        self.stdout.write("Generating dataset...")
+        SyntheticStore(
+            users=options['users'], products=options['products'], orders=options['orders'],
+            drivers=max(options['users'] // 50, 2), seed=options['seed'], prefix='bench',
+        ).generate()
+
+        # The busiest customer and driver: worst case for my-orders and the delivery dashboard
+        self.customer = CustomUser.objects.get(id=(
+            Order.objects.values('user').annotate(n=Count('id')).order_by('-n', 'user').values_list('user', flat=True)[0]
+        ))
+        self.driver = (
+            DeliveryBoy.objects.annotate(open=Count('deliveries', filter=~Q(deliveries__status__in=CLOSED_STATUSES)))
+            .order_by('-open', 'id').select_related('user').first()
+        )
+        self.admin = CustomUser.objects.create_superuser('bench_admin', 'bench_admin@example.com', 'x')
+
+        self.variant = ProductVariant.objects.filter(sale_price__gt=0).order_by('id').first()
+        ProductVariant.objects.filter(id=self.variant.id).update(stock_quantity=10 ** 6)    # checkout never runs dry
+        self.product = self.variant.product
+        self.order = Order.objects.filter(user=self.customer).order_by('-id').first()
+        self.delivered_order = (
+            Order.objects.filter(user=self.customer, delivery_info__status='Delivered').order_by('-id').first()
+        )
+        self.cart, _ = Cart.objects.get_or_create(user=self.customer)
+        self.cart_item = self.cart.items.create(product=self.product, variant=self.variant, price_at_add=10)
+        self.cart_snapshot = list(self.cart.items.all())
+        self.rental_order = Order.objects.create(user=self.customer, total_price=10)   # keeps self.order as generated
+        self.task = Delivery.objects.filter(delivery_boy=self.driver).exclude(status__in=CLOSED_STATUSES).first()
+
+        self.clients = {'anon': Client(), 'otp': Client(), 'throwaway': Client()}
+        for role, user in (('customer', self.customer), ('driver', self.driver.user), ('admin', self.admin)):
+            self.clients[role] = Client()
+            self.clients[role].force_login(user)
+
+    # Fresh objects for routes that consume what they act on (not timed)
+    def fresh_cart_item(self):
+        return self.cart.items.create(product=self.product, variant=self.variant, price_at_add=10).id
+
+    def reset_cart(self):
+        # Placing an order empties the cart: every round starts from the same one
+        self.cart.items.all().delete()
+        CartItem.objects.bulk_create(self.cart_snapshot)
+
+    def fill_cart(self):
+        self.fresh_cart_item()
+        return []
+
+    def fresh_product(self):
+        return Product.objects.create(name='Bench throwaway', category='Men').id
+
+    def fresh_variant(self):
+        return ProductVariant.objects.create(product=self.product, size='XXXL', sale_price=10).id
+
+    def fresh_delivery(self, otp=None):
+        order = Order.objects.create(user=self.customer, total_price=10)
+        return Delivery.objects.create(order=order, delivery_boy=self.driver, status='Out for Delivery', otp=otp).id
+
+    def fresh_rental(self):
+        today = timezone.localdate()
+        return RentBooking.objects.create(
+            user=self.customer, variant=self.variant, parent_order=self.rental_order, status='Active',
+            start_date=today - timedelta(days=3), end_date=today, total_price=10,
+        ).id
+
+    def catalog_upload(self):
+        # 200 variant lines: the first request creates the products, later ones update them
+        lines = ['name,category,is_rentable,size,color,stock_quantity,sale_price']
+        lines += [f'Bench import {i // 5},Men,true,{"SMLXW"[i % 5]},Blue,5,{100 + i}.00' for i in range(200)]
+        return [], {'catalog': SimpleUploadedFile('catalog.csv', '\n'.join(lines).encode(), 'text/csv')}
+
+    def relogin(self):
+        self.clients['throwaway'].force_login(self.customer)
+        return []
+
+    def cases(self):
+        """(label, url name, role, method, prepare() -> (args, data) or None for static requests)."""
+        c = self
+        return [
+            # Storefront
+            ('home', 'home', 'anon', 'get', None),
+            ('home?q', 'home', 'anon', 'get', lambda: ([], {'q': 'shirt'})),
+            ('home?type=rent', 'home', 'anon', 'get', lambda: ([], {'type': 'rent'})),
+            ('product_detail', 'product_detail', 'anon', 'get', lambda: ([c.product.id], {})),
+            ('collection', 'collection', 'anon', 'get', None),
+            ('view_category', 'view_category', 'anon', 'get', lambda: (['Women'], {})),
+            ('rentals', 'rentals', 'anon', 'get', None),
+            # Accounts
+            ('register', 'register', 'anon', 'get', None),
+            ('login', 'login', 'anon', 'get', None),
+            ('send_otp', 'send_otp', 'otp', 'json', lambda: ([], {'email': 'new-customer@example.com'})),
+            ('logout', 'logout', 'throwaway', 'get', lambda: (c.relogin(), {})),
+            ('user_profile', 'user_profile', 'customer', 'get', None),
+            # Cart & checkout
+            ('add_to_cart', 'add_to_cart', 'customer', 'post',
+             lambda: ([c.product.id], {'variant_id': c.variant.id, 'action': 'buy', 'quantity': 1})),
+            ('view_cart', 'view_cart', 'customer', 'get', None),
+            ('update_cart', 'update_cart', 'customer', 'post', lambda: ([c.cart_item.id], {'quantity': 2})),
+            ('remove_from_cart', 'remove_from_cart', 'customer', 'get', lambda: ([c.fresh_cart_item()], {})),
+            ('checkout', 'checkout', 'customer', 'get', None),
+            ('checkout (place order)', 'checkout', 'customer', 'post', lambda: (c.fill_cart(), {
+                'phone': '9999999999', 'address': '1 Bench Road', 'city': 'Ahmedabad',
+                'zip_code': '380001', 'state': 'Gujarat',
+            })),
+            ('order_success', 'order_success', 'customer', 'get', None),
+            ('my_orders', 'my_orders', 'customer', 'get', None),
+            ('order_invoice', 'order_invoice', 'customer', 'get', lambda: ([c.delivered_order.id], {})),
+            # Delivery
+            ('delivery_dashboard', 'delivery_dashboard', 'driver', 'get', None),
+            ('delivery_sync', 'delivery_sync', 'driver', 'get', None),
+            ('update_task_status', 'update_task_status', 'driver', 'post',
+             lambda: ([c.task.id], {'new_status': 'Shipped'})),
+            ('send_delivery_otp', 'send_delivery_otp', 'driver', 'post', lambda: ([c.task.id], {})),
+            ('complete_delivery', 'complete_delivery', 'driver', 'post',
+             lambda: ([c.fresh_delivery(otp='123456')], {'otp': '123456'})),
+            # Admin dashboards
+            ('admin_dashboard', 'admin_dashboard', 'admin', 'get', None),
+            ('admin_dashboard?days=365', 'admin_dashboard', 'admin', 'get', lambda: ([], {'days': 365})),
+            ('admin_orders', 'admin_orders', 'admin', 'get', None),
+            ('admin_order_detail', 'admin_order_detail', 'admin', 'get', lambda: ([c.order.id], {})),
+            ('assign_driver', 'assign_driver', 'admin', 'post',
+             lambda: ([c.order.id], {'driver_id': c.driver.id})),
+            ('admin_users', 'admin_users', 'admin', 'get', None),
+            ('admin_rentals', 'admin_rentals', 'admin', 'get', None),
+            ('rental_manager', 'rental_manager', 'admin', 'get', None),
+            ('process_return', 'process_return', 'admin', 'post', lambda: ([c.fresh_rental()], {})),
+            # Inventory
+            ('inventory', 'inventory', 'admin', 'get', None),
+            ('add_product', 'add_product', 'admin', 'get', None),
+            ('add_variant', 'add_variant', 'admin', 'post', lambda: ([c.product.id], {
+                'size': 'XXXL', 'color': 'Bench', 'stock': 1, 'price': '100.00',
+            })),
+            ('update_stock', 'update_stock', 'admin', 'post',
+             lambda: ([c.variant.id], {'stock': 10 ** 6, 'price': c.variant.sale_price})),
+            ('adjust_stock', 'adjust_stock', 'admin', 'json', lambda: ([], {'rows': [
+                {'variant_id': c.variant.id, 'stock_delta': 1, 'sale_price': str(c.variant.sale_price)},
+            ]})),
+            ('delete_variant', 'delete_variant', 'admin', 'post', lambda: ([c.fresh_variant()], {})),
+            ('delete_product', 'delete_product', 'admin', 'post', lambda: ([c.fresh_product()], {})),
+            ('import_catalog', 'import_catalog', 'admin', 'post', c.catalog_upload),
+            ('export_catalog', 'export_catalog', 'admin', 'get', None),
+            ('finance_export', 'finance_export', 'admin', 'get', None),
+            ('django_admin', 'admin:index', 'admin', 'get', None),
+        ]
+
+    # 2. RUN: `rounds` passes over the routes, each one warm-up plus `runs` timed
+    # requests per route. Rounds are interleaved so a burst of machine noise
+    # lands in one round of a few routes, and the per-round median drops it.
+    def run(self, options):
+        only = {label.strip() for label in options['only'].split(',') if label.strip()}
+        cases = [case for case in self.cases() if not only or case[0] in only]
+        self.check_coverage(cases, only)
+
+        samples = {case[0]: {'latencies': [], 'p50s': [], 'queries': [], 'statuses': set()} for case in cases}
+        for round_number in range(max(options['rounds'], 1)):
+            self.stdout.write(f"Round {round_number + 1}...")
+            self.reset_cart()
+            for case in cases:
+                self.run_case(case, options['runs'], samples[case[0]])
+
+        results = {}
+        for label, sample in samples.items():
+            stats = summarize(sample['latencies'])
+            results[label] = {
+                'p50_ms': round(statistics.median(sample['p50s']), 2),
+                'p95_ms': stats['p95_ms'],
+                'queries': max(sample['queries']),
+                'status': max(sample['statuses']),
+            }
+            self.stdout.write(f"  {label:28} p50 {results[label]['p50_ms']:8.2f}ms  p95 {stats['p95_ms']:8.2f}ms  "
+                              f"{results[label]['queries']:4} queries  "
+                              f"HTTP {'/'.join(map(str, sorted(sample['statuses'])))}")
+        return results
+
+    def run_case(self, case, runs, sample):
+        label, name, role, method, prepare = case
+        client = self.clients[role]
+        latencies = []
+        for i in range(runs + 1):
+            args, data = prepare() if prepare else ([], {})
+            url = reverse(name, args=args)
+            with CaptureQueriesContext(connection) as captured:
+                began = time.perf_counter()
+                if method == 'json':
+                    response = client.post(url, json.dumps(data), content_type='application/json')
+                else:
+                    response = getattr(client, method)(url, data)
+                if response.streaming:
+                    b''.join(response.streaming_content)    # the body is the work
+                elapsed = time.perf_counter() - began
+            sample['statuses'].add(response.status_code)
+            if i:   # skip the warm-up
+                latencies.append(elapsed)
+                sample['queries'].append(len(captured))
+        sample['latencies'].extend(latencies)
+        sample['p50s'].append(summarize(latencies)['p50_ms'])
+
+    def check_coverage(self, cases, only):
+        """Warns about named routes in the URLconf that no case exercises."""
+        if only:
+            return
+        covered = {name for _, name, _, _, _ in cases}
+        missing = sorted(name for name in self.route_names(get_resolver().url_patterns) if name not in covered)
+        if missing:
+            self.stdout.write(self.style.WARNING(f"Routes without a benchmark case: {', '.join(missing)}"))
+
+    def route_names(self, patterns, namespace=''):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                if pattern.namespace != 'admin':    # Django admin: only its index is benchmarked
+                    yield from self.route_names(pattern.url_patterns, namespace)
+            elif isinstance(pattern, URLPattern) and pattern.name:
+                yield namespace + pattern.name
+
+    # 3. REPORT: compare with the baseline, optionally save a new one
+    def report(self, options, results):
+        path = Path(options['baseline'])
+        dataset = {key: options[key] for key in ('users', 'products', 'orders', 'seed', 'runs', 'rounds')}
+        errors = [label for label, r in results.items() if r['status'] >= 400]
+        regressions = []
+
+        if path.exists():
+            baseline = json.loads(path.read_text())
+            if baseline.get('dataset') != dataset:
+                self.stdout.write(self.style.WARNING(
+                    f"Baseline was recorded with {baseline.get('dataset')}, this run used {dataset}."
+                ))
+            for label, r in results.items():
+                base = baseline.get('routes', {}).get(label)
+                if base is None:
+                    self.stdout.write(f"  {label}: new route, no baseline")
+                    continue
+                slower = r['p50_ms'] - base['p50_ms']
+                if r['p50_ms'] > base['p50_ms'] * (1 + options['threshold']) and slower > options['min_ms']:
+                    regressions.append(f"{label}: p50 {base['p50_ms']}ms -> {r['p50_ms']}ms")
+                if r['queries'] > base['queries']:
+                    regressions.append(f"{label}: {base['queries']} -> {r['queries']} queries")
+        elif not options['save']:
+            self.stdout.write(self.style.WARNING(f"No baseline at {path}; run with --save to record one."))
+
+        if options['save']:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps({'dataset': dataset, 'routes': results}, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(f"Baseline saved to {path}")
+
+        for label in errors:
+            self.stdout.write(self.style.ERROR(f"  {label}: HTTP {results[label]['status']}"))
+        for line in regressions:
+            self.stdout.write(self.style.ERROR(f"  {line}"))
+        if errors or regressions:
+            raise CommandError(f"{len(regressions)} regressions, {len(errors)} failing routes.")
+        self.stdout.write(self.style.SUCCESS(f"OK: {len(results)} routes, no regressions."))
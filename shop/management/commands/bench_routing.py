@@ -0,0 +1,54 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.bench import summarize
+from shop.routing import distance_matrix, sequence_stops
+
+
+class Command(BaseCommand):
+    help = "Route sequencing benchmark: order N stops spread over random zip centroids (no database)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stops', type=int, default=200)
+        parser.add_argument('--zips', type=int, default=400, help="Random centroids in a ~30km square.")
+        parser.add_argument('--runs', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        latencies = []
+        given_km = routed_km = 0.0
+
+        for _ in range(options['runs']):
+            centroids = {
+                f"{10000 + i}": (40.6 + rng.random() * 0.27, -74.1 + rng.random() * 0.35)
+                for i in range(options['zips'])
+            }
+            zips = list(centroids)
+            start = rng.choice(zips)
+            stops = [(i, rng.choice(zips)) for i in range(options['stops'])]
+
+            began = time.perf_counter()
+            route = sequence_stops(stops, start_zip=start, centroids=centroids)
+            latencies.append(time.perf_counter() - began)
+
+            zip_of = dict(stops)
+            given_km += self.length([start] + [z for _, z in stops], centroids)
+            routed_km += self.length([start] + [zip_of[key] for key in route], centroids)
+
+        stats = summarize(latencies)
+        self.stdout.write(f"Stops: {options['stops']}  Zips: {options['zips']}  Runs: {options['runs']}")
+        self.stdout.write(f"p50 {stats['p50_ms']}ms  p95 {stats['p95_ms']}ms  max {stats['max_ms']}ms")
+        self.stdout.write(f"Route length: {routed_km / options['runs']:.1f}km "
+                          f"(given order: {given_km / options['runs']:.1f}km)")
+
+        if stats['p95_ms'] < 100:
+            self.stdout.write(self.style.SUCCESS("OK: p95 under 100ms."))
+        else:
+            self.stdout.write(self.style.ERROR("Too slow!"))
+
+    def length(self, zips, centroids):
+        dist = distance_matrix([centroids[z] for z in zips])
+        return sum(dist[i][i + 1] for i in range(len(zips) - 1))
@@ -0,0 +1,154 @@
+import multiprocessing
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+
+from shop.bench import scratch_database, summarize
+from shop.checkout import CheckoutError, place_order
+from shop.models import Cart, CartItem, CustomUser, Order, Product, ProductVariant
+from shop.synthetic import SyntheticStore
+
+
+def _worker(role, index, options, results):
+    """One process: runs `role` operations in a loop until the deadline and reports back."""
+    connections.close_all()     # never share the parent's SQLite handle across fork
+    rng = random.Random(options['seed'] * 1000 + index)
+    deadline = time.perf_counter() + options['seconds']
+    latencies, done, locked = [], 0, 0
+
+    if role == 'writer':
+        user = CustomUser.objects.get(username=f'contention_writer{index}')
+        cart = Cart.objects.get(user=user)
+        variant_ids = list(ProductVariant.objects.filter(sale_price__gt=0).values_list('id', 'product_id')[:200])
+    else:
+        product_ids = list(Product.objects.values_list('id', flat=True))
+        customer_ids = list(Order.objects.values_list('user_id', flat=True).distinct()[:500])
+
+    while time.perf_counter() < deadline:
+        began = time.perf_counter()
+        try:
+            if role == 'writer' and len(latencies) % 2:
+                # An admin edit: read, then write, in one transaction (like update_stock).
+                # Under BEGIN DEFERRED two of these can deadlock on the read->write upgrade.
+                with transaction.atomic():
+                    variant = ProductVariant.objects.get(id=rng.choice(variant_ids)[0])
+                    variant.stock_quantity += 1
+                    variant.save(update_fields=['stock_quantity'])
+            elif role == 'writer':
+                # A checkout: fill the cart, then place the order (stock lock, inserts, cart clear)
+                variant_id, product_id = rng.choice(variant_ids)
+                CartItem.objects.create(cart=cart, product_id=product_id, variant_id=variant_id, price_at_add=10)
+                place_order(user, cart)
+            else:
+                # A storefront page and a my-orders page
+                list(Product.objects.order_by('-created_at', '-id')[:24])
+                list(ProductVariant.objects.filter(product_id=rng.choice(product_ids)))
+                list(Order.objects.filter(user_id=rng.choice(customer_ids))
+                     .prefetch_related('sale_items', 'rent_items').order_by('-created_at')[:20])
+            done += 1
+        except OperationalError:
+            locked += 1     # "database is locked"
+        except CheckoutError:
+            pass
+        latencies.append(time.perf_counter() - began)
+
+    connections.close_all()
+    results.put((role, done, locked, latencies))
+
+
+class Command(BaseCommand):
+    help = ("Multi-process read/write contention benchmark on a scratch SQLite file, "
+            "once per connection profile in settings.SQLITE_PROFILES.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--orders', type=int, default=5000, help="Size of the seeded dataset.")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--profiles', default='default,production')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("This benchmark only applies to SQLite.")
+        profiles = [p.strip() for p in options['profiles'].split(',') if p.strip()]
+        unknown = [p for p in profiles if p not in settings.SQLITE_PROFILES]
+        if unknown:
+            raise CommandError(f"Unknown profile(s): {', '.join(unknown)}. Known: {', '.join(settings.SQLITE_PROFILES)}")
+
+        summaries = {}
+        for profile in profiles:
+            summaries[profile] = self.run_profile(profile, options)
+        self.report(options, summaries)
+
+    # 1. One fresh database per profile (journal_mode=WAL sticks to the file)
+    def run_profile(self, profile, options):
+        saved = connection.settings_dict.get('OPTIONS', {})
+        connection.settings_dict['OPTIONS'] = dict(settings.SQLITE_PROFILES[profile])
+        connection.close()
+        try:
+            with scratch_database():
+                self.setup_data(options)
+                connections.close_all()
+                return self.run(options)
+        finally:
+            connection.settings_dict['OPTIONS'] = saved
+            connection.close()
+
+    def setup_data(self, options):
+        SyntheticStore(users=500, products=300, orders=options['orders'], drivers=5,
+                       seed=options['seed'], prefix='contention').generate()
+        ProductVariant.objects.update(stock_quantity=10 ** 6)   # writers never run out
+        for i in range(options['writers']):
+            user = CustomUser.objects.create(username=f'contention_writer{i}', email=f'writer{i}@bench.local')
+            Cart.objects.create(user=user)
+
+    # 2. Readers and writers as separate processes, all hammering the same file
+    def run(self, options):
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        processes = [
+            context.Process(target=_worker, args=(role, i, options, results))
+            for role, count in (('reader', options['readers']), ('writer', options['writers']))
+            for i in range(count)
+        ]
+        for p in processes:
+            p.start()
+
+        totals = {role: {'done': 0, 'locked': 0, 'latencies': []} for role in ('reader', 'writer')}
+        for _ in processes:
+            role, done, locked, latencies = results.get()
+            totals[role]['done'] += done
+            totals[role]['locked'] += locked
+            totals[role]['latencies'] += latencies
+        for p in processes:
+            p.join()
+        return totals
+
+    # 3. REPORT: operations/s, lock errors and latency per role and profile
+    def report(self, options, summaries):
+        seconds = options['seconds']
+        self.stdout.write(f"Readers: {options['readers']}  Writers: {options['writers']}  Duration: {seconds}s per profile")
+        for profile, totals in summaries.items():
+            self.stdout.write(f"\n[{profile}]")
+            for role, data in totals.items():
+                latency = summarize(data['latencies'])
+                self.stdout.write(
+                    f"  {role + 's':8} {data['done'] / seconds:8.1f} ops/s   locked errors: {data['locked']:5}   "
+                    f"p50 {latency['p50_ms']}ms  p95 {latency['p95_ms']}ms  max {latency['max_ms']}ms"
+                )
+
+        if 'default' in summaries and 'production' in summaries:
+            base, tuned = summaries['default'], summaries['production']
+            self.stdout.write("")
+            for role in ('reader', 'writer'):
+                before, after = base[role]['done'], tuned[role]['done']
+                ratio = after / before if before else float('inf')
+                self.stdout.write(f"{role.capitalize()} throughput, production vs default: {ratio:.1f}x")
+            if tuned['writer']['locked'] == 0 and tuned['reader']['locked'] == 0:
+                self.stdout.write(self.style.SUCCESS("OK: no 'database is locked' errors with the production profile."))
+            else:
+                self.stdout.write(self.style.ERROR("The production profile still hit 'database is locked'!"))
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.images import generate_for
+from shop.models import Product, ProductImage
+
+
+class Command(BaseCommand):
+    help = "Generates the webp derivatives + blur placeholders for product thumbnails and gallery images."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help="Re-process every image, not just the ones without derivatives.")
+        parser.add_argument('--loop', action='store_true',
+                            help="Keep running as a worker, picking up new uploads.")
+        parser.add_argument('--interval', type=float, default=10.0, help="Seconds between passes (with --loop).")
+
+    def handle(self, *args, **options):
+        failed_ids = set()    # unreadable files: retried on the next start, not on every pass
+        reprocess = options['all']
+        while True:
+            for model, field in ((Product, 'thumbnail'), (ProductImage, 'image')):
+                rows = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                if not reprocess:
+                    rows = rows.filter(**{f'{field}_hash': ''})
+
+                done = failed = 0
+                for obj in rows.only('id', field).iterator(chunk_size=200):
+                    if (model, obj.pk) in failed_ids:
+                        continue
+                    stored = generate_for(obj, field)
+                    if stored:
+                        done += 1
+                    elif stored is False:
+                        failed_ids.add((model, obj.pk))
+                        failed += 1
+
+                if done or failed or not options['loop']:
+                    self.stdout.write(f"{model.__name__}.{field}: {done} processed, {failed} failed.")
+
+            if not options['loop']:
+                break
+            reprocess = False
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS("Image derivatives are up to date."))
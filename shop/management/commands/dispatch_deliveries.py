@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from shop.dispatch import dispatch_pending
+from shop.models import DeliveryBoy
+
+
+class Command(BaseCommand):
+    help = "Assigns every unassigned pending delivery to an active driver (balanced, grouped by city/zip)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Show the plan without saving it.")
+
+    def handle(self, *args, **options):
+        summary = dispatch_pending(dry_run=options['dry_run'])
+        if not summary:
+            self.stdout.write("Nothing to dispatch (no pending deliveries or no active drivers).")
+            return
+
+        names = dict(DeliveryBoy.objects.filter(id__in=summary).values_list('id', 'user__first_name'))
+        for driver_id, count in sorted(summary.items(), key=lambda item: -item[1]):
+            self.stdout.write(f"  {names.get(driver_id) or driver_id}: {count}")
+
+        verb = "Would assign" if options['dry_run'] else "Assigned"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {sum(summary.values())} deliveries to {len(summary)} drivers."))
@@ -0,0 +1,29 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from shop import catalog_io
+
+
+class Command(BaseCommand):
+    help = "Streams the whole catalog as CSV or JSONL, in the format import_catalog reads."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', help="File to write (default: stdout).")
+        parser.add_argument('--format', choices=catalog_io.FORMATS, help="Default: from --output's extension, else csv.")
+        parser.add_argument('--chunk-size', type=int, default=catalog_io.CHUNK_SIZE, help="Products per query.")
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or catalog_io.format_for(options['output'])
+        lines = catalog_io.export_lines(fmt, chunk_size=options['chunk_size'])
+
+        if not options['output']:
+            sys.stdout.writelines(lines)
+            return
+
+        count = -1 if fmt == 'csv' else 0   # don't count the CSV header
+        with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+            for line in lines:
+                f.write(line)
+                count += 1
+        self.stdout.write(self.style.SUCCESS(f"Exported {count} catalog lines to {options['output']}."))
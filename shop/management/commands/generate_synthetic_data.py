@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.synthetic import PASSWORD, SyntheticStore
+
+
+class Command(BaseCommand):
+    help = "Fills the database with a seeded, reproducible synthetic store (users, catalog, carts, orders, deliveries)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--products', type=int, default=500)
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--drivers', type=int, default=20)
+        parser.add_argument('--days', type=int, default=365, help="Orders are spread over the last N days.")
+        parser.add_argument('--carts', type=float, default=0.3, help="Share of customers with an open cart.")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default='synth', help="Username prefix, so several datasets can coexist.")
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Rows per bulk_create transaction.")
+        parser.add_argument('--images', action='store_true',
+                            help="Also write placeholder product images into MEDIA_ROOT (off by default).")
+
+    def handle(self, *args, **options):
+        store = SyntheticStore(
+            users=options['users'], products=options['products'], orders=options['orders'],
+            drivers=options['drivers'], days=options['days'], carts=options['carts'], seed=options['seed'],
+            prefix=options['prefix'], chunk_size=options['chunk_size'], images=options['images'],
+            log=self.stdout.write,
+        )
+        began = time.perf_counter()
+        try:
+            store.generate()
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        elapsed = time.perf_counter() - began
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {options['orders']} orders for {options['users']} customers "
+            f"in {elapsed:.1f}s. Every synthetic user's password is '{PASSWORD}'."
+        ))
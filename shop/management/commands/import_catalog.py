@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop import catalog_io
+
+
+class Command(BaseCommand):
+    help = ("Upserts products, variants and gallery images from a CSV or JSONL catalog "
+            "(streamed, in chunked transactions). Rent prices are set to 10% of the sale price.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Catalog file (.csv, .jsonl).")
+        parser.add_argument('--format', choices=catalog_io.FORMATS, help="Default: from the file extension.")
+        parser.add_argument('--chunk-size', type=int, default=catalog_io.CHUNK_SIZE, help="Lines per transaction.")
+        parser.add_argument('--dry-run', action='store_true', help="Validate and report, then roll everything back.")
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or catalog_io.format_for(options['path'])
+        began = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as f:
+                result = catalog_io.import_catalog(
+                    catalog_io.text_stream(f), fmt, chunk_size=options['chunk_size'], dry_run=options['dry_run']
+                )
+        except (OSError, UnicodeDecodeError, catalog_io.CatalogError) as e:
+            partial = getattr(e, 'result', None)
+            if partial is not None:
+                self.stdout.write(self.style.WARNING(f"Saved before the error: {partial.summary()}"))
+            raise CommandError(str(e))
+
+        for line_number, error in result.errors:
+            self.stdout.write(self.style.WARNING(f"  line {line_number}: {error}"))
+        if result.error_count > len(result.errors):
+            self.stdout.write(self.style.WARNING(f"  ... and {result.error_count - len(result.errors)} more"))
+
+        prefix = "Dry run, rolled back. " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{result.summary()} in {time.perf_counter() - began:.1f}s."
+        ))
+        if result.images_added and not options['dry_run']:
+            self.stdout.write("Run `manage.py build_image_derivatives` to resize the new images.")
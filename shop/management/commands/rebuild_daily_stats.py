@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from shop.rollups import rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the daily sales/rental rollup (DailyStat) from the order tables."
+
+    def handle(self, *args, **options):
+        count = rebuild_daily_stats()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} daily rollup rows."))
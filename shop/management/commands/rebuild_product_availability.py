@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from shop.models import Product
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the denormalized sale/rent flags, min prices and total stock on every Product."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Products per batch, each written with one executemany UPDATE (update_rows).")
+
+    def handle(self, *args, **options):
+        count = Product.rebuild_availability(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt availability for {count} products."))
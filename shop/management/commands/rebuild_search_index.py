@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from shop.models import Product
+from shop.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Drops and rebuilds the SQLite FTS5 product search index."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Products inserted per batch.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("The product search index is only available on SQLite.")
+
+        count = rebuild_index(Product, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} products."))
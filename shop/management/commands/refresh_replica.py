@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.replica import REPLICA_ALIAS, refresh_replica, replica_configured
+
+
+class Command(BaseCommand):
+    help = "Copies the primary database into the reporting replica with SQLite's online backup API."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep running and refresh periodically.")
+        parser.add_argument('--interval', type=float, default=60.0, help="Seconds between refreshes (with --loop).")
+
+    def handle(self, *args, **options):
+        if not replica_configured():
+            raise CommandError(f"No '{REPLICA_ALIAS}' database in settings.DATABASES.")
+
+        while True:
+            began = time.perf_counter()
+            refresh_replica()
+            self.stdout.write(f"🔁 Replica refreshed in {(time.perf_counter() - began) * 1000:.0f}ms")
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS("Done."))
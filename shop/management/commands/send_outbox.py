@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.outbox import send_due_batch
+
+
+class Command(BaseCommand):
+    help = "Sends queued emails from the outbox in batches over one SMTP connection, with retry/backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Emails sent per SMTP connection.")
+        parser.add_argument('--loop', action='store_true', help="Keep running and poll for new emails.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds to sleep when the outbox is empty (with --loop).")
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+
+        while True:
+            sent, failed = send_due_batch(batch_size=options['batch_size'])
+            total_sent += sent
+            total_failed += failed
+
+            if sent or failed:
+                self.stdout.write(f"📧 Sent {sent}, failed {failed}")
+
+            # Batch was full: there is probably more waiting, go again straight away
+            if sent + failed >= options['batch_size']:
+                continue
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Done. Sent {total_sent}, failed {total_failed}."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from shop.rentals import sweep_overdue
+
+
+class Command(BaseCommand):
+    help = "Marks rentals past their end date as Overdue, stores accrued late fees and queues overdue notices. Run daily."
+
+    def handle(self, *args, **options):
+        newly_overdue, fees, queued = sweep_overdue()
+        self.stdout.write(self.style.SUCCESS(
+            f"{newly_overdue} rental(s) newly overdue, late fees updated on {fees}, {queued} notice(s) queued."
+        ))
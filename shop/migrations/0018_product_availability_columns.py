@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:55
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Q, Sum
+
+
+def fill_availability(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    ProductVariant = apps.get_model('shop', 'ProductVariant')
+
+    rows = ProductVariant.objects.values('product_id').annotate(
+        sale_count=Count('id', filter=Q(sale_price__gt=0)),
+        rent_count=Count('id', filter=Q(rent_price_per_day__gt=0)),
+        min_sale=Min('sale_price', filter=Q(sale_price__gt=0)),
+        min_rent=Min('rent_price_per_day', filter=Q(rent_price_per_day__gt=0)),
+        stock=Sum('stock_quantity'),
+    ).order_by()
+
+    for row in rows:
+        product = Product.objects.filter(pk=row['product_id']).only('is_rentable').first()
+        if product is None:
+            continue
+        Product.objects.filter(pk=product.pk).update(
+            is_for_sale=row['sale_count'] > 0,
+            is_for_rent=product.is_rentable and row['rent_count'] > 0,
+            min_sale_price=row['min_sale'],
+            min_rent_price=row['min_rent'],
+            total_stock=max(row['stock'] or 0, 0),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0017_remove_order_otp_delivery_otp'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='is_for_rent',
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='is_for_sale',
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='min_rent_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='min_sale_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='total_stock',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_availability, migrations.RunPython.noop),
+    ]
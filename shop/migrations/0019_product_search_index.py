@@ -0,0 +1,28 @@
+from django.db import migrations
+
+from shop.search import FTS_TABLE, rebuild_index
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 is SQLite-only; other databases keep using the icontains fallback
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    rebuild_index(apps.get_model('shop', 'Product'), conn=schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0018_product_availability_columns'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
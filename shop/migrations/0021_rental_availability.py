@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:58
+
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def release_rental_stock(apps, schema_editor):
+    # Open rentals used to take units out of stock_quantity when they were
+    # booked. Availability is now computed per date range, so give those
+    # units back to the pool.
+    RentBooking = apps.get_model('shop', 'RentBooking')
+    ProductVariant = apps.get_model('shop', 'ProductVariant')
+    Product = apps.get_model('shop', 'Product')
+
+    held = RentBooking.objects.exclude(status__in=['Returned', 'Cancelled']) \
+        .values('variant_id').annotate(units=Sum('quantity')).order_by()
+
+    product_ids = set()
+    for row in held:
+        ProductVariant.objects.filter(id=row['variant_id']).update(
+            stock_quantity=F('stock_quantity') + row['units']
+        )
+        product_ids.add(ProductVariant.objects.get(id=row['variant_id']).product_id)
+
+    for product_id in product_ids:
+        stock = ProductVariant.objects.filter(product_id=product_id).aggregate(s=Sum('stock_quantity'))['s'] or 0
+        Product.objects.filter(id=product_id).update(total_stock=stock)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0020_product_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rentbooking',
+            index=models.Index(fields=['variant', 'end_date', 'start_date'], name='rent_variant_period_idx'),
+        ),
+        migrations.RunPython(release_rental_stock, migrations.RunPython.noop),
+    ]
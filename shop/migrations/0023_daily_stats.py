@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:06
+
+from django.db import migrations, models
+
+from shop.rollups import rebuild_daily_stats
+
+
+def backfill_daily_stats(apps, schema_editor):
+    # Seed the rollup from existing orders: the incremental updates only add
+    # deltas, which would otherwise start from zero (and go negative)
+    rebuild_daily_stats(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0022_email_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('category', models.CharField(blank=True, default='', max_length=20)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('items_sold', models.PositiveIntegerField(default=0)),
+                ('sales_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('rentals_booked', models.PositiveIntegerField(default=0)),
+                ('rental_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('rentals_pending', models.IntegerField(default=0)),
+                ('rentals_approved', models.IntegerField(default=0)),
+                ('rentals_shipped', models.IntegerField(default=0)),
+                ('rentals_active', models.IntegerField(default=0)),
+                ('rentals_returned', models.IntegerField(default=0)),
+                ('rentals_overdue', models.IntegerField(default=0)),
+                ('rentals_cancelled', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('category', 'day'), name='daily_stat_category_day')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def number_existing_deliveries(apps, schema_editor):
+    # Give every existing delivery its own version and start the counter after them
+    Delivery = apps.get_model('shop', 'Delivery')
+    ChangeCounter = apps.get_model('shop', 'ChangeCounter')
+
+    deliveries = list(Delivery.objects.order_by('id').only('id'))
+    for version, delivery in enumerate(deliveries, start=1):
+        delivery.version = version
+    Delivery.objects.bulk_update(deliveries, ['version'], batch_size=1000)
+    ChangeCounter.objects.create(name='delivery', value=len(deliveries))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0024_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='delivery',
+            name='version',
+            field=models.PositiveBigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='DeliveryTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delivery_id', models.PositiveBigIntegerField()),
+                ('version', models.PositiveBigIntegerField()),
+                ('driver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='delivery_tombstones', to='shop.deliveryboy')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['driver', 'version'], name='delivery_tombstone_sync_idx')],
+            },
+        ),
+        migrations.RunPython(number_existing_deliveries, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,34 @@
-from django.db import models
+from django.db import connection, models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
 from django.utils import timezone
-from django.db.models import F
+from django.db.models import F, Q, Min, Sum, Count
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
+
+def update_rows(model, objs, fields):
+    """
+    Saves `fields` of many objects with one parameterized UPDATE ... WHERE id = ?
+    run through executemany. Same effect as bulk_update(), but without building
+    a CASE WHEN expression per row and field, which costs far more in the ORM
+    than the UPDATE costs in SQLite.
+    """
+    if not objs:
+        return
+    columns = [model._meta.get_field(name) for name in fields]
+    sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+        connection.ops.quote_name(model._meta.db_table),
+        ', '.join(f'{connection.ops.quote_name(field.column)} = %s' for field in columns),
+        connection.ops.quote_name(model._meta.pk.column),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            [field.get_db_prep_save(field.pre_save(obj, False), connection) for field in columns] + [obj.pk]
+            for obj in objs
+        ])
+
+
 # ==========================================
 # 1. CUSTOM USER
 # ==========================================
@@ -29,22 +52,113 @@ class Product(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True, null=True) 
     thumbnail = models.ImageField(upload_to='product_thumbnails/', blank=True, null=True)
+    # Resized webp copies (see shop/images.py); '' until they are generated
+    thumbnail_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
+    thumbnail_placeholder = models.TextField(blank=True, default='', editable=False)
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default='Men')
     sub_category = models.CharField(max_length=50, blank=True, null=True) 
     is_rentable = models.BooleanField(default=False, verbose_name="Available for Rent")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Denormalized from the variants (kept in sync by signals.py) so that
+    # listing pages never have to query variants per product card.
+    is_for_sale = models.BooleanField(default=False, db_index=True, editable=False)
+    is_for_rent = models.BooleanField(default=False, db_index=True, editable=False)
+    min_sale_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+    min_rent_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+    total_stock = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the catalog: ORDER BY created_at DESC, id DESC
+            models.Index(fields=['-created_at', '-id'], name='product_newest_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='product_category_newest_idx'),
+        ]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Stored file name as loaded (None if deferred), so signals.py can tell a new upload from a re-save
+        self._loaded_thumbnail = self.__dict__.get('thumbnail')
+
     def __str__(self):
         return self.name
 
-    @property
-    def is_for_sale(self):
-        return self.variants.filter(sale_price__gt=0).exists()
+    @staticmethod
+    def availability_from_variants(product_ids=None):
+        """Aggregates the variant table into {product_id: availability fields}."""
+        variants = ProductVariant.objects.all()
+        if product_ids is not None:
+            variants = variants.filter(product_id__in=product_ids)
+
+        rows = variants.values('product_id').annotate(
+            sale_count=Count('id', filter=Q(sale_price__gt=0)),
+            rent_count=Count('id', filter=Q(rent_price_per_day__gt=0)),
+            min_sale=Min('sale_price', filter=Q(sale_price__gt=0)),
+            min_rent=Min('rent_price_per_day', filter=Q(rent_price_per_day__gt=0)),
+            stock=Sum('stock_quantity'),
+        ).order_by()
+
+        return {
+            row['product_id']: {
+                'is_for_sale': row['sale_count'] > 0,
+                'has_rent_price': row['rent_count'] > 0,
+                'min_sale_price': row['min_sale'],
+                'min_rent_price': row['min_rent'],
+                'total_stock': max(row['stock'] or 0, 0),
+            }
+            for row in rows
+        }
+
+    def refresh_availability(self):
+        """Recomputes the denormalized availability columns for this product."""
+        data = self.availability_from_variants([self.pk]).get(self.pk)
+        values = {
+            'is_for_sale': bool(data and data['is_for_sale']),
+            'is_for_rent': bool(self.is_rentable and data and data['has_rent_price']),
+            'min_sale_price': data['min_sale_price'] if data else None,
+            'min_rent_price': data['min_rent_price'] if data else None,
+            'total_stock': data['total_stock'] if data else 0,
+        }
+        # .update() instead of save() so we don't re-trigger post_save or touch updated_at
+        Product.objects.filter(pk=self.pk).update(**values)
+        for field, value in values.items():
+            setattr(self, field, value)
+
+    @classmethod
+    def rebuild_availability(cls, batch_size=1000, product_ids=None):
+        """
+        Rebuilds the availability columns for the whole catalog (or just `product_ids`)
+        in set-based batches. Returns the row count.
+        """
+        fields = ['is_for_sale', 'is_for_rent', 'min_sale_price', 'min_rent_price', 'total_stock']
+        products = cls.objects.all()
+        if product_ids is not None:
+            products = products.filter(id__in=product_ids)
+        updated = 0
+        last_id = 0
+
+        while True:
+            batch = list(
+                products.filter(id__gt=last_id).order_by('id').only('id', 'is_rentable')[:batch_size]
+            )
+            if not batch:
+                break
 
-    @property
-    def is_for_rent(self):
-        return self.is_rentable and self.variants.filter(rent_price_per_day__gt=0).exists()
+            data = cls.availability_from_variants([p.id for p in batch])
+            for product in batch:
+                row = data.get(product.id)
+                product.is_for_sale = bool(row and row['is_for_sale'])
+                product.is_for_rent = bool(product.is_rentable and row and row['has_rent_price'])
+                product.min_sale_price = row['min_sale_price'] if row else None
+                product.min_rent_price = row['min_rent_price'] if row else None
+                product.total_stock = row['total_stock'] if row else 0
+
+            update_rows(cls, batch, fields)
+            updated += len(batch)
+            last_id = batch[-1].id
+
+        return updated
 
 class ProductVariant(models.Model):
     product = models.ForeignKey(Product, related_name='variants', on_delete=models.CASCADE)
@@ -61,6 +175,12 @@ class ProductVariant(models.Model):
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, related_name='images', on_delete=models.CASCADE)
     image = models.ImageField(upload_to='product_images/')
+    image_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
+    image_placeholder = models.TextField(blank=True, default='', editable=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._loaded_image = self.__dict__.get('image')     # see Product.__init__
     
     def __str__(self):
         return f"Image for {self.product.name}"
@@ -205,6 +325,12 @@ class RentBooking(models.Model):
     returned_at = models.DateTimeField(null=True, blank=True)
     late_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
 
+    class Meta:
+        indexes = [
+            # Availability lookups: "bookings of variant X still running on/after day D"
+            models.Index(fields=['variant', 'end_date', 'start_date'], name='rent_variant_period_idx'),
+        ]
+
     # --- LOGIC ---
 
     def __init__(self, *args, **kwargs):
@@ -227,28 +353,21 @@ class RentBooking(models.Model):
         return 0.00
 
     def save(self, *args, **kwargs):
-        # 1. NEW RENTAL: Deduct Stock directly
-        if not self.pk:
-            # Atomic update to prevent race conditions
-            ProductVariant.objects.filter(id=self.variant.id).update(
-                stock_quantity=F('stock_quantity') - self.quantity
-            )
-        
-        # 2. EXISTING RENTAL: Check for Return/Cancel to Restock
-        else:
-            # If status changed to Returned or Cancelled...
-            if self.status in [self.STATUS_RETURNED, self.STATUS_CANCELLED]:
-                # ...and it wasn't ALREADY Returned or Cancelled
-                if self.__original_status not in [self.STATUS_RETURNED, self.STATUS_CANCELLED]:
-                    ProductVariant.objects.filter(id=self.variant.id).update(
-                        stock_quantity=F('stock_quantity') + self.quantity
-                    )
-                    
-                    # If returned, set the timestamp automatically if not set
-                    if self.status == self.STATUS_RETURNED and not self.returned_at:
-                        self.returned_at = timezone.now()
+        # NOTE: Rentals don't touch stock_quantity any more. A booking only
+        # occupies units for its own dates (see shop/availability.py), so a
+        # dress booked for next month is still rentable this week.
+
+        # If returned, set the timestamp automatically if not set
+        if self.pk and self.status == self.STATUS_RETURNED and self.__original_status != self.STATUS_RETURNED:
+            if not self.returned_at:
+                self.returned_at = timezone.now()
 
+        is_new = self._state.adding
         super().save(*args, **kwargs)
+
+        # New bookings are counted by the post_save signal (or by checkout for bulk_create)
+        if not is_new:
+            DailyStat.record_rental_status_change(self, self.__original_status, self.status)
         self.__original_status = self.status
 
     def __str__(self):
@@ -280,6 +399,12 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     
     # Optional: You can link this to SaleOrders using a ForeignKey in SaleOrder later if needed
+
+    class Meta:
+        indexes = [
+            # Date-range scans in created_at order (finance export)
+            models.Index(fields=['created_at', 'id'], name='order_created_idx'),
+        ]
     
     def __str__(self):
         return f"Order #{self.id} - {self.user.email}"
@@ -311,8 +436,39 @@ class Delivery(models.Model):
     admin_note = models.TextField(blank=True, null=True)
     otp = models.CharField(max_length=6, blank=True, null=True)
 
+    # Bumped from the 'delivery' ChangeCounter on every save, so driver apps can
+    # ask for "tasks changed since version N" (see shop/delivery_sync.py)
+    version = models.PositiveBigIntegerField(default=0, db_index=True, editable=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.__original_driver_id = self.delivery_boy_id
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            self.version = ChangeCounter.next('delivery')
+            super().save(*args, **kwargs)
+
+            # Taken off a driver's list: leave them a tombstone so their app drops it
+            previous = self.__original_driver_id
+            if previous and previous != self.delivery_boy_id:
+                DeliveryTombstone.objects.create(driver_id=previous, delivery_id=self.pk, version=self.version)
+        self.__original_driver_id = self.delivery_boy_id
+
     def __str__(self):
         return f"Delivery for Order #{self.order.id}"
+
+
+class DeliveryTombstone(models.Model):
+    """A delivery left `driver`'s task list (reassigned or deleted) at `version`."""
+    driver = models.ForeignKey(DeliveryBoy, on_delete=models.CASCADE, related_name='delivery_tombstones')
+    delivery_id = models.PositiveBigIntegerField()
+    version = models.PositiveBigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['driver', 'version'], name='delivery_tombstone_sync_idx'),
+        ]
     
 class DeliveryProfile(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='delivery_profile')
@@ -333,4 +489,237 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def save_user_profile(sender, instance, **kwargs):
-    instance.delivery_profile.save()
\ No newline at end of file
+    instance.delivery_profile.save()
+
+
+# ==========================================
+# 6. EMAIL OUTBOX
+# ==========================================
+
+class OutboxEmail(models.Model):
+    """
+    Emails are queued here (in the same transaction as the change that caused
+    them) and sent later by `manage.py send_outbox`, so requests never wait on SMTP.
+    The (event, object_id, object_status) constraint stops the same notification
+    from being queued twice.
+    """
+    STATE_PENDING = 'Pending'
+    STATE_SENDING = 'Sending'
+    STATE_SENT = 'Sent'
+    STATE_FAILED = 'Failed'
+
+    STATE_CHOICES = (
+        (STATE_PENDING, 'Pending'),
+        (STATE_SENDING, 'Sending'),
+        (STATE_SENT, 'Sent'),
+        (STATE_FAILED, 'Failed'),
+    )
+
+    event = models.CharField(max_length=50)                 # e.g. 'delivery_status'
+    object_id = models.PositiveBigIntegerField(null=True, blank=True)
+    object_status = models.CharField(max_length=50, blank=True, default='')
+
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True, default='')
+
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default=STATE_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.CharField(max_length=32, blank=True, default='')
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'object_id', 'object_status'], name='outbox_dedup'),
+        ]
+        indexes = [
+            models.Index(fields=['state', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} #{self.object_id} ({self.state}) -> {self.to_email}"
+
+
+# ==========================================
+# 7. REPORTING ROLLUPS
+# ==========================================
+
+class DailyStat(models.Model):
+    """
+    One row per (day, category) with that day's sales/rental totals, kept up to
+    date as orders are placed and rentals change status, so the admin dashboard
+    reads O(days) rows instead of scanning the order tables.
+
+    category == ALL_CATEGORIES ('') is the store-wide row; it also carries the
+    order-level numbers (orders, revenue), which can't be split by category.
+
+    The rentals_<status> columns are NET changes: +1 when a booking enters that
+    status on `day`, -1 when it leaves it. Summing them over all days gives the
+    current number of bookings in each status.
+
+    `manage.py rebuild_daily_stats` recomputes everything from the order tables.
+    """
+    ALL_CATEGORIES = ''
+
+    # RentBooking status -> net-change column
+    RENTAL_STATUS_FIELDS = {
+        'Pending': 'rentals_pending',
+        'Approved': 'rentals_approved',
+        'Shipped': 'rentals_shipped',
+        'Active': 'rentals_active',
+        'Returned': 'rentals_returned',
+        'Overdue': 'rentals_overdue',
+        'Cancelled': 'rentals_cancelled',
+    }
+
+    day = models.DateField()
+    category = models.CharField(max_length=20, blank=True, default=ALL_CATEGORIES)
+
+    # Order level (store-wide row only)
+    orders = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    # Line level
+    items_sold = models.PositiveIntegerField(default=0)
+    sales_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    rentals_booked = models.PositiveIntegerField(default=0)
+    rental_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    # Net status changes (can be negative)
+    rentals_pending = models.IntegerField(default=0)
+    rentals_approved = models.IntegerField(default=0)
+    rentals_shipped = models.IntegerField(default=0)
+    rentals_active = models.IntegerField(default=0)
+    rentals_returned = models.IntegerField(default=0)
+    rentals_overdue = models.IntegerField(default=0)
+    rentals_cancelled = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'day'], name='daily_stat_category_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.category or 'All'}"
+
+    # --- INCREMENTAL UPDATES ---
+
+    @classmethod
+    def apply(cls, changes):
+        """Adds `changes` ({(day, category): {field: delta}}) to the rollup, creating rows as needed."""
+        for (day, category), deltas in changes.items():
+            deltas = {field: delta for field, delta in deltas.items() if delta}
+            if not deltas:
+                continue
+            row, _ = cls.objects.get_or_create(day=day, category=category)
+            cls.objects.filter(pk=row.pk).update(**{field: F(field) + delta for field, delta in deltas.items()})
+
+    @classmethod
+    def _add(cls, changes, day, category, **deltas):
+        # Every line-level change counts towards its category AND the store-wide row
+        for key in {(day, category), (day, cls.ALL_CATEGORIES)}:
+            row = changes.setdefault(key, {})
+            for field, delta in deltas.items():
+                row[field] = row.get(field, 0) + delta
+
+    @classmethod
+    def record_order(cls, order):
+        day = timezone.localdate(order.created_at)
+        cls.apply({(day, cls.ALL_CATEGORIES): {'orders': 1, 'revenue': order.total_price}})
+
+    @classmethod
+    def record_lines(cls, sales=(), rentals=()):
+        """Counts new SaleOrder/RentBooking lines (one category lookup for all of them)."""
+        sales, rentals = list(sales), list(rentals)
+        variant_ids = {line.variant_id for line in sales + rentals}
+        if not variant_ids:
+            return
+        categories = dict(
+            ProductVariant.objects.filter(id__in=variant_ids).values_list('id', 'product__category')
+        )
+
+        changes = {}
+        for line in sales:
+            cls._add(changes, timezone.localdate(line.order_date), categories.get(line.variant_id) or '',
+                     items_sold=line.quantity, sales_revenue=line.total_price)
+        for line in rentals:
+            cls._add(changes, timezone.localdate(line.order_date), categories.get(line.variant_id) or '',
+                     rentals_booked=1, rental_revenue=line.total_price,
+                     **{cls.RENTAL_STATUS_FIELDS[line.status]: 1})
+        cls.apply(changes)
+
+    @classmethod
+    def record_rental_status_change(cls, booking, old_status, new_status):
+        if old_status == new_status:
+            return
+        category = ProductVariant.objects.filter(id=booking.variant_id).values_list(
+            'product__category', flat=True
+        ).first() or ''
+
+        changes = {}
+        cls._add(changes, timezone.localdate(), category, **{
+            cls.RENTAL_STATUS_FIELDS[old_status]: -1,
+            cls.RENTAL_STATUS_FIELDS[new_status]: 1,
+        })
+        cls.apply(changes)
+
+
+# ==========================================
+# 8. CHANGE COUNTERS
+# ==========================================
+
+class ChangeCounter(models.Model):
+    """
+    Named monotonic counters (e.g. 'delivery'). next() increments with an
+    UPDATE, so the row stays locked until the caller's transaction commits:
+    versions become visible in the order they were handed out.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+    @classmethod
+    def next(cls, name, count=1):
+        """Reserves `count` new values and returns the highest one (block is value-count+1 .. value)."""
+        with transaction.atomic():
+            if not cls.objects.filter(name=name).update(value=F('value') + count):
+                cls.objects.get_or_create(name=name)
+                cls.objects.filter(name=name).update(value=F('value') + count)
+            return cls.objects.filter(name=name).values_list('value', flat=True).get()
+
+    @classmethod
+    def current(cls, name):
+        return cls.objects.filter(name=name).values_list('value', flat=True).first() or 0
+
+
+# ==========================================
+# 9. RENDERED INVOICES
+# ==========================================
+
+class Invoice(models.Model):
+    """
+    An order's invoice, rendered once (see shop/invoices.py) and kept for the
+    receipt email, re-sends and customer downloads. `version` is the invoice
+    layout version: rows from an older layout are simply ignored.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='invoices')
+    version = models.PositiveSmallIntegerField()
+    html = models.TextField()
+    text = models.TextField()
+    rendered_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'version'], name='invoice_order_version'),
+        ]
+
+    def __str__(self):
+        return f"Invoice for Order #{self.order_id} (v{self.version})"
@@ -0,0 +1,133 @@
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+# ==========================================
+# EMAIL OUTBOX
+# ==========================================
+# queue_email() is called from signals/views instead of send_mail().
+# send_due_batch() is called by `manage.py send_outbox` and sends a batch
+# of due emails over a single SMTP connection, retrying with backoff.
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 60           # 1, 2, 4, 8 ... minutes
+BACKOFF_MAX_SECONDS = 60 * 60
+STALE_CLAIM_AFTER = timedelta(minutes=10)
+
+
+def queue_email(event, to_email, subject, body, html_body='', object_id=None, object_status='', dedupe=True):
+    """
+    Queues one email. Returns the OutboxEmail, or None if there is no recipient.
+    Queuing the same (event, object_id, object_status) twice is a no-op unless
+    dedupe=False (e.g. sign-up OTPs, which have no object to key on).
+    """
+    if not to_email:
+        return None
+
+    if not dedupe:
+        return OutboxEmail.objects.create(
+            event=event, to_email=to_email, subject=subject, body=body, html_body=html_body,
+            object_id=object_id, object_status=object_status,
+        )
+
+    email, created = OutboxEmail.objects.get_or_create(
+        event=event,
+        object_id=object_id,
+        object_status=object_status,
+        defaults={
+            'to_email': to_email,
+            'subject': subject,
+            'body': body,
+            'html_body': html_body,
+        },
+    )
+    return email
+
+
+def _backoff(attempts):
+    return timedelta(seconds=min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS))
+
+
+def _claim(batch_size):
+    """Marks up to `batch_size` due emails as ours, so parallel workers never send the same row."""
+    now = timezone.now()
+
+    # Rows left in 'Sending' by a crashed worker go back into the queue
+    OutboxEmail.objects.filter(
+        state=OutboxEmail.STATE_SENDING, locked_at__lt=now - STALE_CLAIM_AFTER
+    ).update(state=OutboxEmail.STATE_PENDING, claim_token='')
+
+    token = uuid.uuid4().hex
+    with transaction.atomic():
+        due_ids = list(
+            OutboxEmail.objects.filter(state=OutboxEmail.STATE_PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        OutboxEmail.objects.filter(id__in=due_ids, state=OutboxEmail.STATE_PENDING).update(
+            state=OutboxEmail.STATE_SENDING, claim_token=token, locked_at=now
+        )
+
+    return list(OutboxEmail.objects.filter(claim_token=token, state=OutboxEmail.STATE_SENDING).order_by('id'))
+
+
+def send_due_batch(batch_size=100, connection=None):
+    """Sends one batch of due emails. Returns (sent, failed) counts."""
+    emails = _claim(batch_size)
+    if not emails:
+        return 0, 0
+
+    sent = failed = 0
+    connection = connection or get_connection(fail_silently=False)
+
+    # One SMTP session for the whole batch. If it can't be opened here,
+    # each send() below fails on its own and is rescheduled.
+    try:
+        connection.open()
+    except Exception:
+        pass
+
+    try:
+        for email in emails:
+            message = EmailMultiAlternatives(
+                subject=email.subject,
+                body=email.body,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[email.to_email],
+                connection=connection,
+            )
+            if email.html_body:
+                message.attach_alternative(email.html_body, 'text/html')
+
+            email.attempts += 1
+            email.claim_token = ''
+            email.locked_at = None
+            try:
+                message.send()
+            except Exception as e:
+                failed += 1
+                email.last_error = str(e)
+                if email.attempts >= MAX_ATTEMPTS:
+                    email.state = OutboxEmail.STATE_FAILED
+                else:
+                    email.state = OutboxEmail.STATE_PENDING
+                    email.next_attempt_at = timezone.now() + _backoff(email.attempts)
+            else:
+                sent += 1
+                email.state = OutboxEmail.STATE_SENT
+                email.sent_at = timezone.now()
+                email.last_error = ''
+    finally:
+        connection.close()
+
+    OutboxEmail.objects.bulk_update(
+        emails,
+        ['state', 'attempts', 'next_attempt_at', 'claim_token', 'locked_at', 'last_error', 'sent_at'],
+    )
+    return sent, failed
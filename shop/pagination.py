@@ -0,0 +1,115 @@
+import base64
+import datetime
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+# ==========================================
+# KEYSET (CURSOR) PAGINATION
+# ==========================================
+# Unlike Paginator, this never runs COUNT(*) or OFFSET: every page is
+# "WHERE (created_at, id) < (last seen) ORDER BY ... LIMIT n", so page 500
+# costs the same as page 1. The cursor is an opaque base64 token holding
+# the ordering values of the last row on the previous page.
+
+PRODUCTS_PER_PAGE = 24
+CATALOG_ORDERING = ('-created_at', '-id')
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder cuts datetimes to milliseconds, which would skip rows on ties
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, cls=CursorEncoder)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor, model, ordering, annotations=None):
+    """Returns the cursor values converted back to python, or None if the cursor is invalid."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, UnicodeError):
+        return None
+
+    if not isinstance(values, list) or len(values) != len(ordering):
+        return None
+
+    converted = []
+    for name, value in zip(ordering, values):
+        name = name.lstrip('-')
+        try:
+            if annotations and name in annotations:
+                # Annotations convert through their output field (a Sum of prices is a
+                # Decimal, stored in the cursor as a string)
+                field = annotations[name].output_field
+            else:
+                field = model._meta.get_field(name)
+            converted.append(field.to_python(value))
+        except FieldDoesNotExist:
+            converted.append(value)
+        except ValidationError:
+            return None
+    return converted
+
+
+def _after(ordering, values):
+    """Builds the lexicographic 'comes after this row' filter for the given ordering."""
+    condition = Q()
+    for i, name in enumerate(ordering):
+        field = name.lstrip('-')
+        lookup = 'lt' if name.startswith('-') else 'gt'
+        step = Q(**{f'{field}__{lookup}': values[i]})
+        for prev_name, prev_value in zip(ordering[:i], values[:i]):
+            step &= Q(**{prev_name.lstrip('-'): prev_value})
+        condition |= step
+    return condition
+
+
+def keyset_paginate(queryset, cursor=None, ordering=CATALOG_ORDERING, per_page=PRODUCTS_PER_PAGE):
+    """
+    Returns one KeysetPage of `queryset` in `ordering` order, starting after `cursor`.
+    An invalid or missing cursor returns the first page.
+    """
+    queryset = queryset.order_by(*ordering)
+
+    if cursor:
+        values = decode_cursor(cursor, queryset.model, ordering, queryset.query.annotations)
+        if values is not None:
+            queryset = queryset.filter(_after(ordering, values))
+
+    # Fetch one extra row to know if there is a next page (no COUNT needed)
+    rows = list(queryset[:per_page + 1])
+    items = rows[:per_page]
+
+    next_cursor = None
+    if len(rows) > per_page:
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, name.lstrip('-')) for name in ordering])
+
+    return KeysetPage(items, next_cursor)
@@ -0,0 +1,176 @@
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# REQUEST PROFILING & QUERY BUDGETS
+# ==========================================
+# RequestProfilingMiddleware measures every request:
+#   - number of SQL queries and total DB time (all database aliases)
+#   - "duplicate" queries: same SQL shape run more than once (the N+1 smell)
+#   - template render time (needs the ProfiledDjangoTemplates backend)
+# and reports them as a Server-Timing header (browser devtools show it) and
+# one structured log line on the 'shop.profiling' logger.
+#
+# Views declare how many queries they may run with @query_budget(n). Going
+# over is logged as a warning; with QUERY_BUDGET_STRICT (on under
+# `manage.py test`, see settings.py) it raises QueryBudgetExceeded instead,
+# so the test that hit the view fails.
+#
+# Queries run while a StreamingHttpResponse is iterated are not counted.
+
+DUPLICATE_MIN = 2       # a fingerprint seen this often is reported
+LOG_SQL_CHARS = 300     # fingerprints are truncated in the log
+
+_current = ContextVar('shop_request_profile', default=None)
+
+_IN_LIST = re.compile(r'\bIN \((?:%s|\?)(?:, (?:%s|\?))*\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def fingerprint(sql):
+    """SQL with literals and IN-lists collapsed, so per-row repeats of one query compare equal."""
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _LITERAL.sub('?', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+def query_budget(max_queries):
+    """View decorator: the view (and its template) may run at most `max_queries` queries."""
+    def decorator(view_func):
+        # login_required & co. copy function attributes, so decorator order doesn't matter
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.fingerprints = Counter()
+        self.budget = None
+        self.view = ''
+
+    # connection.execute_wrapper() hook
+    def __call__(self, execute, sql, params, many, context):
+        began = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - began
+            self.queries += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self):
+        return [(sql, n) for sql, n in self.fingerprints.most_common() if n >= DUPLICATE_MIN]
+
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        # Durations in milliseconds, as the header spec wants
+        parts = [
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'total;dur={self.total_time() * 1000:.1f}',
+        ]
+        duplicates = self.duplicates()
+        if duplicates:
+            parts.append(f'dup;desc="{sum(n for _, n in duplicates)} repeated queries"')
+        return ', '.join(parts)
+
+    def as_dict(self, request, response):
+        return {
+            'method': request.method,
+            'path': request.path,
+            'view': self.view,
+            'status': response.status_code,
+            'queries': self.queries,
+            'budget': self.budget,
+            'db_ms': round(self.db_time * 1000, 2),
+            'template_ms': round(self.template_time * 1000, 2),
+            'total_ms': round(self.total_time() * 1000, 2),
+            'duplicates': [{'sql': sql[:LOG_SQL_CHARS], 'count': n} for sql, n in self.duplicates()],
+        }
+
+
+class RequestProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        response['Server-Timing'] = profile.server_timing()
+        data = profile.as_dict(request, response)
+
+        if profile.budget is not None and profile.queries > profile.budget:
+            message = (f"{profile.view} ran {profile.queries} queries, budget is {profile.budget}: "
+                       + json.dumps(data))
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message, extra={'profile': data})
+        else:
+            logger.info(json.dumps(data), extra={'profile': data})
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = _current.get()
+        if profile is not None:
+            profile.view = f"{view_func.__module__}.{view_func.__name__}"
+            profile.budget = getattr(view_func, 'query_budget', None)
+        return None
+
+
+# ==========================================
+# TEMPLATE TIMING
+# ==========================================
+# Drop-in for django.template.backends.django.DjangoTemplates that adds each
+# render()'s time to the current request profile. Only the outermost
+# template is timed ({% include %}/{% extends %} happen inside it).
+
+class ProfiledTemplate(Template):
+    def render(self, context=None, request=None):
+        profile = _current.get()
+        if profile is None:
+            return super().render(context, request)
+        began = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile.template_time += time.perf_counter() - began
+
+
+class ProfiledDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return ProfiledTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return ProfiledTemplate(template.template, self)
@@ -0,0 +1,170 @@
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Func, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import CustomUser, DailyStat, OutboxEmail, Product, ProductVariant, RentBooking
+
+# ==========================================
+# OVERDUE SWEEP
+# ==========================================
+# `manage.py sweep_overdue_rentals` (run daily from cron) moves every rental
+# that is still with the customer after its end_date to Overdue, stores the
+# late fee accrued so far in RentBooking.late_fee and queues an overdue
+# notice in the email outbox, all with a handful of set-based statements.
+# Re-running it on the same day changes nothing.
+#
+# Late fee = days past end_date * the variant's daily rent price
+# (same rule as RentBooking.calculate_pending_late_fee).
+
+# Still with the customer, but not yet flagged
+OVERDUE_FROM_STATUSES = [RentBooking.STATUS_SHIPPED, RentBooking.STATUS_ACTIVE]
+
+# Shown in the rental manager: everything that is out with (or on the way to) a customer
+MANAGER_STATUSES = [RentBooking.STATUS_SHIPPED, RentBooking.STATUS_ACTIVE, RentBooking.STATUS_OVERDUE]
+
+# Also used by the RentBooking signal, so both paths send the same text
+OVERDUE_SUBJECT = "Rental Update: {product_name}"
+OVERDUE_BODY = (
+    "URGENT: Hi {first_name},\n\nYour rental for '{product_name}' is now OVERDUE. "
+    "Please return it immediately to avoid further late fees."
+)
+
+
+def overdue_email(first_name, product_name):
+    """(subject, body) of the overdue notice."""
+    return (
+        OVERDUE_SUBJECT.format(product_name=product_name),
+        OVERDUE_BODY.format(first_name=first_name, product_name=product_name),
+    )
+
+
+def _queue_overdue_notices(today):
+    """
+    One INSERT ... SELECT into the outbox for every booking about to go overdue.
+    The text is filled in by SQL REPLACE(); rows the outbox already has
+    (same event/booking/status) are skipped by its dedup constraint.
+    """
+    qn = connection.ops.quote_name
+    statuses = ', '.join(['%s'] * len(OVERDUE_FROM_STATUSES))
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+
+    # Template (a parameter) with the placeholders swapped for the joined columns
+    filled = f"REPLACE(REPLACE(%s, '{{first_name}}', COALESCE(u.{qn('first_name')}, '')), '{{product_name}}', p.{qn('name')})"
+
+    sql = f"""
+        INSERT INTO {qn(OutboxEmail._meta.db_table)}
+            (event, object_id, object_status, to_email, subject, body, html_body,
+             state, attempts, next_attempt_at, claim_token, last_error, created_at)
+        SELECT %s, r.id, %s, u.email, {filled}, {filled}, '',
+               %s, 0, %s, '', '', %s
+        FROM {qn(RentBooking._meta.db_table)} r
+        JOIN {qn(CustomUser._meta.db_table)} u ON u.id = r.user_id
+        JOIN {qn(ProductVariant._meta.db_table)} v ON v.id = r.variant_id
+        JOIN {qn(Product._meta.db_table)} p ON p.id = v.product_id
+        WHERE r.status IN ({statuses}) AND r.end_date < %s AND u.email <> ''
+        ON CONFLICT DO NOTHING
+    """
+    params = [
+        'rental_status', RentBooking.STATUS_OVERDUE, OVERDUE_SUBJECT, OVERDUE_BODY,
+        OutboxEmail.STATE_PENDING, now, now,
+        *OVERDUE_FROM_STATUSES, connection.ops.adapt_datefield_value(today),
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def _mark_overdue(today):
+    """Flags due bookings as Overdue and keeps the daily rollup in step. Returns how many moved."""
+    due = RentBooking.objects.filter(status__in=OVERDUE_FROM_STATUSES, end_date__lt=today)
+    moved = list(due.values('status', 'variant__product__category').annotate(n=Count('id')).order_by())
+    if not moved:
+        return 0
+
+    updated = due.update(status=RentBooking.STATUS_OVERDUE)
+
+    # .update() skips RentBooking.save(), so record the status changes here
+    day = timezone.localdate()
+    changes = defaultdict(lambda: defaultdict(int))
+    for row in moved:
+        category = row['variant__product__category'] or ''
+        for key in {(day, category), (day, DailyStat.ALL_CATEGORIES)}:
+            changes[key][DailyStat.RENTAL_STATUS_FIELDS[row['status']]] -= row['n']
+            changes[key][DailyStat.RENTAL_STATUS_FIELDS[RentBooking.STATUS_OVERDUE]] += row['n']
+    DailyStat.apply(changes)
+
+    return updated
+
+
+class DaysBetween(Func):
+    """Whole days from `start` to `end` (date columns/values), as an integer, in SQL."""
+    output_field = IntegerField()
+
+    def __init__(self, end, start, **extra):
+        super().__init__(end, start, **extra)
+
+    def as_sql(self, compiler, connection, **extra):
+        return super().as_sql(compiler, connection, template='DATEDIFF(%(expressions)s)', **extra)
+
+    def as_sqlite(self, compiler, connection, **extra):
+        return super().as_sql(
+            compiler, connection, arg_joiner=') - julianday(',
+            template='CAST(julianday(%(expressions)s) AS INTEGER)', **extra
+        )
+
+    def as_postgresql(self, compiler, connection, **extra):
+        return super().as_sql(compiler, connection, arg_joiner=' - ', template='(%(expressions)s)', **extra)
+
+
+def with_late_fees(rentals, today=None):
+    """
+    Annotates `days_late` and `pending_fee` (days late * daily rent, 0 if not late)
+    in SQL, i.e. calculate_pending_late_fee for a whole queryset.
+    """
+    today = today or timezone.localdate()
+    days_late = Greatest(DaysBetween(Value(today), F('end_date')), Value(0))
+    return rentals.annotate(
+        days_late=days_late,
+        pending_fee=ExpressionWrapper(
+            days_late * Coalesce(F('variant__rent_price_per_day'), Value(0), output_field=DecimalField()),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        ),
+    )
+
+
+def rental_totals(rentals):
+    """Counts and outstanding late fees of an annotated rental queryset, in one aggregate query."""
+    totals = rentals.aggregate(
+        count=Count('id'),
+        late=Count('id', filter=Q(days_late__gt=0)),
+        overdue=Count('id', filter=Q(status=RentBooking.STATUS_OVERDUE)),
+        outstanding_fees=Sum('pending_fee'),
+    )
+    totals['outstanding_fees'] = totals['outstanding_fees'] or 0
+    return totals
+
+
+def _accrue_late_fees(today):
+    """Stores the accrued late fee on every Overdue booking in one UPDATE."""
+    overdue = RentBooking.objects.filter(status=RentBooking.STATUS_OVERDUE, end_date__lt=today)
+    # .update() can't follow the variant join, so read the daily rent through a subquery
+    daily_rent = ProductVariant.objects.filter(id=OuterRef('variant_id')).values('rent_price_per_day')[:1]
+    return overdue.update(late_fee=ExpressionWrapper(
+        DaysBetween(Value(today), F('end_date')) * Coalesce(Subquery(daily_rent), Value(0), output_field=DecimalField()),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    ))
+
+
+def sweep_overdue(today=None):
+    """Runs the sweep. Returns (newly_overdue, fees_updated, notices_queued)."""
+    today = today or timezone.localdate()
+
+    with transaction.atomic():
+        queued = _queue_overdue_notices(today)   # before the status flip, same WHERE
+        newly_overdue = _mark_overdue(today)
+        fees = _accrue_late_fees(today)
+
+    return newly_overdue, fees, queued
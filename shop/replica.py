@@ -0,0 +1,142 @@
+import os
+import sqlite3
+import tempfile
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+from django.utils.connection import ConnectionDoesNotExist
+
+# ==========================================
+# REPORTING REPLICA
+# ==========================================
+# Heavy reporting views read from a second database alias, 'replica', so their
+# scans don't hold up checkout writes on the primary:
+#   - views opt in with @reporting_view (GET/HEAD only)
+#   - ReplicaRouter sends their reads to the replica; writes always go to
+#     'default', and auth/session lookups never leave the primary
+#   - read-your-writes: a browser that POSTed something after the snapshot
+#     was taken keeps reading from the primary until the next refresh (the
+#     time of its last write is kept in a cookie, so this costs no queries)
+# Locally the replica is a SQLite file refreshed from the primary with the
+# online backup API (`manage.py refresh_replica --loop`). A missing or too
+# old snapshot (REPLICA_MAX_LAG seconds) also means "use the primary".
+
+REPLICA_ALIAS = 'replica'
+WRITE_COOKIE = 'last_write_at'
+PRIMARY_ONLY_APPS = {'auth', 'sessions', 'contenttypes', 'admin'}
+
+_use_replica = ContextVar('shop_use_replica', default=False)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def snapshot_time():
+    """When the current replica snapshot was taken (epoch seconds), or None if there is none."""
+    try:
+        return os.path.getmtime(connections[REPLICA_ALIAS].settings_dict['NAME'])
+    except (ConnectionDoesNotExist, OSError):
+        return None
+
+
+def replica_usable(last_write_at=None):
+    taken = snapshot_time()
+    if taken is None:
+        return False
+    if time.time() - taken > getattr(settings, 'REPLICA_MAX_LAG', 300):
+        return False
+    # This session changed something the snapshot doesn't have yet
+    return last_write_at is None or last_write_at < taken
+
+
+def refresh_replica(source_alias='default'):
+    """
+    Copies the primary into the replica file with SQLite's online backup API
+    (readers and WAL writers on the primary are not blocked), then swaps the
+    new file in atomically. Returns the snapshot time.
+    """
+    source_path = str(connections[source_alias].settings_dict['NAME'])
+    target_path = str(connections[REPLICA_ALIAS].settings_dict['NAME'])
+    fd, tmp_path = tempfile.mkstemp(prefix='replica-', suffix='.sqlite3', dir=os.path.dirname(target_path))
+    os.close(fd)
+
+    taken = time.time()     # the copy is consistent as of the moment the read starts
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(tmp_path)
+    try:
+        source.backup(target)
+        # A plain rollback-journal file: readers of a read-only copy don't need WAL
+        target.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        target.close()
+        source.close()
+
+    os.utime(tmp_path, (taken, taken))
+    os.replace(tmp_path, target_path)
+    # Connections opened in this process still point at the old file
+    connections[REPLICA_ALIAS].close()
+    return taken
+
+
+def _last_write_at(request):
+    try:
+        return float(request.COOKIES[WRITE_COOKIE])
+    except (KeyError, ValueError):
+        return None
+
+
+def reporting_view(view_func):
+    """Runs a read-only view's queries against the replica when that is safe."""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or not replica_configured():
+            return view_func(request, *args, **kwargs)
+
+        # Resolve the user (and session) on the primary before switching
+        request.user.is_authenticated
+        if not replica_usable(_last_write_at(request)):
+            return view_func(request, *args, **kwargs)
+
+        token = _use_replica.set(True)
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Only reads inside a @reporting_view go to the replica; everything else uses 'default'."""
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and model._meta.app_label not in PRIMARY_ONLY_APPS:
+            return REPLICA_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True     # same data on both aliases
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_ALIAS     # the replica is a copy, never migrated itself
+
+
+class ReadYourWritesMiddleware:
+    """Remembers when a browser last sent a write request (anything but GET/HEAD/OPTIONS)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE'):
+            # Older stamps don't matter: any usable snapshot is newer than REPLICA_MAX_LAG
+            response.set_cookie(WRITE_COOKIE, f'{time.time():.3f}', httponly=True, samesite='Lax',
+                                max_age=getattr(settings, 'REPLICA_MAX_LAG', 300))
+        return response
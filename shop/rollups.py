@@ -0,0 +1,122 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyStat, Order, RentBooking, SaleOrder
+
+# ==========================================
+# DAILY SALES / RENTAL ROLLUP
+# ==========================================
+# DailyStat rows are kept current by signals, checkout and RentBooking.save
+# (see shop/models.py). This module rebuilds them from scratch and answers
+# the dashboard's questions from them.
+
+DASHBOARD_RANGES = (7, 30, 90, 365)
+
+STATUS_SUMS = {field: Sum(field) for field in DailyStat.RENTAL_STATUS_FIELDS.values()}
+
+
+def rebuild_daily_stats(apps=None):
+    """
+    Recomputes every DailyStat row with a few GROUP BY queries. Rental status
+    history isn't stored, so each booking's CURRENT status is counted on the
+    day it was booked; status totals come out the same. Returns the row count.
+    `apps`: a migration's app registry (the backfill in 0023), else the live models.
+    """
+    if apps is not None:
+        order_model, sale_model, rent_model, stat_model = (
+            apps.get_model('shop', name) for name in ('Order', 'SaleOrder', 'RentBooking', 'DailyStat')
+        )
+    else:
+        order_model, sale_model, rent_model, stat_model = Order, SaleOrder, RentBooking, DailyStat
+    rows = defaultdict(lambda: defaultdict(int))
+
+    def add(day, category, **deltas):
+        for key in {(day, category), (day, DailyStat.ALL_CATEGORIES)}:
+            for field, delta in deltas.items():
+                rows[key][field] += delta or 0
+
+    orders = (
+        order_model.objects.annotate(day=TruncDate('created_at'))
+        .values('day').annotate(n=Count('id'), total=Sum('total_price'))
+    )
+    for row in orders:
+        rows[(row['day'], DailyStat.ALL_CATEGORIES)]['orders'] += row['n']
+        rows[(row['day'], DailyStat.ALL_CATEGORIES)]['revenue'] += row['total'] or 0
+
+    sales = (
+        sale_model.objects.annotate(day=TruncDate('order_date'))
+        .values('day', 'variant__product__category')
+        .annotate(units=Sum('quantity'), total=Sum('total_price'))
+    )
+    for row in sales:
+        add(row['day'], row['variant__product__category'] or '',
+            items_sold=row['units'], sales_revenue=row['total'])
+
+    rentals = (
+        rent_model.objects.annotate(day=TruncDate('order_date'))
+        .values('day', 'variant__product__category', 'status')
+        .annotate(n=Count('id'), total=Sum('total_price'))
+    )
+    for row in rentals:
+        add(row['day'], row['variant__product__category'] or '',
+            rentals_booked=row['n'], rental_revenue=row['total'],
+            **{DailyStat.RENTAL_STATUS_FIELDS[row['status']]: row['n']})
+
+    with transaction.atomic():
+        stat_model.objects.all().delete()
+        stat_model.objects.bulk_create(
+            [stat_model(day=day, category=category, **fields) for (day, category), fields in rows.items()],
+            batch_size=500,
+        )
+    return len(rows)
+
+
+def store_totals():
+    """All-time store-wide totals: orders, revenue and bookings currently in each status."""
+    totals = DailyStat.objects.filter(category=DailyStat.ALL_CATEGORIES).aggregate(
+        orders=Sum('orders'), revenue=Sum('revenue'), **STATUS_SUMS
+    )
+    return {key: value or 0 for key, value in totals.items()}
+
+
+def rental_status_counts(totals=None):
+    """{RentBooking status: bookings currently in it}."""
+    totals = totals or store_totals()
+    return {status: totals[field] for status, field in DailyStat.RENTAL_STATUS_FIELDS.items()}
+
+
+def daily_series(days, end=None):
+    """Store-wide rows for the `days` days up to `end` (default today), zero-filled, oldest first."""
+    end = end or timezone.localdate()
+    start = end - timedelta(days=days - 1)
+    found = {
+        row.day: row
+        for row in DailyStat.objects.filter(
+            category=DailyStat.ALL_CATEGORIES, day__gte=start, day__lte=end
+        )
+    }
+    return [
+        found.get(day) or DailyStat(day=day, category=DailyStat.ALL_CATEGORIES)
+        for day in (start + timedelta(days=i) for i in range(days))
+    ]
+
+
+def category_totals(days, end=None):
+    """Per-category sales/rental totals over the `days` days up to `end`, best sellers first."""
+    end = end or timezone.localdate()
+    start = end - timedelta(days=days - 1)
+    return list(
+        DailyStat.objects.filter(day__gte=start, day__lte=end)
+        .exclude(category=DailyStat.ALL_CATEGORIES)
+        .values('category')
+        .annotate(
+            items_sold=Sum('items_sold'), sales_revenue=Sum('sales_revenue'),
+            rentals_booked=Sum('rentals_booked'), rental_revenue=Sum('rental_revenue'),
+        )
+        .order_by('-sales_revenue', 'category')
+    )
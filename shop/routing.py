@@ -0,0 +1,152 @@
+import csv
+import math
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+
+# ==========================================
+# DRIVER ROUTE SEQUENCING
+# ==========================================
+# Orders a driver's stops so they don't criss-cross the city. Addresses are
+# located by zip code only, using a local CSV of zip-code centroids
+# (zip_code,lat,lng; no geocoding service, no network). Settings:
+#   ZIP_CENTROIDS_CSV   path to the CSV (default: shop/data/zip_centroids.csv)
+#
+# The route starts at the driver's own zip code (if known), is seeded with
+# nearest-neighbour and then improved with 2-opt. Stops in the same zip are
+# one point; stops whose zip isn't in the table go last, in their given order.
+#
+# The shipped CSV covers the PIN codes of the cities we deliver to (Ahmedabad,
+# Mumbai, Surat, Pune, Vadodara, Rajkot) at post-office locality precision,
+# roughly 1-2 km: plenty to order stops, not to navigate. Add rows for new
+# areas (the `place` column is for humans). Until at least two stops can be
+# located there is no route (sequence_stops() returns None) and callers keep
+# their own order.
+
+DEFAULT_CENTROIDS_CSV = Path(__file__).resolve().parent / 'data' / 'zip_centroids.csv'
+EARTH_RADIUS_KM = 6371.0
+MAX_2OPT_PASSES = 50
+
+
+def normalize_zip(zip_code):
+    return (zip_code or '').strip().upper().replace(' ', '')
+
+
+def load_centroids(path=None):
+    """{zip_code: (lat, lng)} from the centroid CSV. Missing file = empty table."""
+    path = Path(path or getattr(settings, 'ZIP_CENTROIDS_CSV', None) or DEFAULT_CENTROIDS_CSV)
+    # Cached per file, so a changed ZIP_CENTROIDS_CSV (override_settings, reload) is picked up
+    return _read_centroids(path.resolve())
+
+
+@lru_cache(maxsize=8)
+def _read_centroids(path):
+    centroids = {}
+    try:
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                try:
+                    centroids[normalize_zip(row['zip_code'])] = (float(row['lat']), float(row['lng']))
+                except (KeyError, TypeError, ValueError):
+                    continue
+    except FileNotFoundError:
+        pass
+    return centroids
+
+
+def haversine_km(p, q):
+    lat1, lng1 = map(math.radians, p)
+    lat2, lng2 = map(math.radians, q)
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(max(a, 0.0), 1.0)))
+
+
+def distance_matrix(points):
+    """Great-circle distances (km) between every pair of (lat, lng) points, as a list of rows."""
+    n = len(points)
+    dist = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        for j in range(i + 1, n):
+            dist[i][j] = dist[j][i] = haversine_km(points[i], points[j])
+    return dist
+
+
+def nearest_neighbour(dist, start=0):
+    """Greedy open path from `start` that always visits the closest unvisited point."""
+    unvisited = set(range(len(dist))) - {start}
+    path = [start]
+    while unvisited:
+        row = dist[path[-1]]
+        nxt = min(unvisited, key=row.__getitem__)
+        path.append(nxt)
+        unvisited.remove(nxt)
+    return path
+
+
+def two_opt(path, dist, max_passes=MAX_2OPT_PASSES):
+    """
+    Improves an open path (first point fixed, free end) by reversing segments
+    path[i..j] while that shortens it; for each i the best j is taken.
+    """
+    path = list(path)
+    n = len(path)
+    if n < 4:
+        return path
+
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, n - 1):
+            row_a, row_b = dist[path[i - 1]], dist[path[i]]
+            current = row_a[path[i]]
+            best_delta, best_j = -1e-9, None
+            for j in range(i + 1, n):
+                c = path[j]
+                if j + 1 < n:
+                    # Edges (a,b) + (c,d) become (a,c) + (b,d)
+                    d = path[j + 1]
+                    delta = row_a[c] + row_b[d] - current - dist[c][d]
+                else:
+                    # Last stop: the open end has no edge after it
+                    delta = row_a[c] - current
+                if delta < best_delta:
+                    best_delta, best_j = delta, j
+            if best_j is not None:
+                path[i:best_j + 1] = path[i:best_j + 1][::-1]
+                improved = True
+        if not improved:
+            break
+    return path
+
+
+def sequence_stops(stops, start_zip=None, centroids=None):
+    """
+    stops: [(key, zip_code)] -> the keys in visiting order, or None when fewer
+    than two distinct stop locations are known (nothing to optimise: keep your order).
+    Runs in a few milliseconds for a couple of dozen stops.
+    """
+    centroids = load_centroids() if centroids is None else centroids
+
+    by_zip = {}
+    unplaced = []
+    for key, zip_code in stops:
+        zip_code = normalize_zip(zip_code)
+        if zip_code in centroids:
+            by_zip.setdefault(zip_code, []).append(key)
+        else:
+            unplaced.append(key)
+
+    zips = list(by_zip)
+    if len(zips) < 2:
+        return None
+
+    # Point 0 is the depot (driver's zip) when we know where it is
+    depot = centroids.get(normalize_zip(start_zip))
+    points = ([depot] if depot else []) + [centroids[z] for z in zips]
+    dist = distance_matrix(points)
+
+    path = two_opt(nearest_neighbour(dist, 0), dist)
+    if depot:
+        path = [index - 1 for index in path[1:]]
+
+    return [key for index in path for key in by_zip[zips[index]]] + unplaced
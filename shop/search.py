@@ -0,0 +1,179 @@
+import json
+import logging
+import re
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connection, OperationalError
+from django.db.models import Q, IntegerField
+from django.db.models.expressions import RawSQL
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# PRODUCT FULL-TEXT SEARCH (SQLite FTS5)
+# ==========================================
+# The index is a standalone FTS5 table whose rowid is the Product id.
+# It is created by migration 0019 and kept up to date by signals.py.
+# On databases without FTS5 we fall back to the old icontains filter.
+# A search runs inside the listing's own filters (category, rent/buy...): the
+# MATCH query only ranks products the base queryset would return, so the
+# SEARCH_RESULT_LIMIT cut is taken after filtering, not over the whole catalog.
+# When more products match than the limit, search_products() says so, and the
+# listing tells the shopper to refine the search instead of hiding the cut.
+
+FTS_TABLE = 'shop_product_fts'
+
+# Max number of ranked ids pulled out of the index for one search
+SEARCH_RESULT_LIMIT = 500
+
+# Column weights for bm25(): name matters most, description least
+RANK_WEIGHTS = (10.0, 5.0, 1.0)
+
+CREATE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+    "USING fts5(name, sub_category, description, tokenize='porter unicode61 remove_diacritics 2')"
+)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def build_match_expression(query):
+    """Turns free text into an FTS5 query: every word must match, each as a prefix."""
+    tokens = _TOKEN_RE.findall(query.lower())
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def index_product(product, conn=None):
+    """Adds/replaces one product in the index. Silently skipped when there is no FTS table."""
+    conn = conn or connection
+    if conn.vendor != 'sqlite':
+        return
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product.pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, sub_category, description) VALUES (%s, %s, %s, %s)",
+                [product.pk, product.name or '', product.sub_category or '', product.description or ''],
+            )
+    except OperationalError as e:
+        logger.warning("Search index not updated for product #%s: %s", product.pk, e)
+
+
+def index_products(products, conn=None):
+    """index_product() for many products at once (bulk writes skip the post_save signal)."""
+    conn = conn or connection
+    if conn.vendor != 'sqlite' or not products:
+        return
+    try:
+        with conn.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(p.pk,) for p in products])
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, sub_category, description) VALUES (%s, %s, %s, %s)",
+                [(p.pk, p.name or '', p.sub_category or '', p.description or '') for p in products],
+            )
+    except OperationalError as e:
+        logger.warning("Search index not updated for %d products: %s", len(products), e)
+
+
+def remove_product(product_id, conn=None):
+    conn = conn or connection
+    if conn.vendor != 'sqlite':
+        return
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product_id])
+    except OperationalError as e:
+        logger.warning("Product #%s not removed from the search index: %s", product_id, e)
+
+
+def rebuild_index(product_model, conn=None, batch_size=1000):
+    """Drops and refills the whole index. Returns the number of products indexed."""
+    conn = conn or connection
+    total = 0
+    last_id = 0
+
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        cursor.execute(CREATE_SQL)
+
+        while True:
+            rows = list(
+                product_model.objects.using(conn.alias)
+                .filter(id__gt=last_id).order_by('id')
+                .values_list('id', 'name', 'sub_category', 'description')[:batch_size]
+            )
+            if not rows:
+                break
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, sub_category, description) VALUES (%s, %s, %s, %s)",
+                [(pk, name or '', sub or '', desc or '') for pk, name, sub, desc in rows],
+            )
+            total += len(rows)
+            last_id = rows[-1][0]
+
+    return total
+
+
+def ranked_product_ids(query, products=None, limit=SEARCH_RESULT_LIMIT):
+    """
+    Returns Product ids matching `query`, best match first (None if FTS can't be used).
+    With `products`, only ids in that queryset are ranked (and counted towards the limit).
+    """
+    expression = build_match_expression(query)
+    if not expression or connection.vendor != 'sqlite':
+        return None
+
+    scope, scope_params = '', []
+    if products is not None:
+        try:
+            sql, scope_params = products.order_by().values('id').query.sql_with_params()
+        except EmptyResultSet:
+            return []
+        scope = f"AND rowid IN ({sql}) "
+
+    weights = ', '.join(str(w) for w in RANK_WEIGHTS)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s {scope}"
+                f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s",
+                [expression, *scope_params, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+    except OperationalError as e:
+        logger.warning("Full-text search unavailable, using icontains: %s", e)
+        return None
+
+
+def search_products(products, query):
+    """
+    Filters a Product queryset by a search query, ordered by relevance.
+    Returns (queryset, truncated): truncated is True when more than
+    SEARCH_RESULT_LIMIT products matched and only the best ones were kept.
+    Falls back to the plain icontains filter when the FTS index is unavailable.
+    Apply the listing's other filters first, so the ranking is done within them.
+    """
+    # One id past the limit tells us whether anything was cut off
+    ids = ranked_product_ids(query, products, limit=SEARCH_RESULT_LIMIT + 1)
+
+    if ids is None:
+        return products.filter(
+            Q(name__icontains=query) |
+            Q(sub_category__icontains=query) |
+            Q(description__icontains=query)
+        ), False
+
+    if not ids:
+        return products.none(), False
+
+    truncated = len(ids) > SEARCH_RESULT_LIMIT
+    ids = ids[:SEARCH_RESULT_LIMIT]
+
+    # Position in the ranked list, looked up in one JSON parameter (SQLite only, like the index)
+    table = connection.ops.quote_name(products.model._meta.db_table)
+    ranking = RawSQL(
+        f"(SELECT CAST(key AS INTEGER) FROM json_each(%s) WHERE value = {table}.{connection.ops.quote_name('id')})",
+        [json.dumps(ids)],
+        output_field=IntegerField(),
+    )
+    return products.filter(id__in=ids).annotate(search_rank=ranking).order_by('search_rank'), truncated
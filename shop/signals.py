@@ -1,12 +1,15 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from django.core.mail import send_mail
-from django.template.loader import render_to_string # Required for HTML Invoice
-from django.utils.html import strip_tags            # Required for Email Fallback
-from django.conf import settings
-from .models import Delivery, RentBooking
+from .models import Cart, CartItem, DailyStat, Delivery, DeliveryTombstone, ChangeCounter, Order, RentBooking, Product, ProductImage, ProductVariant, SaleOrder
+from .outbox import queue_email
+from . import search
+from .cart_badge import invalidate_cart_badge
+from .covers import invalidate_collection_covers
+from .invoices import get_invoice
+from .rentals import overdue_email
 
 # 1. NOTIFY CUSTOMER ON DELIVERY STATUS CHANGE
+# Emails are only queued here (same transaction as the save); `manage.py send_outbox` sends them.
 @receiver(post_save, sender=Delivery)
 def send_delivery_status_email(sender, instance, created, **kwargs):
     order = instance.order
@@ -19,92 +22,173 @@ def send_delivery_status_email(sender, instance, created, **kwargs):
     
     subject = f"Order #{order.id} Update: {status}"
 
-    # --- SCENARIO A: OUT FOR DELIVERY (SEND OTP) ---
+    # --- SCENARIO A: OUT FOR DELIVERY (WITH OTP IF ONE WAS ASSIGNED) ---
     if status == 'Out for Delivery':
-        # Retrieve the OTP stored in the model
-        otp_code = instance.otp
-        
-        message = (
-            f"Hi {user.first_name},\n\n"
-            f"Good news! Your order #{order.id} is out for delivery today.\n\n"
-            f"🔐 YOUR SECURE DELIVERY OTP: {otp_code}\n\n"
-            f"Please share this code with the delivery agent to receive your package."
-        )
-        
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            fail_silently=False
-        )
-        print(f"📧 OTP EMAIL SENT to {user.email}: {otp_code}")
+        if instance.otp:
+            message = (
+                f"Hi {user.first_name},\n\n"
+                f"Good news! Your order #{order.id} is out for delivery today.\n\n"
+                f"🔐 YOUR SECURE DELIVERY OTP: {instance.otp}\n\n"
+                f"Please share this code with the delivery agent to receive your package."
+            )
+        else:
+            message = (
+                f"Hi {user.first_name},\n\n"
+                f"Your order is on the way! Our agent has started the ride.\n\n"
+                f"You will receive an OTP when the agent arrives at your location."
+            )
+
+        # Keyed on the OTP too: a reassignment or a retry after 'Failed' comes with a
+        # fresh OTP, and the customer must get it even though the status is the same
+        object_status = f"{status}:{instance.otp}" if instance.otp else status
+        queue_email('delivery_status', user.email, subject, message,
+                    object_id=instance.id, object_status=object_status)
 
     # --- SCENARIO B: DELIVERED (SEND HTML INVOICE) ---
     elif status == 'Delivered':
         subject = f"Receipt for Order #{order.id} - Delivered"
-        
-        try:
-            # 1. Render the HTML Invoice Template
-            html_message = render_to_string('emails/invoice.html', {'order': order})
-            
-            # 2. Create plain text version for older email clients
-            plain_message = strip_tags(html_message)
-            
-            # 3. Send the HTML Email
-            send_mail(
-                subject=subject,
-                message=plain_message, # Fallback text
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[user.email],
-                html_message=html_message, # The fancy invoice
-                fail_silently=False
-            )
-            print(f"✅ INVOICE SENT to {user.email}")
-        except Exception as e:
-            print(f"❌ ERROR sending invoice: {e}")
 
-    # --- SCENARIO C: FAILED / OTHER (SIMPLE TEXT) ---
+        # HTML invoice + plain text version for older email clients, rendered
+        # once per order and stored (shop/invoices.py); re-saves reuse it
+        invoice = get_invoice(order.id)
+
+        queue_email('delivery_status', user.email, subject, invoice.text, html_body=invoice.html,
+                    object_id=instance.id, object_status=status)
+
+    # --- SCENARIO C: FAILED (SIMPLE TEXT) ---
     elif status == 'Failed':
         message = f"Hi {user.first_name},\n\nWe attempted to deliver your order #{order.id} but failed. Our delivery agent will try again soon."
-        
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            fail_silently=False
-        )
-        print(f"📧 STATUS UPDATE SENT: {status}")
+
+        queue_email('delivery_status', user.email, subject, message,
+                    object_id=instance.id, object_status=status)
 
 
 # 2. NOTIFY CUSTOMER ON RENTAL STATUS (e.g. Overdue)
 @receiver(post_save, sender=RentBooking)
 def send_rental_status_email(sender, instance, created, **kwargs):
+    status = instance.status
+    if status not in ('Shipped', 'Overdue'):
+        return
+
     user = instance.user
     product_name = instance.variant.product.name
-    status = instance.status
 
     # Safety check
     if not user.email:
         return
 
-    subject = f"Rental Update: {product_name}"
-    message = ""
-
     if status == 'Shipped':
+        subject = f"Rental Update: {product_name}"
         message = f"Hi {user.first_name},\n\nYour rental item '{product_name}' has been shipped! It should arrive soon."
-        
-    elif status == 'Overdue':
-        message = f"URGENT: Hi {user.first_name},\n\nYour rental for '{product_name}' is now OVERDUE. Please return it immediately to avoid further late fees."
-
-    # Send Email
-    if message:
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            fail_silently=False
+    else:
+        subject, message = overdue_email(user.first_name, product_name)
+
+    queue_email('rental_status', user.email, subject, message,
+                object_id=instance.id, object_status=status)
+
+
+# 3. KEEP PRODUCT AVAILABILITY COLUMNS IN SYNC WITH VARIANTS
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def sync_product_availability(sender, instance, **kwargs):
+    product = Product.objects.filter(pk=instance.product_id).only('id', 'is_rentable').first()
+    if product:
+        product.refresh_availability()
+
+
+# 'is_rentable' also feeds into is_for_rent, so re-check when the product itself changes
+@receiver(post_save, sender=Product)
+def sync_product_rentable_flag(sender, instance, created, **kwargs):
+    if not created:
+        instance.refresh_availability()
+
+
+# 4. KEEP THE FULL-TEXT SEARCH INDEX UP TO DATE
+@receiver(post_save, sender=Product)
+def index_product_for_search(sender, instance, **kwargs):
+    search.index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_search(sender, instance, **kwargs):
+    search.remove_product(instance.pk)
+
+
+# 5. KEEP THE DAILY SALES/RENTAL ROLLUP UP TO DATE
+# (checkout bulk_creates its lines, so it calls DailyStat.record_lines itself;
+#  rental status changes are recorded in RentBooking.save)
+@receiver(post_save, sender=Order)
+def count_order_in_rollup(sender, instance, created, **kwargs):
+    if created:
+        DailyStat.record_order(instance)
+
+
+@receiver(post_save, sender=SaleOrder)
+def count_sale_line_in_rollup(sender, instance, created, **kwargs):
+    if created:
+        DailyStat.record_lines(sales=[instance])
+
+
+@receiver(post_save, sender=RentBooking)
+def count_rental_line_in_rollup(sender, instance, created, **kwargs):
+    if created:
+        DailyStat.record_lines(rentals=[instance])
+
+
+# 6. DROP THE CACHED COLLECTION-PAGE COVERS WHEN THE CATALOG CHANGES
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def refresh_collection_covers(sender, instance, **kwargs):
+    invalidate_collection_covers()
+
+
+# 7. RESIZED WEBP DERIVATIVES FOR UPLOADED IMAGES
+# A new upload only clears the stored derivatives here: rows with an image and
+# an empty <field>_hash are the work queue of `manage.py build_image_derivatives
+# --loop`, so no resizing/encoding happens inside the admin's request. Until
+# the worker gets to it, pages serve the original.
+IMAGE_FIELDS = {Product: 'thumbnail', ProductImage: 'image'}
+
+
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=ProductImage)
+def reset_image_derivatives(sender, instance, **kwargs):
+    field = IMAGE_FIELDS[sender]
+    if field not in instance.__dict__:
+        return      # deferred and never assigned: unchanged
+    field_file = getattr(instance, field)
+    # A new upload (or a cleared field) invalidates the stored derivatives
+    if not field_file or field_file.name != getattr(instance, f'_loaded_{field}'):
+        setattr(instance, f'{field}_hash', '')
+        setattr(instance, f'{field}_placeholder', '')
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+def remember_image_name(sender, instance, **kwargs):
+    # The upload now has its stored name; a later save of this instance isn't a new upload
+    field = IMAGE_FIELDS[sender]
+    if field in instance.__dict__:
+        setattr(instance, f'_loaded_{field}', getattr(instance, field).name)
+
+
+# 8. TELL THE DRIVER'S APP WHEN ONE OF THEIR DELIVERIES IS DELETED
+@receiver(post_delete, sender=Delivery)
+def tombstone_deleted_delivery(sender, instance, **kwargs):
+    if instance.delivery_boy_id:
+        DeliveryTombstone.objects.create(
+            driver_id=instance.delivery_boy_id, delivery_id=instance.pk, version=ChangeCounter.next('delivery')
         )
-        print(f"📧 RENTAL EMAIL SENT to {user.email}: {status}")
\ No newline at end of file
+
+
+# 9. DROP THE CACHED CART BADGE WHEN A CART LINE GOES AWAY
+# Views refresh the badge themselves; this catches the rest (admin deletes,
+# cascades from a deleted product or user)
+@receiver(post_delete, sender=CartItem)
+def drop_cart_badge(sender, instance, **kwargs):
+    if CartItem.cart.is_cached(instance):
+        user_id = instance.cart.user_id
+    else:
+        user_id = Cart.objects.filter(pk=instance.cart_id).values_list('user_id', flat=True).first()
+    if user_id:
+        invalidate_cart_badge(user_id)
@@ -0,0 +1,47 @@
+import csv
+import json
+from decimal import Decimal
+
+# ==========================================
+# STREAMED CSV / JSONL
+# ==========================================
+# Line generators for exports that go out through a StreamingHttpResponse (or
+# a file in the matching management command): rows are formatted one at a
+# time as they come off the database cursor, so memory stays flat and the
+# first bytes leave before the query is done.
+
+FORMATS = ('csv', 'jsonl')
+CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'jsonl': 'application/x-ndjson; charset=utf-8'}
+
+
+def format_for(filename, default='csv'):
+    """'csv' or 'jsonl' from a file name's extension."""
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+class Echo:
+    """File-like object whose write() just returns the line, for csv.writer in a generator."""
+    def write(self, value):
+        return value
+
+
+def csv_lines(columns, rows):
+    """Header + one CSV line per row (a sequence in `columns` order; None is written as '')."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def jsonl_lines(columns, rows):
+    """One JSON object per row; Decimals as strings so no precision is lost."""
+    for row in rows:
+        yield json.dumps(
+            {c: str(v) if isinstance(v, Decimal) else v for c, v in zip(columns, row)},
+            ensure_ascii=False, default=str,
+        ) + '\n'
@@ -0,0 +1,466 @@
+import io
+import itertools
+import math
+import random
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image
+
+from .covers import invalidate_collection_covers
+from .models import (
+    Cart, CartItem, ChangeCounter, CustomUser, Delivery, DeliveryBoy, DeliveryProfile,
+    Order, Product, ProductImage, ProductVariant, RentBooking, SaleOrder,
+)
+from .rollups import rebuild_daily_stats
+from .search import rebuild_index
+
+# ==========================================
+# SYNTHETIC DATASETS
+# ==========================================
+# Generates a reproducible store of any size for load/scale testing
+# (`manage.py generate_synthetic_data`). The same seed and sizes always give
+# the same rows. Shapes follow what production looks like:
+#   - categories/sub-categories are long-tailed (a few big ones, many tiny)
+#   - product popularity and orders per customer are Zipf/Pareto-like,
+#     and ~10% of customers are heavy renters
+#   - orders grow over the date range and peak at weekends
+#   - statuses follow dates: old orders are delivered/returned, recent ones open
+# Everything is written with chunked bulk_create (no signals), so the derived
+# data (product availability, search index, daily rollups, delivery sync
+# versions) is filled in here directly or rebuilt at the end.
+
+CATEGORY_WEIGHTS = {'Women': 50, 'Men': 35, 'Kids': 15}
+SUB_CATEGORIES = [
+    'Dresses', 'Shirts', 'T-Shirts', 'Jeans', 'Kurtas', 'Sarees', 'Jackets', 'Suits', 'Lehengas',
+    'Sherwanis', 'Skirts', 'Shorts', 'Sweaters', 'Blazers', 'Gowns', 'Trousers', 'Hoodies', 'Tops',
+    'Ethnic Sets', 'Jumpsuits', 'Coats', 'Waistcoats', 'Tracksuits', 'Nightwear', 'Co-ords',
+    'Capes', 'Dungarees', 'Ponchos', 'Tuxedos', 'Kimonos', 'Bandhgalas', 'Anarkalis',
+]
+SIZES = ['XS', 'S', 'M', 'L', 'XL', 'XXL']
+COLORS = ['Black', 'White', 'Navy', 'Red', 'Beige', 'Olive', 'Maroon', 'Grey', 'Pink', 'Mustard']
+ADJECTIVES = ['Classic', 'Slim', 'Relaxed', 'Festive', 'Everyday', 'Vintage', 'Linen', 'Silk',
+              'Denim', 'Cotton', 'Embroidered', 'Printed', 'Tailored', 'Oversized', 'Party']
+FIRST_NAMES = ['Aarav', 'Diya', 'Vihaan', 'Ananya', 'Arjun', 'Isha', 'Kabir', 'Meera', 'Rohan',
+               'Saanvi', 'Aditya', 'Kiara', 'Reyansh', 'Anika', 'Ishaan', 'Myra', 'Dev', 'Zara']
+LAST_NAMES = ['Shah', 'Patel', 'Mehta', 'Sharma', 'Iyer', 'Reddy', 'Nair', 'Kapoor', 'Desai',
+              'Joshi', 'Gupta', 'Rao', 'Singh', 'Bose', 'Trivedi', 'Malhotra']
+CITIES = {  # city: (state, first zip, number of zips); bigger cities first
+    'Ahmedabad': ('Gujarat', 380001, 30),
+    'Mumbai': ('Maharashtra', 400001, 40),
+    'Surat': ('Gujarat', 395001, 15),
+    'Pune': ('Maharashtra', 411001, 20),
+    'Vadodara': ('Gujarat', 390001, 10),
+    'Rajkot': ('Gujarat', 360001, 6),
+}
+CITY_WEIGHTS = [35, 30, 12, 12, 7, 4]
+SWATCH_COUNT = 12           # distinct placeholder images, shared by all products
+SWATCH_DIRS = {'thumbnail': 'product_thumbnails/synthetic', 'image': 'product_images/synthetic'}
+HEAVY_RENTER_SHARE = 0.10
+PASSWORD = 'synthetic'
+
+
+def _zipf_cum_weights(n, s=1.1):
+    """Cumulative weights for random.choices(): item k is picked ~1/(k+1)^s as often as item 0."""
+    return list(itertools.accumulate(1 / (k + 1) ** s for k in range(n)))
+
+
+def _money(value):
+    return Decimal(value).quantize(Decimal('0.01'))
+
+
+# Columns Django stamps with now() on insert (auto_now / auto_now_add) that
+# generated rows carry their own, backdated values for
+BACKDATED_FIELDS = {
+    Product: ['created_at', 'updated_at'], Cart: ['created_at'], Order: ['created_at'],
+    SaleOrder: ['order_date'], RentBooking: ['order_date'], Delivery: ['assigned_at'],
+}
+
+
+def bulk_create_backdated(model, objs):
+    """
+    bulk_create() that keeps the timestamps set on the objects: the INSERT
+    stamps now() as usual, then one executemany UPDATE writes the generated
+    values back. (Switching auto_now off on the shared model fields instead
+    would affect every other thread of the process.)
+    """
+    fields = [model._meta.get_field(name) for name in BACKDATED_FIELDS[model]]
+    wanted = [[getattr(obj, field.attname) for field in fields] for obj in objs]
+    objs = model.objects.bulk_create(objs)
+
+    qn = connection.ops.quote_name
+    sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+        qn(model._meta.db_table), ', '.join(f'{qn(field.column)} = %s' for field in fields), qn(model._meta.pk.column),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            [field.get_db_prep_save(value, connection) for field, value in zip(fields, values)] + [obj.pk]
+            for obj, values in zip(objs, wanted)
+        ])
+    for obj, values in zip(objs, wanted):
+        for field, value in zip(fields, values):
+            setattr(obj, field.attname, value)
+    return objs
+
+
+class SyntheticStore:
+    """
+    One dataset: SyntheticStore(users=..., orders=..., seed=...).generate().
+    `prefix` namespaces usernames/emails so several datasets can share a DB.
+    `images` writes the placeholder JPEGs through default_storage, i.e. into
+    MEDIA_ROOT (scratch_database() points that at its scratch directory);
+    without it products are generated with no thumbnail or gallery.
+    """
+
+    def __init__(self, users=1000, products=500, orders=10000, drivers=20, days=365,
+                 carts=0.3, seed=42, prefix='synth', chunk_size=5000, today=None, log=None, images=True):
+        self.sizes = {'users': users, 'products': products, 'orders': orders, 'drivers': drivers}
+        self.days = max(days, 1)
+        self.cart_share = carts
+        self.prefix = prefix
+        self.chunk_size = chunk_size
+        self.today = today or timezone.localdate()
+        self.start = self.today - timedelta(days=self.days - 1)
+        self.rng = random.Random(seed)
+        self.log = log or (lambda message: None)
+        self.tz = timezone.get_current_timezone()
+        self.images = images
+
+    def generate(self):
+        if CustomUser.objects.filter(username__startswith=f"{self.prefix}_").exists():
+            raise ValueError(f"Users named '{self.prefix}_*' already exist; pick another prefix.")
+
+        self.make_swatches()
+        self.make_catalog()
+        self.make_people()
+        self.make_carts()
+        self.make_orders()
+
+        self.log("Rebuilding search index and daily rollups...")
+        rebuild_index(Product)
+        rebuild_daily_stats()
+        invalidate_collection_covers()
+        return self.sizes
+
+    # ------------------------------------------------------------------
+    # helpers
+
+    def _moment(self, day):
+        """A timestamp on `day`, weighted towards daytime."""
+        seconds = int(self.rng.triangular(7 * 3600, 23 * 3600, 15 * 3600))
+        return timezone.make_aware(datetime.combine(day, time()) + timedelta(seconds=seconds), self.tz)
+
+    def _chunks(self, total):
+        for begin in range(0, total, self.chunk_size):
+            yield begin, min(begin + self.chunk_size, total)
+
+    # ------------------------------------------------------------------
+    # 1. PLACEHOLDER IMAGES (a few small JPEGs every product points at)
+
+    def make_swatches(self):
+        if not self.images:
+            # Same random draws either way, so a seed gives the same dataset
+            self.swatches = {field: [''] * SWATCH_COUNT for field in SWATCH_DIRS}
+            return
+        self.swatches = {}
+        for field, folder in SWATCH_DIRS.items():
+            names = []
+            for i in range(SWATCH_COUNT):
+                name = f"{folder}/swatch-{i}.jpg"
+                if not default_storage.exists(name):
+                    hue = Image.new('RGB', (600, 800), self._swatch_color(i))
+                    buffer = io.BytesIO()
+                    hue.save(buffer, 'JPEG', quality=70)
+                    name = default_storage.save(name, ContentFile(buffer.getvalue()))
+                names.append(name)
+            self.swatches[field] = names
+
+    @staticmethod
+    def _swatch_color(i):
+        angle = 2 * math.pi * i / SWATCH_COUNT
+        return tuple(int(127 + 100 * math.sin(angle + shift)) for shift in (0, 2.1, 4.2))
+
+    # ------------------------------------------------------------------
+    # 2. CATALOG: products, variants, gallery images
+
+    def make_catalog(self):
+        rng = self.rng
+        count = self.sizes['products']
+        sub_weights = _zipf_cum_weights(len(SUB_CATEGORIES))
+        categories = list(CATEGORY_WEIGHTS)
+        category_weights = list(CATEGORY_WEIGHTS.values())
+        self.log(f"Creating {count} products...")
+
+        self.sale_variants = []     # (variant_id, product_id, price)
+        self.rent_variants = []
+        for begin, end in self._chunks(count):
+            products, plans = [], []
+            for _ in range(begin, end):
+                base = _money(round(rng.lognormvariate(math.log(1500), 0.6), -1) - 1)     # ~1,499 typical
+                sellable = rng.random() > 0.15
+                rentable = rng.random() < 0.4 or not sellable
+                first = rng.randrange(len(SIZES) - 1)
+                sizes = SIZES[first:first + rng.randint(2, 5)]
+                colors = rng.sample(COLORS, rng.choice((1, 1, 2, 3)))
+                variants = []
+                for color in colors:
+                    for size in sizes:
+                        stock = 0 if rng.random() < 0.1 else int(rng.expovariate(1 / 15)) + 1
+                        sale = base if sellable else None
+                        rent = _money(base * Decimal('0.1')) if rentable else None
+                        variants.append((size, color, stock, sale, rent))
+
+                created = self._moment(self.start - timedelta(days=rng.randrange(0, 180)))
+                sub_category = rng.choices(SUB_CATEGORIES, cum_weights=sub_weights)[0]
+                sale_prices = [v[3] for v in variants if v[3] is not None]
+                rent_prices = [v[4] for v in variants if v[4] is not None]
+                products.append(Product(
+                    name=f"{rng.choice(ADJECTIVES)} {sub_category[:-1] if sub_category.endswith('s') else sub_category}",
+                    description="Synthetic product for load testing.",
+                    thumbnail=rng.choice(self.swatches['thumbnail']) if rng.random() < 0.9 else '',
+                    category=rng.choices(categories, weights=category_weights)[0],
+                    sub_category=sub_category,
+                    is_rentable=rentable,
+                    created_at=created,
+                    updated_at=created,
+                    # Denormalized availability, as Product.rebuild_availability() would compute it
+                    is_for_sale=bool(sale_prices),
+                    is_for_rent=rentable and bool(rent_prices),
+                    min_sale_price=min(sale_prices) if sale_prices else None,
+                    min_rent_price=min(rent_prices) if rent_prices else None,
+                    total_stock=sum(v[2] for v in variants),
+                ))
+                plans.append(variants)
+
+            with transaction.atomic():
+                products = bulk_create_backdated(Product, products)
+                variants = ProductVariant.objects.bulk_create([
+                    ProductVariant(product_id=product.id, size=size, color=color, stock_quantity=stock,
+                                   sale_price=sale, rent_price_per_day=rent)
+                    for product, plan in zip(products, plans)
+                    for size, color, stock, sale, rent in plan
+                ])
+                gallery = [
+                    ProductImage(product_id=product.id, image=rng.choice(self.swatches['image']))
+                    for product in products
+                    for _ in range(rng.choice((0, 1, 2, 2, 3, 4)))
+                ]
+                ProductImage.objects.bulk_create([image for image in gallery if image.image])
+
+            for v in variants:
+                if v.sale_price is not None:
+                    self.sale_variants.append((v.id, v.product_id, v.sale_price))
+                if v.rent_price_per_day is not None:
+                    self.rent_variants.append((v.id, v.product_id, v.rent_price_per_day))
+
+        # Popularity: shuffle so the best sellers aren't simply the oldest products
+        rng.shuffle(self.sale_variants)
+        rng.shuffle(self.rent_variants)
+        self.sale_weights = _zipf_cum_weights(len(self.sale_variants), s=0.9)
+        self.rent_weights = _zipf_cum_weights(len(self.rent_variants), s=0.9)
+
+    # ------------------------------------------------------------------
+    # 3. PEOPLE: customers (with delivery profiles) and drivers
+
+    def make_people(self):
+        rng = self.rng
+        password = make_password(PASSWORD)     # hashing is slow; every synthetic user shares one
+        cities = list(CITIES)
+        total = self.sizes['users'] + self.sizes['drivers']
+        self.log(f"Creating {self.sizes['users']} customers and {self.sizes['drivers']} drivers...")
+
+        user_ids = []
+        for begin, end in self._chunks(total):
+            users, profiles = [], []
+            for i in range(begin, end):
+                first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                is_driver = i >= self.sizes['users']
+                username = f"{self.prefix}_{'driver' if is_driver else 'user'}{i}"
+                users.append(CustomUser(
+                    username=username, email=f"{username}@example.com", password=password,
+                    first_name=first, last_name=last, phone_number=f"9{rng.randrange(10 ** 9):09d}",
+                    role='delivery' if is_driver else 'customer',
+                    date_joined=self._moment(self.start - timedelta(days=rng.randrange(0, 90))),
+                ))
+                city = rng.choices(cities, weights=CITY_WEIGHTS)[0]
+                state, first_zip, zips = CITIES[city]
+                profiles.append((city, state, str(first_zip + rng.randrange(zips))))
+
+            with transaction.atomic():
+                users = CustomUser.objects.bulk_create(users)
+                # bulk_create skips the post_save that creates DeliveryProfile, so add them here
+                DeliveryProfile.objects.bulk_create([
+                    DeliveryProfile(user_id=user.id, phone=user.phone_number, city=city, state=state,
+                                    zip_code=zip_code, address=f"{rng.randint(1, 400)}, {rng.choice(LAST_NAMES)} Nagar")
+                    for user, (city, state, zip_code) in zip(users, profiles)
+                ])
+            user_ids.extend(user.id for user in users)
+
+        customers, drivers = user_ids[:self.sizes['users']], user_ids[self.sizes['users']:]
+        self.driver_ids = [d.id for d in DeliveryBoy.objects.bulk_create([
+            DeliveryBoy(user_id=user_id, vehicle_number=f"GJ01-{rng.randrange(10000):04d}",
+                        vehicle_type=rng.choice(['Bike', 'Bike', 'Scooter', 'Van']),
+                        salary=_money(rng.randrange(15000, 30000, 500)))
+            for user_id in drivers
+        ])]
+
+        # Orders per customer are Pareto-distributed; a few are heavy renters
+        self.customers = customers
+        self.customer_weights = list(itertools.accumulate(
+            min(rng.paretovariate(1.5), 50) for _ in customers
+        ))
+        self.heavy_renters = set(rng.sample(customers, int(len(customers) * HEAVY_RENTER_SHARE)))
+
+    # ------------------------------------------------------------------
+    # 4. CARTS (open carts, to exercise the badge and cart pages)
+
+    def make_carts(self):
+        rng = self.rng
+        owners = [c for c in self.customers if rng.random() < self.cart_share]
+        self.log(f"Creating {len(owners)} carts...")
+        for begin, end in self._chunks(len(owners)):
+            with transaction.atomic():
+                carts = bulk_create_backdated(Cart, [
+                    Cart(user_id=user_id, created_at=self._moment(self.today - timedelta(days=rng.randrange(30))))
+                    for user_id in owners[begin:end]
+                ])
+                items = []
+                for cart in carts:
+                    for _ in range(rng.choice((1, 1, 2, 3, 4))):
+                        if cart.user_id in self.heavy_renters and self.rent_variants:
+                            variant_id, product_id, price = self._pick(rent=True)
+                            start = self.today + timedelta(days=rng.randint(1, 20))
+                            items.append(CartItem(cart_id=cart.id, product_id=product_id, variant_id=variant_id,
+                                                  is_rental=True, price_at_add=price, rental_start_date=start,
+                                                  rental_end_date=start + timedelta(days=rng.randint(2, 7))))
+                        elif self.sale_variants:
+                            variant_id, product_id, price = self._pick(rent=False)
+                            items.append(CartItem(cart_id=cart.id, product_id=product_id, variant_id=variant_id,
+                                                  quantity=rng.choice((1, 1, 1, 2)), price_at_add=price))
+                CartItem.objects.bulk_create(items)
+
+    def _pick(self, rent):
+        if rent:
+            return self.rng.choices(self.rent_variants, cum_weights=self.rent_weights)[0]
+        return self.rng.choices(self.sale_variants, cum_weights=self.sale_weights)[0]
+
+    # ------------------------------------------------------------------
+    # 5. ORDERS with sale/rent lines and their deliveries
+
+    def _order_days(self, count):
+        """`count` order dates, sorted: growing ~3x over the range, +30% at weekends."""
+        days = [self.start + timedelta(days=i) for i in range(self.days)]
+        weights = [
+            (1 + 2 * i / self.days) * (1.3 if day.weekday() >= 5 else 1.0)
+            for i, day in enumerate(days)
+        ]
+        return sorted(self.rng.choices(days, weights=weights, k=count))
+
+    def make_orders(self):
+        count = self.sizes['orders']
+        if not count or not self.customers or not (self.sale_variants or self.rent_variants):
+            return
+        self.log(f"Creating {count} orders...")
+        order_days = self._order_days(count)
+
+        # Every delivery needs a sync version (normally taken in Delivery.save)
+        last_version = ChangeCounter.next('delivery', count)
+        next_version = itertools.count(last_version - count + 1)
+
+        for begin, end in self._chunks(count):
+            with transaction.atomic():
+                self._order_chunk(order_days[begin:end], next_version)
+            self.log(f"  {end}/{count} orders")
+
+    def _order_chunk(self, days, next_version):
+        rng = self.rng
+        orders, lines = [], []
+        for day in days:
+            user_id = rng.choices(self.customers, cum_weights=self.customer_weights)[0]
+            created = self._moment(day)
+            rent_share = 0.75 if user_id in self.heavy_renters else 0.12
+            order_lines = []
+            for _ in range(min(1 + int(rng.expovariate(1.2)), 6)):
+                rent = bool(self.rent_variants) and (rng.random() < rent_share or not self.sale_variants)
+                order_lines.append(self._rent_line(user_id, created) if rent else self._sale_line(user_id, created))
+            orders.append(Order(user_id=user_id, created_at=created,
+                                total_price=sum(line.total_price for line in order_lines)))
+            lines.append(order_lines)
+
+        orders = bulk_create_backdated(Order, orders)
+        sales, rentals, deliveries = [], [], []
+        for order, order_lines in zip(orders, lines):
+            for line in order_lines:
+                line.parent_order_id = order.id
+                (rentals if isinstance(line, RentBooking) else sales).append(line)
+            deliveries.append(self._delivery(order, next(next_version)))
+
+        bulk_create_backdated(SaleOrder, sales)
+        bulk_create_backdated(RentBooking, rentals)
+        bulk_create_backdated(Delivery, deliveries)
+
+    def _age(self, created):
+        return (self.today - timezone.localtime(created, self.tz).date()).days
+
+    def _sale_line(self, user_id, created):
+        rng = self.rng
+        variant_id, _, price = self._pick(rent=False)
+        quantity = rng.choice((1, 1, 1, 1, 2, 3))
+        age = self._age(created)
+        if age > 7:
+            status = rng.choices(['Delivered', 'Returned', 'Cancelled'], weights=[95, 3, 2])[0]
+        else:
+            status = 'Shipped' if age > 1 else 'Pending'
+        return SaleOrder(user_id=user_id, variant_id=variant_id, quantity=quantity, order_date=created,
+                         total_price=price * quantity, status=status)
+
+    def _rent_line(self, user_id, created):
+        rng = self.rng
+        variant_id, _, price = self._pick(rent=True)
+        start = timezone.localtime(created, self.tz).date() + timedelta(days=rng.randint(1, 10))
+        end = start + timedelta(days=rng.choice((2, 3, 3, 4, 5, 7, 7, 10, 14)))
+        days = max((end - start).days, 1)
+        returned_at, late_fee = None, Decimal('0.00')
+
+        if end < self.today:
+            late = int(rng.expovariate(1 / 2)) if rng.random() < 0.15 else 0
+            if rng.random() < 0.02 and (self.today - end).days < 30:
+                status = 'Overdue'
+                late_fee = price * (self.today - end).days
+            else:
+                status = 'Returned'
+                returned_at = self._moment(end + timedelta(days=late))
+                late_fee = price * late
+        elif start <= self.today:
+            status = 'Active'
+        else:
+            status = rng.choice(['Pending', 'Approved', 'Approved'])
+        if rng.random() < 0.02:
+            status, returned_at, late_fee = 'Cancelled', None, Decimal('0.00')
+
+        return RentBooking(user_id=user_id, variant_id=variant_id, start_date=start, end_date=end,
+                           quantity=1, total_price=price * days, status=status, order_date=created,
+                           returned_at=returned_at, late_fee=late_fee)
+
+    def _delivery(self, order, version):
+        rng = self.rng
+        age = self._age(order.created_at)
+        driver_id = rng.choice(self.driver_ids) if self.driver_ids else None
+        delivered_at = None
+        if age > 5:
+            status = 'Failed' if rng.random() < 0.01 else 'Delivered'
+            if status == 'Delivered':
+                delivered_at = order.created_at + timedelta(hours=rng.randint(20, 120))
+        elif age > 1:
+            status = 'Out for Delivery' if driver_id else 'Pending'
+        else:
+            status = 'Pending'
+            if rng.random() < 0.6:
+                driver_id = None    # left for the dispatcher
+        return Delivery(order_id=order.id, delivery_boy_id=driver_id, assigned_at=order.created_at,
+                        delivered_at=delivered_at, status=status, version=version)
@@ -0,0 +1,49 @@
+from django import template
+from django.utils.html import format_html
+
+from shop.images import fallback_url, srcset_for
+
+register = template.Library()
+
+# Default `sizes` for product grid cards (4 columns on desktop, 2 on mobile)
+CARD_SIZES = '(max-width: 768px) 50vw, 25vw'
+
+
+@register.simple_tag
+def responsive_img(obj, field='thumbnail', alt='', sizes=CARD_SIZES, css_class='', eager=False, img_id=''):
+    """
+    <img> for an image field with derivatives: webp srcset, lazy loading and the
+    blurred placeholder as background. Falls back to the original file until
+    its derivatives exist. Usage: {% responsive_img product alt=product.name %}
+    """
+    field_file = getattr(obj, field)
+    if not field_file:
+        return ''
+    content_hash = getattr(obj, f'{field}_hash', '')
+    placeholder = getattr(obj, f'{field}_placeholder', '')
+    srcset = srcset_for(field_file, content_hash)
+
+    return format_html(
+        '<img src="{}"{}{} alt="{}"{}{} loading="{}" decoding="async"{}>',
+        fallback_url(field_file, content_hash),
+        format_html(' srcset="{}"', srcset) if srcset else '',
+        format_html(' sizes="{}"', sizes) if srcset else '',
+        alt,
+        format_html(' class="{}"', css_class) if css_class else '',
+        format_html(' id="{}"', img_id) if img_id else '',
+        'eager' if eager else 'lazy',
+        format_html(' style="background: url(\'{}\') center / cover no-repeat;"', placeholder) if placeholder else '',
+    )
+
+
+@register.simple_tag
+def image_src(obj, field='thumbnail'):
+    """Single best URL for an image field (the 480px derivative, or the original)."""
+    field_file = getattr(obj, field)
+    return fallback_url(field_file, getattr(obj, f'{field}_hash', '')) if field_file else ''
+
+
+@register.simple_tag
+def image_srcset(obj, field='thumbnail'):
+    field_file = getattr(obj, field)
+    return srcset_for(field_file, getattr(obj, f'{field}_hash', '')) if field_file else ''
@@ -1,67 +1,722 @@
-from django.views.decorators.http import require_POST
-from django.contrib.auth.decorators import login_required
-from .models import Cart, CartItem, ProductVariant
+import io
 import json
-from datetime import datetime
-
-# ... existing views ...
-
-@login_required(login_url='login') # Force login to add to cart
-@require_POST
-def add_to_cart(request):
-    try:
-        data = json.loads(request.body)
-        
-        # 1. Get Data from Frontend
-        product_id = data.get('product_id')
-        variant_id = data.get('variant_id')
-        action_type = data.get('action_type') # 'buy' or 'rent'
-        start_date = data.get('start_date')
-        end_date = data.get('end_date')
-        
-        # 2. Get or Create Cart for User
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        
-        # 3. Get Product Details
-        product = get_object_or_404(Product, id=product_id)
-        variant = None
-        price = product.base_price # Default
-        
-        if variant_id:
-            variant = get_object_or_404(ProductVariant, id=variant_id)
-            price = variant.price # Override with variant price
-            
-        # 4. Handle Rental Logic
-        is_rental = (action_type == 'rent')
-        
-        if is_rental:
-            # Simple validation
-            if not start_date or not end_date:
-                return JsonResponse({'status': 'error', 'message': 'Please select rental dates.'})
-            # Convert string dates to objects
-            # (Assuming frontend sends YYYY-MM-DD)
-            # You might want to calculate rental duration price logic here later
-            pass 
-        
-        # 5. Add to Cart Item
-        # Check if item already exists in cart (same product, same size, same type)
-        item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product,
-            variant=variant,
-            is_rental=is_rental,
-            rental_start_date=start_date if is_rental else None,
-            rental_end_date=end_date if is_rental else None,
-            defaults={'price_at_add': price}
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from PIL import Image
+
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models import Count, Q
+from django.test import TestCase, override_settings
+from django.db.models import Sum
+from django.urls import reverse
+from django.utils import timezone
+
+from . import search, views
+from .delivery_sync import CLOSED_STATUSES, sync_tasks
+from .dispatch import dispatch_pending, plan_assignments
+from .availability import check_rental, daily_free_units, free_units_for_sale
+from .cart_badge import cart_badge
+from .catalog_io import CatalogError, import_catalog
+from .checkout import CheckoutError, place_order
+from .covers import collection_covers
+from .images import generate_for
+from .inventory import apply_adjustments
+from .models import (
+    Cart, CartItem, CustomUser, DailyStat, Delivery, DeliveryBoy, DeliveryProfile, Order, Product, ProductVariant,
+    RentBooking, SaleOrder,
+)
+from .profiling import QueryBudgetExceeded
+from .routing import distance_matrix, load_centroids, nearest_neighbour, sequence_stops, two_opt
+from .synthetic import SyntheticStore
+
+# ==========================================
+# QUERY BUDGETS
+# ==========================================
+# Every view with a @query_budget, requested against a small synthetic store
+# as the user who makes it work hardest. QUERY_BUDGET_STRICT is set here
+# rather than relying on settings.TESTING (which only sees `manage.py test`),
+# so a view over its budget raises QueryBudgetExceeded and fails its test
+# under any runner.
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        SyntheticStore(users=40, products=30, orders=300, drivers=3, days=60, seed=7,
+                       prefix='test', images=False).generate()
+
+        # The busiest customer and driver, as in `manage.py bench_routes`
+        cls.customer = CustomUser.objects.get(id=(
+            Order.objects.values('user').annotate(n=Count('id')).order_by('-n', 'user').values_list('user', flat=True)[0]
+        ))
+        cls.driver = (
+            DeliveryBoy.objects.annotate(open=Count('deliveries', filter=~Q(deliveries__status__in=CLOSED_STATUSES)))
+            .order_by('-open', 'id').select_related('user').first()
+        )
+        cls.admin = CustomUser.objects.create_superuser('test_admin', 'test_admin@example.com', 'x')
+
+        cls.variant = ProductVariant.objects.filter(sale_price__gt=0).select_related('product').order_by('id').first()
+        cls.order = Order.objects.filter(user=cls.customer).order_by('-id').first()
+        cls.delivered_order = (
+            Order.objects.filter(user=cls.customer, delivery_info__status='Delivered').order_by('-id').first()
+        )
+        cart, _ = Cart.objects.get_or_create(user=cls.customer)
+        for variant in ProductVariant.objects.filter(sale_price__gt=0).order_by('id')[:3]:
+            cart.items.create(product_id=variant.product_id, variant=variant, price_at_add=variant.sale_price)
+
+    def setUp(self):
+        cache.clear()   # budgets hold for a cold cache, whatever ran before
+
+    def fetch(self, user, name, *args, **params):
+        if user is not None:
+            self.client.force_login(user)
+        response = self.client.get(reverse(name, args=args), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    # Storefront
+    def test_home(self):
+        self.fetch(None, 'home')
+        self.fetch(None, 'home', q='shirt')
+        self.fetch(None, 'home', type='rent')
+
+    def test_catalog_pages(self):
+        self.fetch(None, 'collection')
+        self.fetch(None, 'view_category', 'Women')
+        self.fetch(None, 'rentals')
+        self.fetch(None, 'product_detail', self.variant.product_id)
+
+    # Customer
+    def test_customer_pages(self):
+        self.fetch(self.customer, 'view_cart')
+        self.fetch(self.customer, 'my_orders')
+        self.fetch(self.customer, 'user_profile')
+
+    def test_order_invoice(self):
+        self.fetch(self.customer, 'order_invoice', self.delivered_order.id)    # first download renders it
+        self.fetch(self.customer, 'order_invoice', self.delivered_order.id, format='txt')
+
+    # Delivery
+    def test_delivery_pages(self):
+        response = self.fetch(self.driver.user, 'delivery_dashboard')
+        self.assertTrue(response.context['in_route_order'])     # the shipped centroids locate the stops
+        self.assertIsNotNone(self.fetch(self.driver.user, 'delivery_sync').json()['route'])
+
+    # Admin dashboards
+    def test_admin_pages(self):
+        self.fetch(self.admin, 'admin_dashboard')
+        self.fetch(self.admin, 'admin_dashboard', days=365)
+        self.fetch(self.admin, 'admin_orders')
+        self.fetch(self.admin, 'admin_order_detail', self.order.id)
+        self.fetch(self.admin, 'admin_users')
+        self.fetch(self.admin, 'admin_rentals')
+        self.fetch(self.admin, 'inventory')
+
+    def test_adjust_stock(self):
+        self.client.force_login(self.admin)
+        rows = [{'variant_id': variant.id, 'stock_delta': 1}
+                for variant in ProductVariant.objects.order_by('id')[:20]]
+        response = self.client.post(reverse('adjust_stock'), json.dumps({'rows': rows}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+    # The strict flag itself
+    def test_over_budget_raises(self):
+        self.client.force_login(self.customer)
+        with mock.patch.object(views.my_orders, 'query_budget', 1):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('my_orders'))
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_over_budget_only_logs_when_not_strict(self):
+        with mock.patch.object(views.my_orders, 'query_budget', 1):
+            with self.assertLogs('shop.profiling', 'WARNING'):
+                self.fetch(self.customer, 'my_orders')
+
+
+# ==========================================
+# CACHE INVALIDATION
+# ==========================================
+# The cart badge and collection covers are cached; writes that don't go
+# through the views must still drop the entries (signals.py).
+
+class CacheInvalidationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('shopper', 'shopper@example.com', 'x')
+        cls.product = Product.objects.create(name='Cached Tee', category='Men', thumbnail='product_thumbnails/old.jpg')
+        cls.variant = ProductVariant.objects.create(product=cls.product, size='M', sale_price=100)
+        cls.cart = Cart.objects.create(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cart_badge_dropped_when_a_line_is_deleted(self):
+        item = self.cart.items.create(product=self.product, variant=self.variant, quantity=2, price_at_add=100)
+        self.assertEqual(cart_badge(self.user.id)['count'], 2)
+        CartItem.objects.filter(pk=item.pk).delete()
+        self.assertEqual(cart_badge(self.user.id)['count'], 0)
+
+    def test_cart_badge_dropped_when_the_product_is_deleted(self):
+        other = Product.objects.create(name='Doomed Tee', category='Men')
+        self.cart.items.create(product=other, quantity=1, price_at_add=50)
+        self.cart.items.create(product=self.product, variant=self.variant, quantity=1, price_at_add=100)
+        self.assertEqual(cart_badge(self.user.id)['count'], 2)
+        other.delete()      # cascades to its cart line
+        self.assertEqual(cart_badge(self.user.id), {'count': 1, 'total': 100})
+
+    def test_covers_dropped_when_the_catalog_changes(self):
+        self.assertEqual(len(collection_covers()['pools']['Women']), 0)
+        Product.objects.create(name='New Dress', category='Women', thumbnail='product_thumbnails/new.jpg')
+        self.assertEqual(len(collection_covers()['pools']['Women']), 1)
+        Product.objects.filter(category='Women').get().delete()
+        self.assertEqual(collection_covers()['pools']['Women'], [])
+
+
+# ==========================================
+# ROUTE SEQUENCING
+# ==========================================
+# Against a fixture centroid CSV: six zips on a north-south line ~1.1 km
+# apart (A..F), so the best route from A is simply A, B, C, D, E, F.
+
+FIXTURE_CENTROIDS = """zip_code,lat,lng,place
+A1,23.00,72.50,first
+B2,23.01,72.50,
+C3,23.02,72.50,
+D4,23.03,72.50,
+E5,23.04,72.50,
+F6,23.05,72.50,last
+bad,north,72.50,skipped
+"""
+
+
+class RoutingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.csv = os.path.join(directory.name, 'centroids.csv')
+        with open(self.csv, 'w', encoding='utf-8') as f:
+            f.write(FIXTURE_CENTROIDS)
+        override = override_settings(ZIP_CENTROIDS_CSV=self.csv)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def length(self, path, dist):
+        return sum(dist[a][b] for a, b in zip(path, path[1:]))
+
+    def test_loads_the_configured_csv(self):
+        centroids = load_centroids()
+        self.assertEqual(len(centroids), 6)     # the unparseable row is skipped
+        self.assertEqual(centroids['A1'], (23.0, 72.5))
+
+    def test_cache_follows_the_setting(self):
+        self.assertIn('A1', load_centroids())
+        with override_settings(ZIP_CENTROIDS_CSV=os.path.join(os.path.dirname(self.csv), 'missing.csv')):
+            self.assertEqual(load_centroids(), {})
+        self.assertIn('A1', load_centroids())
+
+    def test_nearest_neighbour_then_two_opt(self):
+        points = [(23.00, 72.50), (23.03, 72.50), (23.01, 72.50), (23.05, 72.50), (23.02, 72.50), (23.04, 72.50)]
+        dist = distance_matrix(points)
+        self.assertAlmostEqual(dist[0][2], 1.11, places=2)
+        self.assertEqual(nearest_neighbour(dist, 0), [0, 2, 4, 1, 5, 3])
+
+        # A criss-crossing path is untangled; the first stop stays put
+        crossed = [0, 3, 4, 1, 2, 5]
+        improved = two_opt(crossed, dist)
+        self.assertEqual(improved[0], 0)
+        self.assertEqual(improved, [0, 2, 4, 1, 5, 3])
+        self.assertLess(self.length(improved, dist), self.length(crossed, dist))
+
+    def test_sequence_stops(self):
+        stops = [('t4', 'D4'), ('t1', 'b2'), ('t9', '999999'), ('t2', 'F6'), ('t3', 'C3'), ('t5', 'B2')]
+        # From the driver's zip A1: nearest first, same-zip stops together, unknown zips last
+        self.assertEqual(sequence_stops(stops, start_zip='A1'), ['t1', 't5', 't3', 't4', 't2', 't9'])
+        # Without a depot the first located stop is the start
+        self.assertEqual(sequence_stops(stops), ['t4', 't3', 't1', 't5', 't2', 't9'])
+
+    def test_no_route_until_two_places_are_known(self):
+        self.assertIsNone(sequence_stops([('t1', 'A1'), ('t2', 'A1'), ('t3', 'nowhere')]))
+        self.assertIsNone(sequence_stops([]))
+
+    def test_shipped_table_covers_the_delivery_cities(self):
+        with override_settings(ZIP_CENTROIDS_CSV=None):
+            centroids = load_centroids()
+        for zip_code in ('380009', '400001', '395001', '411001', '390001', '360001'):
+            self.assertIn(zip_code, centroids)
+        for lat, lng in centroids.values():
+            self.assertTrue(18 < lat < 24 and 70 < lng < 74)
+
+
+# ==========================================
+# IMAGE DERIVATIVES
+# ==========================================
+
+def jpeg_upload(name, color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (600, 800), color).save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/jpeg')
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(MEDIA_ROOT=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_upload_is_queued_then_built(self):
+        product = Product.objects.create(name='Photo Tee', category='Men', thumbnail=jpeg_upload('a.jpg', 'red'))
+        self.assertEqual(Product.objects.get(pk=product.pk).thumbnail_hash, '')
+
+        self.assertIs(generate_for(Product.objects.get(pk=product.pk), 'thumbnail'), True)
+        stored = Product.objects.get(pk=product.pk)
+        self.assertEqual(len(stored.thumbnail_hash), 64)
+        self.assertTrue(stored.thumbnail_placeholder.startswith('data:image/webp;base64,'))
+
+    def test_worker_does_not_overwrite_a_newer_upload(self):
+        product = Product.objects.create(name='Photo Tee', category='Men', thumbnail=jpeg_upload('a.jpg', 'red'))
+        in_worker = Product.objects.get(pk=product.pk)      # the worker picked up a.jpg...
+
+        product.thumbnail = jpeg_upload('b.jpg', 'blue')    # ...then the admin uploads b.jpg
+        product.save()
+
+        self.assertIsNone(generate_for(in_worker, 'thumbnail'))
+        stored = Product.objects.get(pk=product.pk)
+        self.assertEqual((stored.thumbnail_hash, stored.thumbnail_placeholder), ('', ''))    # b.jpg stays queued
+        self.assertIs(generate_for(stored, 'thumbnail'), True)
+
+
+# ==========================================
+# CHECKOUT
+# ==========================================
+
+class CheckoutTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name='Last Jacket', category='Men', is_rentable=True)
+        cls.variant = ProductVariant.objects.create(product=cls.product, size='M', stock_quantity=1,
+                                                    sale_price=1000, rent_price_per_day=100)
+        cls.alice = CustomUser.objects.create_user('alice', 'alice@example.com', 'x')
+        cls.bob = CustomUser.objects.create_user('bob', 'bob@example.com', 'x')
+        cls.today = timezone.localdate()
+
+    def cart_for(self, user, *lines):
+        cart, _ = Cart.objects.get_or_create(user=user)
+        for quantity, dates in lines:
+            cart.items.create(
+                product=self.product, variant=self.variant, quantity=quantity, price_at_add=1000,
+                is_rental=dates is not None,
+                rental_start_date=dates and self.today + timedelta(days=dates[0]),
+                rental_end_date=dates and self.today + timedelta(days=dates[1]),
+            )
+        return cart
+
+    def stock(self):
+        return ProductVariant.objects.get(pk=self.variant.pk).stock_quantity
+
+    def totals(self):
+        return DailyStat.objects.filter(category=DailyStat.ALL_CATEGORIES).aggregate(
+            orders=Sum('orders'), items_sold=Sum('items_sold'),
+            rentals_booked=Sum('rentals_booked'), rentals_pending=Sum('rentals_pending'),
+        )
+
+    def test_two_buyers_cannot_both_take_the_last_unit(self):
+        alice_cart = self.cart_for(self.alice, (1, None))
+        bob_cart = self.cart_for(self.bob, (1, None))
+
+        place_order(self.alice, alice_cart)
+        with self.assertRaisesMessage(CheckoutError, 'left in stock'):
+            place_order(self.bob, bob_cart)
+
+        self.assertEqual(self.stock(), 0)
+        self.assertEqual(Order.objects.filter(user=self.bob).count(), 0)
+        self.assertEqual(bob_cart.items.count(), 1)     # a failed checkout keeps the bag
+
+    def test_conditional_update_catches_a_stale_validation(self):
+        # Both checkouts validated before either wrote: the F() update is the last guard
+        cart = self.cart_for(self.bob, (1, None))
+        ProductVariant.objects.filter(pk=self.variant.pk).update(stock_quantity=0)
+        with mock.patch('shop.checkout.free_units_for_sale_many', return_value={self.variant.id: 1}):
+            with self.assertRaisesMessage(CheckoutError, 'just sold out'):
+                place_order(self.bob, cart)
+
+        self.assertEqual(self.stock(), 0)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(SaleOrder.objects.exists())
+
+    def test_rental_window_overlap_is_rejected(self):
+        RentBooking.objects.create(user=self.alice, variant=self.variant, start_date=self.today + timedelta(days=10),
+                                   end_date=self.today + timedelta(days=12), total_price=300,
+                                   status=RentBooking.STATUS_APPROVED)
+
+        # Overlapping on the booking's last day
+        with self.assertRaisesMessage(CheckoutError, 'no longer available for your rental dates'):
+            place_order(self.bob, self.cart_for(self.bob, (1, (12, 14))))
+        # Selling the unit would break the booking too
+        Cart.objects.filter(user=self.bob).delete()
+        with self.assertRaisesMessage(CheckoutError, 'left in stock'):
+            place_order(self.bob, self.cart_for(self.bob, (1, None)))
+
+        # Two lines of the same bag that overlap each other
+        Cart.objects.filter(user=self.bob).delete()
+        with self.assertRaises(CheckoutError):
+            place_order(self.bob, self.cart_for(self.bob, (1, (20, 22)), (1, (22, 23))))
+
+        # The day after is free
+        Cart.objects.filter(user=self.bob).delete()
+        order = place_order(self.bob, self.cart_for(self.bob, (1, (13, 15))))
+        self.assertEqual(order.rent_items.count(), 1)
+
+    def test_stock_and_rollup_are_counted_exactly_once(self):
+        ProductVariant.objects.filter(pk=self.variant.pk).update(stock_quantity=5)
+        before = self.totals()
+
+        order = place_order(self.alice, self.cart_for(self.alice, (2, None), (1, (30, 31))))
+
+        self.assertEqual(self.stock(), 3)       # rentals hold units by date, they don't take stock
+        after = self.totals()
+        self.assertEqual((after['orders'] or 0) - (before['orders'] or 0), 1)
+        self.assertEqual((after['items_sold'] or 0) - (before['items_sold'] or 0), 2)
+        self.assertEqual((after['rentals_booked'] or 0) - (before['rentals_booked'] or 0), 1)
+        self.assertEqual((after['rentals_pending'] or 0) - (before['rentals_pending'] or 0), 1)
+        self.assertEqual(order.sale_items.get().quantity, 2)
+        self.assertFalse(Cart.objects.get(user=self.alice).items.exists())
+
+
+# ==========================================
+# RENTAL AVAILABILITY
+# ==========================================
+# Bookings occupy every day of [start_date, end_date], both ends included;
+# items still with the customer stay busy until today.
+
+class AvailabilityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name='Sherwani', category='Men', is_rentable=True)
+        cls.variant = ProductVariant.objects.create(product=cls.product, size='L', stock_quantity=2,
+                                                    sale_price=5000, rent_price_per_day=500)
+        cls.user = CustomUser.objects.create_user('renter', 'renter@example.com', 'x')
+        cls.today = timezone.localdate()
+
+    def day(self, offset):
+        return self.today + timedelta(days=offset)
+
+    def book(self, start, end, status=RentBooking.STATUS_APPROVED, quantity=1):
+        return RentBooking.objects.create(user=self.user, variant=self.variant, start_date=self.day(start),
+                                          end_date=self.day(end), quantity=quantity, total_price=500,
+                                          status=status)
+
+    def free(self, start, end):
+        return daily_free_units([self.variant], self.day(start), self.day(end))[self.variant.id]
+
+    def test_same_day_booking_holds_exactly_that_day(self):
+        self.book(10, 10)
+        self.assertEqual(self.free(9, 11), [2, 1, 2])
+
+    def test_adjacent_bookings_share_their_edge_day(self):
+        self.book(10, 12)
+        self.book(12, 14)
+        self.assertEqual(self.free(9, 15), [2, 1, 1, 0, 1, 1, 2])
+        # The shared day is full: a rental touching it fails, one starting after it fits
+        self.assertIsNotNone(check_rental(self.variant, self.day(12), self.day(13), 1))
+        self.assertIsNotNone(check_rental(self.variant, self.day(8), self.day(12), 1))
+        self.assertIsNone(check_rental(self.variant, self.day(13), self.day(14), 1))
+
+    def test_window_edges_clip_the_booking(self):
+        self.book(5, 20, quantity=2)
+        self.assertEqual(self.free(20, 21), [0, 2])
+        self.assertEqual(self.free(3, 5), [2, 2, 0])
+
+    def test_overdue_booking_is_extended_to_today(self):
+        self.book(-10, -3, status=RentBooking.STATUS_OVERDUE)
+        self.assertEqual(self.free(-1, 1), [1, 1, 2])     # busy up to today, free from tomorrow
+        self.assertEqual(free_units_for_sale(self.variant), 1)
+        self.assertIsNotNone(check_rental(self.variant, self.today, self.today, 2))
+        self.assertIsNone(check_rental(self.variant, self.day(1), self.day(1), 2))
+
+    def test_only_items_with_the_customer_are_extended(self):
+        self.book(-10, -3, status=RentBooking.STATUS_ACTIVE)
+        self.book(-10, -3, status=RentBooking.STATUS_APPROVED)      # never shipped: its dates just passed
+        self.book(-10, -3, status=RentBooking.STATUS_RETURNED)
+        self.assertEqual(self.free(0, 0), [1])
+        self.assertEqual(free_units_for_sale(self.variant), 1)
+
+
+# ==========================================
+# BULK STOCK ADJUSTMENTS
+# ==========================================
+
+class StockAdjustmentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name='Kurta', category='Men', is_rentable=True)
+        cls.a, cls.b, cls.c = (
+            ProductVariant.objects.create(product=cls.product, size=size, stock_quantity=10,
+                                          sale_price=500, rent_price_per_day=50)
+            for size in ('S', 'M', 'L')
         )
-        
-        if not created:
-            item.quantity += 1
-            item.save()
-            
-        # Return success with new cart count
-        cart_count = cart.items.count()
-        return JsonResponse({'status': 'success', 'message': 'Added to bag!', 'cart_count': cart_count})
-
-    except Exception as e:
-        return JsonResponse({'status': 'error', 'message': str(e)})
\ No newline at end of file
+        cls.user = CustomUser.objects.create_user('renter', 'renter@example.com', 'x')
+
+    def values(self, variant):
+        variant = ProductVariant.objects.get(pk=variant.pk)
+        return variant.stock_quantity, variant.sale_price
+
+    def test_a_failing_delta_rolls_back_the_whole_batch(self):
+        ok, results = apply_adjustments([
+            {'variant_id': self.a.id, 'stock_delta': 5},
+            {'variant_id': self.b.id, 'sale_price': '450.00'},
+            {'variant_id': self.c.id, 'stock_delta': -11},
+        ])
+        self.assertFalse(ok)
+        self.assertEqual([r['status'] for r in results], ['skipped', 'skipped', 'error'])
+        self.assertIn("can't remove 11", results[2]['error'])
+        self.assertEqual(self.values(self.a), (10, 500))
+        self.assertEqual(self.values(self.b), (10, 500))
+
+    def test_duplicate_variant_ids_are_rejected(self):
+        ok, results = apply_adjustments([
+            {'variant_id': self.a.id, 'stock_delta': 1},
+            {'variant_id': self.a.id, 'stock_delta': 1},
+        ])
+        self.assertFalse(ok)
+        self.assertEqual(results[1]['error'], f"variant {self.a.id} appears more than once")
+        self.assertEqual(self.values(self.a), (10, 500))
+
+    def test_mixed_absolute_and_delta_rows(self):
+        ok, results = apply_adjustments([
+            {'variant_id': self.a.id, 'stock': 40},
+            {'variant_id': self.b.id, 'stock_delta': -3, 'sale_price': '450'},
+            {'variant_id': self.c.id, 'rent_price': '60.00'},
+        ])
+        self.assertTrue(ok)
+        self.assertEqual([r['stock'] for r in results], [40, 7, 10])
+        self.assertEqual(self.values(self.b), (7, 450))
+        self.assertEqual(ProductVariant.objects.get(pk=self.c.pk).rent_price_per_day, 60)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).total_stock, 57)     # availability rebuilt
+
+    def test_stock_cannot_drop_below_units_reserved_by_rentals(self):
+        today = timezone.localdate()
+        RentBooking.objects.create(user=self.user, variant=self.a, quantity=8, total_price=500,
+                                   start_date=today + timedelta(days=5), end_date=today + timedelta(days=7),
+                                   status=RentBooking.STATUS_APPROVED)
+
+        for row in ({'stock': 7}, {'stock_delta': -3}):
+            ok, results = apply_adjustments([{'variant_id': self.a.id, **row}])
+            self.assertFalse(ok)
+            self.assertIn('8 units are reserved by rentals', results[0]['error'])
+        self.assertEqual(self.values(self.a), (10, 500))
+
+        self.assertTrue(apply_adjustments([{'variant_id': self.a.id, 'stock_delta': -2}])[0])
+        self.assertTrue(apply_adjustments([{'variant_id': self.a.id, 'stock': 9}])[0])
+        self.assertEqual(self.values(self.a), (9, 500))
+
+
+# ==========================================
+# CATALOG IMPORT
+# ==========================================
+
+class CatalogImportTests(TestCase):
+    def catalog(self, products):
+        lines = ['name,category,size,color,stock_quantity,sale_price']
+        lines += [f'Imported Tee {i},Men,M,Black,5,499' for i in range(products)]
+        return io.StringIO('\n'.join(lines) + '\n')
+
+    def failing_on_chunk(self, n):
+        # The search index write of chunk n hits a database error, after its products were written
+        real, calls = search.index_products, []
+
+        def index_products(products):
+            calls.append(1)
+            if len(calls) == n:
+                raise IntegrityError('UNIQUE constraint failed: shop_product_fts.rowid')
+            return real(products)
+        return mock.patch('shop.catalog_io.search.index_products', side_effect=index_products)
+
+    def test_database_error_reports_the_committed_chunks(self):
+        with self.failing_on_chunk(3), self.assertRaises(CatalogError) as caught:
+            import_catalog(self.catalog(25), chunk_size=10)
+
+        self.assertIn('UNIQUE constraint failed', str(caught.exception))
+        partial = caught.exception.result
+        self.assertEqual((partial.rows, partial.products_created), (20, 20))
+        self.assertEqual(Product.objects.filter(name__startswith='Imported Tee').count(), 20)   # chunk 3 rolled back
+
+    def test_error_in_the_first_chunk_or_a_dry_run_has_nothing_to_report(self):
+        with self.failing_on_chunk(1), self.assertRaises(CatalogError) as caught:
+            import_catalog(self.catalog(25), chunk_size=10)
+        self.assertIsNone(caught.exception.result)
+
+        with self.failing_on_chunk(2), self.assertRaises(CatalogError) as caught:
+            import_catalog(self.catalog(25), chunk_size=10, dry_run=True)
+        self.assertIsNone(caught.exception.result)
+        self.assertFalse(Product.objects.exists())
+
+    def test_dashboard_shows_the_partial_import(self):
+        self.client.force_login(CustomUser.objects.create_superuser('root', 'root@example.com', 'x'))
+        upload = SimpleUploadedFile('catalog.csv', self.catalog(2500).getvalue().encode(), 'text/csv')
+        with self.failing_on_chunk(3):
+            response = self.client.post(reverse('import_catalog'), {'catalog': upload}, follow=True)
+
+        message, = [str(m) for m in response.context['messages']]
+        self.assertTrue(message.startswith('Import stopped: UNIQUE constraint failed'))
+        self.assertIn('Saved before that: 2000 lines: products 2000 created', message)
+
+
+# ==========================================
+# DRIVER SYNC & DISPATCH
+# ==========================================
+
+def make_driver(username, city='Ahmedabad', zip_code='380009', is_active=True):
+    user = CustomUser.objects.create_user(username, f'{username}@example.com', 'x', first_name=username)
+    DeliveryProfile.objects.update_or_create(user=user, defaults={'city': city, 'zip_code': zip_code})
+    return DeliveryBoy.objects.create(user=user, vehicle_number='GJ01', vehicle_type='Bike', salary=1,
+                                      is_active=is_active)
+
+
+class DeliverySyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = CustomUser.objects.create_user('customer', 'customer@example.com', 'x')
+        cls.driver = make_driver('ravi')
+        cls.other = make_driver('meena')
+
+    def task(self, driver=None, status='Pending'):
+        order = Order.objects.create(user=self.customer, total_price=100)
+        return Delivery.objects.create(order=order, delivery_boy=driver or self.driver, status=status)
+
+    def ids(self, sync):
+        return sorted(task['id'] for task in sync['tasks'])
+
+    def test_full_snapshot_has_only_open_tasks(self):
+        open_task = self.task()
+        self.task(status='Delivered')
+        self.task(driver=self.other)
+
+        sync = sync_tasks(self.driver)
+        self.assertTrue(sync['full'])
+        self.assertEqual(self.ids(sync), [open_task.id])
+        self.assertEqual(sync['version'], Delivery.objects.order_by('-version').first().version)
+
+    def test_delta_has_only_changes_and_removals_after_the_version(self):
+        untouched, changed, closed, moved, deleted = (self.task() for _ in range(5))
+        since = sync_tasks(self.driver)['version']
+
+        changed.status = 'Out for Delivery'
+        changed.save()
+        closed.status = 'Delivered'
+        closed.save()
+        moved.delivery_boy = self.other
+        moved.save()
+        deleted_id = deleted.id
+        deleted.delete()
+        added = self.task()
+
+        sync = sync_tasks(self.driver, since)
+        self.assertFalse(sync['full'])
+        self.assertEqual(self.ids(sync), sorted([changed.id, added.id]))
+        self.assertEqual(sync['removed'], sorted([closed.id, moved.id, deleted_id]))
+        self.assertNotIn(untouched.id, self.ids(sync) + sync['removed'])
+
+        # The other driver gets the moved task; a sync at the new version is empty
+        self.assertEqual(self.ids(sync_tasks(self.other, since)), [moved.id])
+        again = sync_tasks(self.driver, sync['version'])
+        self.assertEqual((again['tasks'], again['removed']), ([], []))
+
+    def test_task_reassigned_back_is_not_removed(self):
+        task = self.task()
+        since = sync_tasks(self.driver)['version']
+        task.delivery_boy = self.other
+        task.save()
+        task.delivery_boy = self.driver
+        task.save()
+
+        sync = sync_tasks(self.driver, since)
+        self.assertEqual((self.ids(sync), sync['removed']), ([task.id], []))
+
+
+class DispatchTests(TestCase):
+    def test_plan_prefers_local_drivers_within_an_even_share(self):
+        deliveries = [(i, 'Ahmedabad', '380009') for i in range(1, 5)] + [(5, 'Mumbai', '400001')]
+        drivers = [
+            (10, 'Ahmedabad', '380009', 0),     # same zip
+            (11, 'Ahmedabad', '380015', 0),     # same city
+            (12, 'Mumbai', '400001', 3),        # busy already
+        ]
+        plan = plan_assignments(deliveries, drivers)
+        # target = ceil((3 + 5) / 3) = 3 open tasks per driver
+        self.assertEqual([plan[i] for i in range(1, 5)], [10, 10, 10, 11])
+        self.assertEqual(plan[5], 11)   # the Mumbai driver is full: least loaded driver overall
+
+    def test_plan_without_drivers_or_deliveries(self):
+        self.assertEqual(plan_assignments([(1, 'Pune', '411001')], []), {})
+        self.assertEqual(plan_assignments([], [(10, 'Pune', '411001', 0)]), {})
+
+    def test_dispatch_assigns_pending_tasks_and_bumps_their_version(self):
+        driver = make_driver('ravi', zip_code='380009')
+        make_driver('sleeping', zip_code='380009', is_active=False)
+        customer = CustomUser.objects.create_user('customer', 'customer@example.com', 'x')
+        DeliveryProfile.objects.update_or_create(user=customer, defaults={'city': 'Ahmedabad', 'zip_code': '380009'})
+        pending = [Delivery.objects.create(order=Order.objects.create(user=customer, total_price=1))
+                   for _ in range(3)]
+        shipped = Delivery.objects.create(order=Order.objects.create(user=customer, total_price=1),
+                                          status='Out for Delivery')
+        since = sync_tasks(driver)['version']
+
+        self.assertEqual(dispatch_pending(dry_run=True), {driver.id: 3})
+        self.assertFalse(Delivery.objects.filter(delivery_boy__isnull=False).exists())
+
+        self.assertEqual(dispatch_pending(), {driver.id: 3})
+        self.assertEqual(set(Delivery.objects.filter(delivery_boy=driver).values_list('id', flat=True)),
+                         {task.id for task in pending})
+        self.assertIsNone(Delivery.objects.get(pk=shipped.pk).delivery_boy_id)
+        # The driver's app sees the new tasks in its next delta
+        self.assertEqual(self.ids_of(sync_tasks(driver, since)), sorted(task.id for task in pending))
+        self.assertEqual(dispatch_pending(), {})
+
+    @staticmethod
+    def ids_of(sync):
+        return sorted(task['id'] for task in sync['tasks'])
+
+
+# ==========================================
+# PRODUCT SEARCH
+# ==========================================
+# Matches past search.SEARCH_RESULT_LIMIT are cut, and the listing says so.
+
+@mock.patch.object(search, 'SEARCH_RESULT_LIMIT', 2)
+class SearchTruncationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for color in ('Red', 'Blue', 'Green'):
+            Product.objects.create(name=f'{color} Silk Saree', category='Women')
+        Product.objects.create(name='Cotton Kurta', category='Men')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_search_reports_matches_past_the_limit(self):
+        products, truncated = search.search_products(Product.objects.all(), 'saree')
+        self.assertTrue(truncated)
+        self.assertEqual(len(products), 2)
+
+        products, truncated = search.search_products(Product.objects.all(), 'kurta')
+        self.assertFalse(truncated)
+        self.assertEqual([p.name for p in products], ['Cotton Kurta'])
+
+    def test_truncated_flag_in_the_page_and_the_json(self):
+        response = self.client.get(reverse('home'), {'q': 'saree'})
+        self.assertTrue(response.context['search_truncated'])
+        self.assertContains(response, 'best matches only')
+
+        data = self.client.get(reverse('home'), {'q': 'saree'}, headers={'x-requested-with': 'XMLHttpRequest'}).json()
+        self.assertTrue(data['truncated'])
+        data = self.client.get(reverse('home'), {'q': 'kurta'}, headers={'x-requested-with': 'XMLHttpRequest'}).json()
+        self.assertFalse(data['truncated'])
@@ -2,73 +2,134 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
-from django.core.mail import send_mail
 from django.conf import settings
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
 from django.contrib import messages
 from django.db import transaction
-from django.db.models import Q, Sum, F
+from django.db.models import Q, Sum, F, Prefetch
 from django.contrib.auth.decorators import user_passes_test
 from django.db.models import Sum, Count
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-from django.core.mail import send_mail
-from django.template.loader import render_to_string # <--- Needed for HTML email
-from django.utils.html import strip_tags
 import json
 import random
 from django.utils import timezone
 from datetime import datetime, timedelta
 from django.core.paginator import Paginator
 from .models import DeliveryBoy
-from .models import Product, CustomUser, Order, Cart, SaleOrder, RentBooking, Delivery, DeliveryBoy, DeliveryProfile
+from .models import Product, CustomUser, Order, Cart, SaleOrder, RentBooking, Delivery, DeliveryBoy, DeliveryProfile, ChangeCounter
 # UPDATED IMPORTS: No 'Order' or 'OrderItem'. We use SaleOrder and RentBooking.
 from .models import (
     CustomUser, Product, ProductVariant, ProductImage, 
     Cart, CartItem, SaleOrder, RentBooking
 )
 from .forms import UserRegisterForm, UserLoginForm
+from .search import search_products
+from .pagination import keyset_paginate, CATALOG_ORDERING
+from .availability import check_rental, free_units_for_sale, rental_calendar
+from .outbox import queue_email
+from .checkout import place_order, CheckoutError
+from .cart_badge import refresh_cart_badge, clear_cart_badge
+from .images import fallback_url, srcset_for
+from .delivery_sync import driver_tasks, route_for, sync_tasks
+from .rentals import MANAGER_STATUSES, with_late_fees, rental_totals
+from .inventory import (
+    INVENTORY_PER_PAGE, INVENTORY_SORTS, LOW_STOCK_UNITS, apply_adjustments, filter_inventory, with_stock_stats,
+)
+from .covers import collection_covers, pick_cover
+from .rollups import DASHBOARD_RANGES, store_totals, rental_status_counts, daily_series, category_totals
+from .profiling import query_budget
+from .replica import reporting_view
+from .streaming import CONTENT_TYPES
+from .invoices import get_invoice
+from . import catalog_io, finance
 from django.db.models import Count
 from .models import Order, RentBooking 
 
+@query_budget(5)
 def collection(request):
-    # 1. Fetch one random product for each main category to use as a cover image
-    men_cover = Product.objects.filter(category='Men', thumbnail__isnull=False).order_by('?').first()
-    women_cover = Product.objects.filter(category='Women', thumbnail__isnull=False).order_by('?').first()
-    kids_cover = Product.objects.filter(category='Kids', thumbnail__isnull=False).order_by('?').first()
-
-    # 2. Get all unique Sub-Categories (e.g., "Shirt", "Saree")
-    # This finds all sub-categories that actually have products in them
-    sub_cats = Product.objects.values('sub_category').annotate(count=Count('id')).order_by('-count')
+    # Covers and sub-category counts come precomputed from the cache (shop/covers.py),
+    # so this page doesn't scan or RANDOM()-sort the catalog on every view.
+    covers = collection_covers()
 
     context = {
-        'men_cover': men_cover,
-        'women_cover': women_cover,
-        'kids_cover': kids_cover,
-        'sub_cats': sub_cats
+        # 1. One random thumbnail URL per main category
+        'men_cover': pick_cover(covers, 'Men'),
+        'women_cover': pick_cover(covers, 'Women'),
+        'kids_cover': pick_cover(covers, 'Kids'),
+        # 2. Sub-categories that have products, most popular first
+        'sub_cats': covers['sub_cats'],
     }
     return render(request, 'collection.html', context)
 
+def product_card_data(product):
+    """JSON version of a product card, used by the infinite-scroll 'load more' requests."""
+    return {
+        'id': product.id,
+        'name': product.name,
+        'category': str(product.category),
+        'sub_category': product.sub_category or '',
+        'image': fallback_url(product.thumbnail, product.thumbnail_hash),
+        'srcset': srcset_for(product.thumbnail, product.thumbnail_hash),
+        'placeholder': product.thumbnail_placeholder,
+        'is_for_sale': product.is_for_sale,
+        'is_for_rent': product.is_for_rent,
+        'sale_price': product.min_sale_price,
+        'rent_price': product.min_rent_price,
+        'url': reverse('product_detail', args=[product.id]),
+    }
+
+def catalog_page(request, products):
+    """Keyset-paginates a product listing. Search results keep their relevance order."""
+    ordering = ('search_rank',) if 'search_rank' in products.query.annotations else CATALOG_ORDERING
+    return keyset_paginate(products, request.GET.get('cursor'), ordering)
+
+def catalog_page_json(page, search_truncated=False):
+    return JsonResponse({
+        'data': [product_card_data(prod) for prod in page],
+        'has_next': page.has_next,
+        'next_cursor': page.next_cursor,
+        # Search results stop at search.SEARCH_RESULT_LIMIT; the page says so at the end
+        'truncated': search_truncated,
+    })
+
+@query_budget(5)
 def view_category(request, category_name):
     # 1. Fetch products for this specific category (e.g., "Women")
-    # We use __iexact to make it case-insensitive (Women matches women)
-    products = Product.objects.filter(category__iexact=category_name)
-    
-    # 2. If no products found, maybe it's a Sub-Category? (e.g., "Sarees")
-    if not products.exists():
+    # Match the stored choice case-insensitively in Python so the DB can use the category index
+    category = next(
+        (value for value, label in Product.CATEGORY_CHOICES if value.lower() == category_name.lower()),
+        None
+    )
+
+    # 2. Not a category? Then it's a Sub-Category (e.g., "Sarees")
+    if category:
+        products = Product.objects.filter(category=category)
+    else:
         products = Product.objects.filter(sub_category__iexact=category_name)
 
+    # 3. Optional search inside the category (uses the same FTS index as home)
+    search_query = request.GET.get('q', '')
+    search_truncated = False
+    if search_query:
+        products, search_truncated = search_products(products, search_query)
+
+    # 4. One page at a time (AJAX "load more" asks for the next cursor)
+    page = catalog_page(request, products)
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return catalog_page_json(page, search_truncated)
+
     context = {
         'category_name': category_name,
-        'products': products
+        'products': page,
+        'search_query': search_query,
+        'search_truncated': search_truncated,
     }
     return render(request, 'category_detail.html', context)
 
+@query_budget(5)
 def rentals(request):
     # 1. Fetch Items (Ordered by ID for stable pagination)
-    products_list = Product.objects.filter(
-        variants__rent_price_per_day__gt=0
-    ).distinct().order_by('-id') 
+    products_list = Product.objects.filter(min_rent_price__gt=0).order_by('-id')
     
     # 2. Setup Pagination (9 items per page)
     paginator = Paginator(products_list, 9)
@@ -79,15 +140,15 @@ def rentals(request):
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
         data = []
         for prod in page_obj:
-            variant = prod.variants.first()
-            price = variant.rent_price_per_day if variant else 0
+            price = prod.min_rent_price or 0
             
             # Build clean JSON object for JS
             item = {
                 'id': prod.id,
                 'name': prod.name,
                 'category': str(prod.category),
-                'image': prod.thumbnail.url if prod.thumbnail else '',
+                'image': fallback_url(prod.thumbnail, prod.thumbnail_hash),
+                'srcset': srcset_for(prod.thumbnail, prod.thumbnail_hash),
                 'price': price,
                 'url': reverse('product_detail', args=[prod.id]) 
             }
@@ -150,10 +211,47 @@ def is_superuser(user):
 
 # 1. UPDATED: List only Products (Parent items)
 @user_passes_test(is_superuser, login_url='login')
+@query_budget(6)
 def inventory_list(request):
-    # Fetch all products with variants pre-loaded
-    products = Product.objects.prefetch_related('variants').all().order_by('-created_at')
-    return render(request, 'inventory/list.html', {'products': products})
+    # Stock totals, price range and low-stock flags come from the page query itself (shop/inventory.py)
+    products = with_stock_stats(Product.objects.all())
+
+    # 1. Filters
+    category = request.GET.get('category', '')
+    rentable = request.GET.get('rentable', '')
+    stock = request.GET.get('stock', '')
+    products = filter_inventory(products, category=category, rentable=rentable, stock=stock)
+
+    # 2. Sort + keyset page; variants only for the products on this page (edit forms)
+    sort = request.GET.get('sort', 'newest')
+    if sort not in INVENTORY_SORTS:
+        sort = 'newest'
+    page = keyset_paginate(
+        products.prefetch_related(Prefetch('variants', queryset=ProductVariant.objects.order_by('id'))),
+        request.GET.get('cursor'), INVENTORY_SORTS[sort], per_page=INVENTORY_PER_PAGE,
+    )
+
+    # Keep the current filters on the "next page" link
+    params = request.GET.copy()
+    params.pop('cursor', None)
+
+    context = {
+        'products': page,
+        'categories': [value for value, _ in Product.CATEGORY_CHOICES],
+        'current_category': category,
+        'current_rentable': rentable,
+        'current_stock': stock,
+        'current_sort': sort,
+        'low_stock_units': LOW_STOCK_UNITS,
+        'querystring': params.urlencode(),
+        # Quick edit grid (built client-side, see the template)
+        'grid_rows': [
+            {'id': v.id, 'product': product.name, 'size': v.size, 'color': v.color, 'stock': v.stock_quantity,
+             'sale_price': v.sale_price, 'rent_price': v.rent_price_per_day}
+            for product in page for v in product.variants.all()
+        ],
+    }
+    return render(request, 'inventory/list.html', context)
 
 @user_passes_test(is_superuser, login_url='login')
 def update_stock(request, variant_id):
@@ -165,6 +263,22 @@ def update_stock(request, variant_id):
         messages.success(request, "Updated successfully.")
     return redirect('inventory') # Stays on List Page
 
+@user_passes_test(is_superuser, login_url='login')
+@require_POST
+@query_budget(20)
+def adjust_stock(request):
+    # Bulk version of update_stock for the inventory grid / scripts (shop/inventory.py):
+    # {"rows": [{"variant_id": 1, "stock_delta": -2, "sale_price": "999.00"}, ...]}
+    try:
+        rows = json.loads(request.body)['rows']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'ok': False, 'error': 'Expected {"rows": [...]}'}, status=400)
+    if not isinstance(rows, list):
+        return JsonResponse({'ok': False, 'error': '"rows" must be a list'}, status=400)
+
+    ok, results = apply_adjustments(rows)
+    return JsonResponse({'ok': ok, 'results': results}, status=200 if ok else 400)
+
 @user_passes_test(is_superuser, login_url='login')
 def add_variant(request, product_id):
     if request.method == 'POST':
@@ -218,18 +332,42 @@ def delete_product(request, product_id):
     messages.success(request, "Product deleted successfully.")
     return redirect('inventory')
 
-# 3. UPDATED: Stock Update should redirect back to Detail Page, not List
 @user_passes_test(is_superuser, login_url='login')
-def update_stock(request, variant_id):
-    if request.method == 'POST':
-        new_stock = request.POST.get('stock')
-        variant = get_object_or_404(ProductVariant, id=variant_id)
-        variant.stock_quantity = new_stock
-        variant.save()
-        messages.success(request, "Stock updated.")
-        # Redirect back to the specific product page
+@require_POST
+def import_catalog(request):
+    upload = request.FILES.get('catalog')
+    if not upload:
+        messages.error(request, "Choose a CSV or JSONL file to import.")
+        return redirect('inventory')
+
+    dry_run = request.POST.get('dry_run') == 'on'
+    try:
+        result = catalog_io.import_catalog(
+            catalog_io.text_stream(upload), catalog_io.format_for(upload.name), dry_run=dry_run
+        )
+    except (catalog_io.CatalogError, UnicodeDecodeError) as e:
+        partial = getattr(e, 'result', None)
+        if partial is None:
+            messages.error(request, f"Import failed: {e}")
+        else:
+            messages.error(request, f"Import stopped: {e}. Saved before that: {partial.summary()}.")
+        return redirect('inventory')
+
+    prefix = "Dry run (nothing saved): " if dry_run else "Catalog imported: "
+    messages.success(request, prefix + result.summary() + ".")
+    for line_number, error in result.errors[:10]:
+        messages.warning(request, f"Line {line_number}: {error}")
     return redirect('inventory')
 
+@user_passes_test(is_superuser, login_url='login')
+def export_catalog(request):
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in catalog_io.FORMATS:
+        return HttpResponse(f"Unknown format {fmt!r}.", status=400)
+
+    response = StreamingHttpResponse(catalog_io.export_lines(fmt), content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="catalog-{timezone.localdate():%Y%m%d}.{fmt}"'
+    return response
 
 # shop/views.py
 
@@ -304,16 +442,19 @@ def home(request):
     products = Product.objects.prefetch_related('variants').all()
     return render(request, 'index.html', {'products': products})
 
+@query_budget(6)
 def product_detail(request, id):
     product = get_object_or_404(Product, id=id)
-    variants = product.variants.all()
+    variants = list(product.variants.all())
     images = product.images.all()
     
     context = {
         'product': product,
         'variants': variants,
         'images': images,
-        'initial_variant': variants.first() if variants.exists() else None
+        'initial_variant': variants[0] if variants else None,
+        # Free units per variant for the next 90 days (one query) for the date picker
+        'rental_calendar': json.dumps(rental_calendar(variants)) if product.is_for_rent else 'null',
     }
     return render(request, 'product_detail.html', context)
 
@@ -333,12 +474,13 @@ def send_otp_ajax(request):
             request.session['otp'] = otp
             request.session['otp_email'] = email 
             
-            send_mail(
+            # Queued for the outbox worker (no object to de-duplicate on, every request sends)
+            queue_email(
+                'signup_otp',
+                email,
                 'Verify your TrendWear Account',
                 f'Your verification code is: {otp}',
-                settings.EMAIL_HOST_USER,
-                [email],
-                fail_silently=False,
+                dedupe=False,
             )
             return JsonResponse({'status': 'success', 'message': 'OTP sent to your email!'})
         except Exception as e:
@@ -460,33 +602,49 @@ def add_to_cart(request, product_id):
                 messages.error(request, "End date cannot be before start date.")
                 return redirect('product_detail', id=product_id)
 
+            # Rule 4: Enough units free on every day of the range (incl. the bag's rental
+            # lines for this variant whose dates overlap it; checkout re-checks day by day)
+            in_cart = CartItem.objects.filter(
+                cart__user=request.user, variant=variant, is_rental=True,
+                rental_start_date__lte=end_date, rental_end_date__gte=start_date,
+            ).aggregate(total=Sum('quantity'))['total'] or 0
+
+            availability_error = check_rental(variant, start_date, end_date, in_cart + quantity)
+            if availability_error:
+                messages.error(request, availability_error)
+                return redirect('product_detail', id=product_id)
+
         # --- STOCK CHECK (Only for Sales) ---
         elif action == 'buy':
-            if variant.stock_quantity < quantity:
-                messages.error(request, f"Sorry, only {variant.stock_quantity} left in stock!")
+            # Units reserved by upcoming rentals can't be sold
+            available = free_units_for_sale(variant)
+            if available < quantity:
+                messages.error(request, f"Sorry, only {available} left in stock!")
                 return redirect('product_detail', id=product_id)
 
         # --- SAVE TO CART ---
         cart, created = Cart.objects.get_or_create(user=request.user)
         
+        # A rental line per date range: adding other dates must not move units already in the bag
+        dates = {'rental_start_date': start_date, 'rental_end_date': end_date} if is_rental_bool else {}
         cart_item, item_created = CartItem.objects.get_or_create(
             cart=cart,
             product=product,
             variant=variant,
             is_rental=is_rental_bool, 
+            **dates,
             defaults={'quantity': 0, 'price_at_add': 0}
         )
 
-        # Update Rental Dates if applicable
+        # Update Rental Price if applicable
         if is_rental_bool:
-            cart_item.rental_start_date = start_date
-            cart_item.rental_end_date = end_date
             cart_item.price_at_add = variant.rent_price_per_day
         else:
             cart_item.price_at_add = variant.sale_price
 
         cart_item.quantity += quantity
         cart_item.save()
+        refresh_cart_badge(request.user.id)
 
         messages.success(request, "Added to bag!")
         return redirect('view_cart')
@@ -496,15 +654,16 @@ def add_to_cart(request, product_id):
     return redirect('product_detail', id=product_id)
 
 def remove_from_cart(request, item_id):
-    cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
+    cart_item = get_object_or_404(CartItem.objects.select_related('cart'), id=item_id, cart__user=request.user)
     cart_item.delete()
+    refresh_cart_badge(request.user.id)
     messages.success(request, "Item removed.")
     return redirect('view_cart')
 
 @login_required(login_url='login')
 def update_cart(request, item_id):
     if request.method == 'POST':
-        cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
+        cart_item = get_object_or_404(CartItem.objects.select_related('cart'), id=item_id, cart__user=request.user)
         try:
             qty = int(request.POST.get('quantity'))
             if qty > 0:
@@ -512,11 +671,13 @@ def update_cart(request, item_id):
                 cart_item.save()
             else:
                 cart_item.delete()
+            refresh_cart_badge(request.user.id)
         except ValueError:
             pass
     return redirect('view_cart')
 
 @login_required(login_url='login')
+@query_budget(10)
 def view_cart(request):
     # Get or create the cart for the user
     cart, created = Cart.objects.get_or_create(user=request.user)
@@ -564,38 +725,14 @@ def checkout(request):
         profile.state = request.POST.get('state')
         profile.save()
 
-        # 2. CREATE THE ORDER (Standard Logic)
-        new_order = Order.objects.create(
-            user=request.user,
-            total_price=total_price
-        )
+        # 2. CREATE THE ORDER (one atomic step: lock, validate stock & dates, bulk insert)
+        try:
+            place_order(request.user, cart)
+        except CheckoutError as e:
+            messages.error(request, str(e))
+            return redirect('view_cart')
+        clear_cart_badge(request.user.id)
 
-        Delivery.objects.create(order=new_order, status='Pending')
-
-        for item in cart_items:
-            if item.is_rental:
-                RentBooking.objects.create(
-                    parent_order=new_order,
-                    user=request.user,
-                    variant=item.variant,
-                    start_date=item.rental_start_date,
-                    end_date=item.rental_end_date,
-                    quantity=item.quantity,
-                    total_price=item.total_cost(),
-                    status='Pending'
-                )
-            else:
-                SaleOrder.objects.create(
-                    parent_order=new_order,
-                    user=request.user,
-                    variant=item.variant,
-                    quantity=item.quantity,
-                    total_price=item.total_cost(),
-                    status='Pending'
-                )
-
-        cart.items.all().delete()
-        
         messages.success(request, "Order placed successfully! Address saved.")
         return redirect('order_success')
 
@@ -614,13 +751,14 @@ def order_success(request):
     return render(request, 'order_success.html')
 
 @login_required
+@query_budget(12)
 def my_orders(request):
     """
     Fetches Parent Orders with all related data (Delivery, Sales, Rentals)
     optimized for the accordion view.
     """
     orders = Order.objects.filter(user=request.user)\
-        .select_related('delivery_info')\
+        .select_related('user__delivery_profile', 'delivery_info__delivery_boy__user')\
         .prefetch_related(
             'sale_items__variant__product', 
             'rent_items__variant__product'
@@ -629,39 +767,63 @@ def my_orders(request):
     
     return render(request, 'orders.html', {'orders': orders})
 
+@login_required
+@query_budget(10)
+def order_invoice(request, order_id):
+    """Downloads a delivered order's invoice (?format=txt for plain text), from the stored copy."""
+    orders = Order.objects.filter(delivery_info__status='Delivered')
+    if not request.user.is_superuser:
+        orders = orders.filter(user=request.user)
+    get_object_or_404(orders.values_list('id', flat=True), id=order_id)
+
+    invoice = get_invoice(order_id)
+    if request.GET.get('format') == 'txt':
+        response = HttpResponse(invoice.text, content_type='text/plain; charset=utf-8')
+        extension = 'txt'
+    else:
+        response = HttpResponse(invoice.html, content_type='text/html; charset=utf-8')
+        extension = 'html'
+    response['Content-Disposition'] = f'attachment; filename="invoice-{order_id}.{extension}"'
+    return response
+
+@query_budget(5)
 def home(request):
-    # 1. Start with ALL products (prefetch variants to speed up loading)
-    products = Product.objects.prefetch_related('variants').all().order_by('-created_at')
+    # 1. Start with ALL products (sale/rent flags & prices are stored on Product, no variant queries)
+    products = Product.objects.all()
     
     # 2. Get Filter Parameters from the URL (sent by the search bar)
     search_query = request.GET.get('q', '')
     category_filter = request.GET.get('category', '')
     type_filter = request.GET.get('type', '') # 'rent' or 'buy'
 
-    # 3. Apply Text Search (Name, Sub-category, or Description)
-    if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) | 
-            Q(sub_category__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
-
-    # 4. Apply Category Filter (Men, Women, Kids)
+    # 3. Apply Category Filter (Men, Women, Kids)
     if category_filter and category_filter != 'All':
         products = products.filter(category=category_filter)
 
-    # 5. Apply Type Filter (Rent vs Buy)
+    # 4. Apply Type Filter (Rent vs Buy)
     if type_filter == 'rent':
-        # Show items explicitly marked as Rentable
-        products = products.filter(is_rentable=True)
+        # Show items that are Rentable and have a rent price
+        products = products.filter(is_for_rent=True)
     elif type_filter == 'buy':
         # Show items that have at least one variant with a sale price > 0
-        products = products.filter(variants__sale_price__gt=0).distinct()
+        products = products.filter(is_for_sale=True)
+
+    # 5. Apply Text Search (Name, Sub-category, or Description) - ranked by the FTS index,
+    #    last, so only products that pass the filters above are ranked
+    search_truncated = False
+    if search_query:
+        products, search_truncated = search_products(products, search_query)
+
+    # 6. Only load one page (infinite scroll fetches the rest via AJAX)
+    page = catalog_page(request, products)
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return catalog_page_json(page, search_truncated)
 
-    # 6. Pass data back to the template
+    # 7. Pass data back to the template
     context = {
-        'products': products,
+        'products': page,
         'search_query': search_query,     # To keep the text in the input
+        'search_truncated': search_truncated, # Only the best matches are listed
         'category_filter': category_filter, # To keep the dropdown selected
         'type_filter': type_filter,         # To keep the toggle active
     }
@@ -670,6 +832,7 @@ def home(request):
 # shop/views.py
 
 @login_required
+@query_budget(10)
 def delivery_dashboard(request):
     # 1. Check if user is a delivery boy
     if not hasattr(request.user, 'deliveryboy'):
@@ -679,17 +842,36 @@ def delivery_dashboard(request):
 
     # 2. FETCH TASKS
     # Logic: "Show me everything assigned to me, EXCEPT things I already delivered or were cancelled."
-    my_tasks = Delivery.objects.filter(
-        delivery_boy=driver_profile
-    ).exclude(
-        status__in=['Delivered', 'Cancelled', 'Failed']
-    ).order_by('-assigned_at')
-    
-    return render(request, 'delivery_dashboard.html', {'tasks': my_tasks})
+    # (customer, profile and order lines are fetched up front, not per card)
+    tasks = list(driver_tasks(driver_profile).order_by('-assigned_at', '-id'))
+
+    # 3. ROUTE: cards in suggested driving order, when the stops' zip codes can be located
+    route = route_for(driver_profile, tasks)
+    if route is not None:
+        by_id = {task.id: task for task in tasks}
+        tasks = [by_id[task_id] for task_id in route]
+        for stop, task in enumerate(tasks, start=1):
+            task.stop = stop
+
+    return render(request, 'delivery_dashboard.html', {
+        'tasks': tasks,
+        'in_route_order': route is not None,
+        'sync_version': ChangeCounter.current('delivery'),
+    })
 
-from django.core.mail import send_mail
-from django.conf import settings
-import random
+@login_required
+@query_budget(10)
+def delivery_sync(request):
+    # JSON delta for driver apps: GET ?since=<last version seen> (0 or missing = everything)
+    if not hasattr(request.user, 'deliveryboy'):
+        return JsonResponse({'error': 'Not a delivery partner.'}, status=403)
+
+    try:
+        since = int(request.GET.get('since', 0))
+    except ValueError:
+        return JsonResponse({'error': 'since must be an integer.'}, status=400)
+
+    return JsonResponse(sync_tasks(request.user.deliveryboy, since))
 
 @login_required
 def update_task_status(request, delivery_id):
@@ -706,21 +888,13 @@ def update_task_status(request, delivery_id):
         if new_status in ['Shipped', 'Out for Delivery']:
             delivery.status = new_status
             
-            # IF 'OUT FOR DELIVERY': Send simple notification (NO OTP)
+            # IF 'OUT FOR DELIVERY': Reset any old OTP. The post_save signal queues
+            # the simple "on the way" notification (NO OTP) in the same transaction.
             if new_status == 'Out for Delivery':
-                delivery.otp = None # Reset any old OTP
-                
-                user = delivery.order.user
-                if user.email:
-                    send_mail(
-                        f"Order #{delivery.order.id} is Out for Delivery",
-                        f"Hi {user.first_name},\n\nYour order is on the way! Our agent has started the ride.\n\nYou will receive an OTP when the agent arrives at your location.",
-                        settings.DEFAULT_FROM_EMAIL,
-                        [user.email],
-                        fail_silently=True
-                    )
+                delivery.otp = None
             
-            delivery.save()
+            with transaction.atomic():
+                delivery.save()
             messages.success(request, f"Status updated to {new_status}")
             
     return redirect('delivery_dashboard')
@@ -731,27 +905,27 @@ def send_delivery_otp(request, delivery_id):
     if request.method == 'POST':
         delivery = get_object_or_404(Delivery, id=delivery_id)
         
+        user = delivery.order.user
+        if not user.email:
+            messages.error(request, "Customer has no email address.")
+            return redirect('delivery_dashboard')
+
         # Generate Just-In-Time OTP
         otp_code = str(random.randint(100000, 999999))
         delivery.otp = otp_code
-        delivery.save()
-        
-        # Send Email
-        user = delivery.order.user
-        if user.email:
-            try:
-                send_mail(
-                    f"Delivery OTP: {otp_code}",
-                    f"Hi {user.first_name},\n\nThe delivery agent is at your location.\n\n🔐 YOUR OTP: {otp_code}\n\nPlease share this with the agent to receive your package.",
-                    settings.DEFAULT_FROM_EMAIL,
-                    [user.email],
-                    fail_silently=False
-                )
-                messages.success(request, "OTP sent to customer's email!")
-            except:
-                messages.error(request, "Failed to send email. Try again.")
-        else:
-            messages.error(request, "Customer has no email address.")
+
+        # Save + queue the email together (the outbox worker sends it)
+        with transaction.atomic():
+            delivery.save()
+            queue_email(
+                'delivery_otp',
+                user.email,
+                f"Delivery OTP: {otp_code}",
+                f"Hi {user.first_name},\n\nThe delivery agent is at your location.\n\n🔐 YOUR OTP: {otp_code}\n\nPlease share this with the agent to receive your package.",
+                object_id=delivery.id,
+                object_status=otp_code,
+            )
+        messages.success(request, "OTP sent to customer's email!")
 
     return redirect('delivery_dashboard')
 
@@ -764,15 +938,16 @@ def complete_delivery(request, delivery_id):
         entered_otp = request.POST.get('otp')
         
         if entered_otp == delivery.otp:
-            delivery.status = 'Delivered'
-            delivery.delivered_at = timezone.now()
-            delivery.save() # Triggers Invoice Email Signal
+            with transaction.atomic():
+                delivery.status = 'Delivered'
+                delivery.delivered_at = timezone.now()
+                delivery.save() # Queues the Invoice Email (Signal)
+                rental_items = RentBooking.objects.filter(parent_order=order) 
+
+                for item in rental_items:
+                    item.status = 'Active'  # This marks it as Active
+                    item.save()
             messages.success(request, "Delivery Successful!")
-            rental_items = RentBooking.objects.filter(parent_order=order) 
-
-            for item in rental_items:
-                item.status = 'Active'  # This marks it as Active
-                item.save()
         else:
             messages.error(request, "❌ Wrong OTP. Try again.")
             
@@ -782,50 +957,48 @@ def is_superuser(user):
     return user.is_superuser
 
 @user_passes_test(is_superuser, login_url='login')
+@query_budget(12)
+@reporting_view
 def admin_dashboard(request):
-    # --- 1. EXISTING KEY METRICS ---
-    total_revenue = Order.objects.aggregate(Sum('total_price'))['total_price__sum'] or 0
-    total_orders = Order.objects.count()
+    # Sales/rental numbers come from the DailyStat rollup (one row per day),
+    # not from scanning the order tables on every load.
+    try:
+        days = int(request.GET.get('days', 7))
+    except ValueError:
+        days = 7
+    if days not in DASHBOARD_RANGES:
+        days = 7
+
+    # --- 1. KEY METRICS ---
+    totals = store_totals()
+    status_totals = rental_status_counts(totals)
+    total_revenue = totals['revenue']
+    total_orders = totals['orders']
     total_products = Product.objects.count()
     total_users = CustomUser.objects.filter(is_superuser=False).count()
-    
-    # --- 2. EXISTING STATUS ALERTS ---
+
+    # --- 2. STATUS ALERTS ---
     pending_orders = Order.objects.filter(delivery_info__status='Pending').count()
     # Note: Using 'distinct()' ensures we count unique products, not just variants
     low_stock_count = Product.objects.filter(variants__stock_quantity__lt=5).distinct().count()
-    
-    recent_orders = Order.objects.select_related('user').order_by('-created_at')[:5]
-    
-    active_rentals_count = RentBooking.objects.filter(
-        status__in=['Active', 'Shipped', 'Overdue']
-    ).count()
 
-    # --- 3. NEW: CHART DATA GENERATION ---
-    
-    # A. Sales Trend (Last 7 Days)
-    today = timezone.now().date()
-    dates = []
-    sales_data = []
-
-    for i in range(6, -1, -1):
-        date = today - timedelta(days=i)
-        # Sum total_price of orders created on this specific date
-        daily_sales = Order.objects.filter(created_at__date=date).aggregate(Sum('total_price'))['total_price__sum'] or 0
-        
-        dates.append(date.strftime("%b %d")) # Format: "Dec 25"
-        sales_data.append(float(daily_sales))
-
-    # B. Rental Status Breakdown
-    # We count the specific statuses needed for the Doughnut Chart
-    status_counts = {
-        'Active': RentBooking.objects.filter(status='Active').count(),
-        'Returned': RentBooking.objects.filter(status='Returned').count(),
-        'Overdue': RentBooking.objects.filter(status='Overdue').count(),
-    }
+    recent_orders = Order.objects.select_related('user', 'delivery_info').order_by('-created_at')[:5]
+
+    active_rentals_count = sum(status_totals[status] for status in ['Active', 'Shipped', 'Overdue'])
+
+    # --- 3. CHART DATA ---
+
+    # A. Sales Trend (selected range, one rollup row per day)
+    series = daily_series(days)
+    dates = [row.day.strftime("%b %d") for row in series]  # Format: "Dec 25"
+    sales_data = [float(row.revenue) for row in series]
+
+    # B. Rental Status Breakdown (Doughnut Chart)
+    status_counts = {status: status_totals[status] for status in ['Active', 'Returned', 'Overdue']}
 
     # --- 4. CONTEXT ---
     context = {
-        # Existing Metrics
+        # Key Metrics
         'total_revenue': total_revenue,
         'total_orders': total_orders,
         'total_products': total_products,
@@ -834,8 +1007,15 @@ def admin_dashboard(request):
         'active_rentals_count': active_rentals_count,
         'low_stock_count': low_stock_count,
         'recent_orders': recent_orders,
-        
-        # New Chart Data (Converted to JSON for JavaScript)
+
+        # Range selector + per-category breakdown for the same range
+        'days': days,
+        'ranges': DASHBOARD_RANGES,
+        'range_revenue': sum(row.revenue for row in series),
+        'range_orders': sum(row.orders for row in series),
+        'category_totals': category_totals(days),
+
+        # Chart Data (Converted to JSON for JavaScript)
         'chart_dates': json.dumps(dates),
         'chart_sales': json.dumps(sales_data),
         'chart_status_labels': json.dumps(list(status_counts.keys())),
@@ -845,9 +1025,13 @@ def admin_dashboard(request):
     return render(request, 'admin_dashboard.html', context)
 
 @user_passes_test(is_superuser, login_url='login')
+@query_budget(6)
+@reporting_view
 def admin_orders(request):
     # Fetch all orders (newest first)
-    orders = Order.objects.select_related('user', 'delivery_info').order_by('-created_at')
+    orders = Order.objects.select_related(
+        'user__delivery_profile', 'delivery_info__delivery_boy__user'
+    ).order_by('-created_at')
     
     # Fetch all drivers (for the dropdown menu)
     drivers = DeliveryBoy.objects.select_related('user').all()
@@ -858,7 +1042,23 @@ def admin_orders(request):
     }
     return render(request, 'admin_orders.html', context)
 
+@user_passes_test(is_superuser, login_url='login')
+def finance_export(request):
+    """Orders with their sale/rent lines and delivery status for ?from=&to= (inclusive dates), streamed."""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in CONTENT_TYPES:
+        return HttpResponse(f"Unknown format {fmt!r}.", status=400)
+    try:
+        date_from, date_to = finance.parse_range(request.GET.get('from', ''), request.GET.get('to', ''))
+    except ValueError as e:
+        return HttpResponse(f"Bad date range: {e}", status=400)
+
+    response = StreamingHttpResponse(finance.export_lines(date_from, date_to, fmt), content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="orders-{date_from:%Y%m%d}-{date_to:%Y%m%d}.{fmt}"'
+    return response
+
 @user_passes_test(lambda u: u.is_superuser, login_url='login')
+@query_budget(15)
 def admin_order_detail(request, order_id):
     order = get_object_or_404(Order, id=order_id)
     delivery, created = Delivery.objects.get_or_create(order=order)
@@ -884,7 +1084,7 @@ def admin_order_detail(request, order_id):
                 delivery.otp = otp_code
                 
                 delivery.status = new_status
-                delivery.save() # This triggers the Email Signal with OTP
+                delivery.save() # The Email Signal queues the OTP mail
                 messages.success(request, f"Assigned to {driver.user.first_name}. OTP sent to customer.")
 
         # 2. OTHER STATUS UPDATES
@@ -931,6 +1131,8 @@ def assign_driver(request, order_id):
     return redirect('admin_orders')
 
 @user_passes_test(is_superuser, login_url='login')
+@query_budget(6)
+@reporting_view
 def admin_users(request):
     customers = CustomUser.objects.filter(is_superuser=False, deliveryboy__isnull=True)
     drivers = DeliveryBoy.objects.select_related('user').all()
@@ -941,16 +1143,61 @@ def admin_users(request):
     }
     return render(request, 'admin_users.html', context)
 
+RENTAL_SORTS = {
+    'newest': ('-start_date', '-id'),
+    'due': ('end_date', 'id'),
+    'fee': ('-pending_fee', 'end_date', 'id'),
+    'days': ('-days_late', 'id'),
+}
+
 @login_required
 @user_passes_test(lambda u: u.is_superuser)
+@query_budget(8)
+@reporting_view
 def admin_rentals(request):
-    # 1. Fetch active rentals
-    active_rentals = RentBooking.objects.filter(
-        status__in=['Active', 'Overdue', 'Out for Delivery']
-    ).select_related('user', 'variant__product').order_by('-start_date')
+    # Overdue days and late fees are computed by the database (shop/rentals.py),
+    # so filtering, sorting and the totals below never loop over rentals in Python.
+    rentals = with_late_fees(RentBooking.objects.filter(status__in=MANAGER_STATUSES))
+
+    # 1. Totals across everything out with customers (one aggregate query)
+    totals = rental_totals(rentals)
+
+    # 2. Filters
+    status = request.GET.get('status', '')
+    if status in MANAGER_STATUSES:
+        rentals = rentals.filter(status=status)
+    if request.GET.get('late') == '1':
+        rentals = rentals.filter(days_late__gt=0)
+    query = request.GET.get('q', '').strip()
+    if query:
+        rentals = rentals.filter(
+            Q(user__email__icontains=query) | Q(user__first_name__icontains=query) |
+            Q(user__last_name__icontains=query) | Q(variant__product__name__icontains=query)
+        )
+
+    # 3. Sort + paginate
+    sort = request.GET.get('sort', 'newest')
+    if sort not in RENTAL_SORTS:
+        sort = 'newest'
+    rentals = rentals.select_related('user', 'variant__product').order_by(*RENTAL_SORTS[sort])
+
+    paginator = Paginator(rentals, 25)
+    page_obj = paginator.get_page(request.GET.get('page', 1))
+
+    # Keep the current filters on the pagination links
+    params = request.GET.copy()
+    params.pop('page', None)
 
     context = {
-        'rentals': active_rentals, # Matches {% for rental in rentals %} in HTML
+        'rentals': page_obj, # Matches {% for rental in rentals %} in HTML
+        'page_obj': page_obj,
+        'totals': totals,
+        'statuses': MANAGER_STATUSES,
+        'current_status': status,
+        'current_sort': sort,
+        'late_only': request.GET.get('late') == '1',
+        'query': query,
+        'querystring': params.urlencode(),
     }
     return render(request, 'admin_rentals.html', context)
 
@@ -967,21 +1214,17 @@ def process_return(request, rental_id):
         # 1. Calculate Fees (Optional)
         # fee = booking.calculate_pending_late_fee
         
-        # 2. Update Status
+        # 2. Update Status (this frees the unit for new bookings - stock itself never changed)
         booking.status = 'Returned'
         booking.returned_at = timezone.now()
         booking.save()
         
-        variant = booking.variant
-        # FIX: Use 'stock_quantity' instead of 'stock'
-        variant.stock_quantity += 1
-        variant.save() 
-        
-        messages.success(request, "Item returned and stock updated.")
+        messages.success(request, "Item returned and is available for rent again.")
             
     return redirect('rental_manager')
 
 @login_required(login_url='login')
+@query_budget(6)
 def user_profile(request):
     # 1. Fetch Active Rentals (Need attention)
     active_statuses = [
@@ -995,7 +1238,7 @@ def user_profile(request):
     my_active_rentals = RentBooking.objects.filter(
         user=request.user, 
         status__in=active_statuses
-    ).order_by('end_date')
+    ).select_related('variant__product').order_by('end_date')
 
     # 2. Fetch Order History (Completed stuff)
     my_orders = Order.objects.filter(user=request.user).order_by('-created_at')
@@ -1005,82 +1248,3 @@ def user_profile(request):
         'orders': my_orders
     }
     return render(request, 'profile.html', context)
-
-@receiver(post_save, sender=Delivery)
-def send_delivery_status_email(sender, instance, created, **kwargs):
-    order = instance.order
-    user = order.user
-    status = instance.status
-    
-    # Only proceed if we have an email address
-    if not user.email:
-        return
-
-    subject = f"Order #{order.id} Update: {status}"
-    
-    # A. HANDLE 'DELIVERED' - SEND INVOICE
-    if status == 'Delivered':
-        subject = f"Receipt for Order #{order.id} - Delivered"
-        
-        # 1. Render the HTML Invoice
-        html_message = render_to_string('invoice.html', {'order': order})
-        
-        # 2. Create a plain text version for old email clients
-        plain_message = strip_tags(html_message)
-        
-        # 3. Send HTML Email
-        send_mail(
-            subject=subject,
-            message=plain_message, # Fallback text
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            html_message=html_message, # <--- The fancy HTML invoice
-            fail_silently=False
-        )
-        print(f"✅ INVOICE SENT to {user.email}")
-
-    # B. HANDLE OTHER STATUSES (Simple Text Alerts)
-    else:
-        message = ""
-        if status == 'Out for Delivery':
-            message = f"Hi {user.first_name},\n\nGood news! Your order #{order.id} is out for delivery today. Please be available."
-        elif status == 'Failed':
-            message = f"Hi {user.first_name},\n\nWe attempted to deliver Order #{order.id} but failed. We will try again."
-
-        if message:
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[user.email],
-                fail_silently=False
-            )
-            print(f"📧 STATUS UPDATE SENT: {status}")
-
-
-# 2. NOTIFY ON RENTAL STATUS (No changes needed here, keeping it for completeness)
-@receiver(post_save, sender=RentBooking)
-def send_rental_status_email(sender, instance, created, **kwargs):
-    user = instance.user
-    product_name = instance.variant.product.name
-    status = instance.status
-
-    if not user.email: return
-
-    subject = f"Rental Update: {product_name}"
-    message = ""
-
-    if status == 'Shipped':
-        message = f"Hi {user.first_name},\n\nYour rental '{product_name}' has been shipped!"
-    elif status == 'Overdue':
-        message = f"URGENT: Your rental '{product_name}' is OVERDUE. Please return it immediately."
-
-    if message:
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            fail_silently=False
-        )
-        
\ No newline at end of file
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,11 +44,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'shop.profiling.RequestProfilingMiddleware',    # first, so it sees every query
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'shop.replica.ReadYourWritesMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -55,7 +59,7 @@ ROOT_URLCONF = 'trendwear_backend.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'shop.profiling.ProfiledDjangoTemplates',    # DjangoTemplates + render timing
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -63,6 +67,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'shop.context_processors.cart',
             ],
         },
     },
@@ -74,13 +79,67 @@ WSGI_APPLICATION = 'trendwear_backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite connection profiles, picked with the SQLITE_PROFILE environment variable
+# (unset: 'default'; deployments set SQLITE_PROFILE=production).
+#   production: several worker processes share the file. WAL lets readers run
+#               while one writer commits; writers queue on the busy timeout
+#               instead of failing with "database is locked"; BEGIN IMMEDIATE
+#               takes the write lock up front, so a transaction never has to
+#               upgrade from read to write (which fails immediately, timeout or not).
+#               Its journal_mode=WAL is written into the database file, so it
+#               is opt-in: a plain checkout/test run must not rewrite db.sqlite3.
+#   default:    Django's stock settings (rollback journal, 5s timeout, BEGIN DEFERRED).
+# Compare them with `manage.py bench_sqlite_contention`.
+SQLITE_PROFILES = {
+    'default': {},
+    'production': {
+        'timeout': 20,                      # busy timeout, seconds
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': (
+            'PRAGMA journal_mode=WAL;'      # persistent: stored in the database file
+            'PRAGMA synchronous=NORMAL;'    # safe with WAL; only fsyncs at checkpoints
+            'PRAGMA mmap_size=268435456;'   # 256 MB memory-mapped reads
+            'PRAGMA cache_size=-65536;'     # 64 MB page cache per connection
+            'PRAGMA temp_store=MEMORY;'
+        ),
+    },
+}
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'default')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'OPTIONS': SQLITE_PROFILES[SQLITE_PROFILE],
+    },
+    # Read-only snapshot of 'default' for the reporting views (see shop/replica.py),
+    # refreshed by `manage.py refresh_replica --loop`
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.replica.sqlite3',
+        'OPTIONS': {'timeout': 20},
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+DATABASE_ROUTERS = ['shop.replica.ReplicaRouter']
+REPLICA_MAX_LAG = 300   # seconds; an older snapshot is ignored and the primary is used
+
+# Cache shared by every worker process on the host: the cart badge and the
+# collection covers are invalidated by whichever worker handled the write, so
+# a per-process LocMemCache would leave the other workers serving stale entries.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', BASE_DIR / '.django_cache'),
+    },
+}
+# `manage.py test` keeps its entries to itself: the suite must not read cart
+# badges or cover picks a dev server left in the shared file cache (or leave its own)
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+if TESTING:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -171,4 +230,10 @@ AUTHENTICATION_BACKENDS = [
 # 2. Login Redirect URLs
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'home'
-LOGOUT_REDIRECT_URL = 'home'
\ No newline at end of file
+LOGOUT_REDIRECT_URL = 'home'
+
+# ==========================================
+# REQUEST PROFILING (shop/profiling.py)
+# ==========================================
+# Views over their @query_budget are logged; under `manage.py test` they raise.
+QUERY_BUDGET_STRICT = TESTING
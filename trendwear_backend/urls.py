@@ -21,22 +21,28 @@ urlpatterns = [
     path('checkout/', views.checkout, name='checkout'),
     path('order-success/', views.order_success, name='order_success'),
     path('my-orders/', views.my_orders, name='my_orders'),
+    path('my-orders/<int:order_id>/invoice/', views.order_invoice, name='order_invoice'),
     path('dashboard/inventory/', views.inventory_list, name='inventory'),
     path('dashboard/inventory/add-product/', views.add_product, name='add_product'),
     path('dashboard/inventory/update-stock/<int:variant_id>/', views.update_stock, name='update_stock'),
+    path('dashboard/inventory/adjust/', views.adjust_stock, name='adjust_stock'),
     path('dashboard/inventory/add-variant/<int:product_id>/', views.add_variant, name='add_variant'), # NEW
     path('dashboard/inventory/delete-product/<int:product_id>/', views.delete_product, name='delete_product'),
     path('dashboard/inventory/delete-variant/<int:variant_id>/', views.delete_variant, name='delete_variant'),
+    path('dashboard/inventory/import/', views.import_catalog, name='import_catalog'),
+    path('dashboard/inventory/export/', views.export_catalog, name='export_catalog'),
     path('collections/', views.collection, name='collection'),
     path('shop/<str:category_name>/', views.view_category, name='view_category'),
     path('rentals/', views.rentals, name='rentals'),
     path('delivery-dashboard/', views.delivery_dashboard, name='delivery_dashboard'),
+    path('delivery/sync/', views.delivery_sync, name='delivery_sync'),
     path('delivery/update/<int:delivery_id>/', views.update_task_status, name='update_task_status'),
     path('delivery/send-otp/<int:delivery_id>/', views.send_delivery_otp, name='send_delivery_otp'),
     path('delivery/complete/<int:delivery_id>/', views.complete_delivery, name='complete_delivery'),
     path('dashboard/', views.admin_dashboard, name='admin_dashboard'),
     path('dashboard/order/<int:order_id>/', views.admin_order_detail, name='admin_order_detail'),
     path('dashboard/orders/', views.admin_orders, name='admin_orders'),
+    path('dashboard/orders/export/', views.finance_export, name='finance_export'),
     path('dashboard/orders/assign-driver/<int:order_id>/', views.assign_driver, name='assign_driver'),
     path('dashboard/users/', views.admin_users, name='admin_users'),
     path('dashboard/rentals/', views.admin_rentals, name='admin_rentals'),